@@ -0,0 +1,168 @@
+# analytics.py
+#
+# Cohort analytics over the results log. Dashboard queries read the rollups
+# that `results_store` keeps up to date on every write; bulk export streams
+# the raw log to a columnar file for offline analysis.
+#
+#     python analytics.py top --dimension contrast [--mode practice] [--limit 10]
+#     python analytics.py export results.parquet
+#     python analytics.py rebuild
+
+import argparse
+from collections import namedtuple
+
+import config
+from results_store import DIMENSIONS, connect, get_results_store
+
+Rollup = namedtuple('Rollup', ['value', 'attempts', 'correct', 'misses', 'error_rate'])
+
+EXPORT_COLUMNS = (
+    'session_id', 'mode', 'item_id', 'attempt', 'position', 'label', 'pronunciation',
+    'correct', 'recorded_at', 'phoneme_type', 'contrast', 'level', 'contrasts',
+)
+
+
+def _check_dimension(dimension):
+    if dimension not in DIMENSIONS:
+        raise ValueError(f"Unknown dimension {dimension!r}; expected one of {', '.join(DIMENSIONS)}")
+
+
+def rollups(dimension, mode=None, limit=None, min_attempts=1, store=None):
+    """
+    Return aggregates for one dimension, most-missed first.
+
+    Reads only the rollups table, so the cost depends on the number of distinct
+    values (contrasts, levels, ...) rather than on the number of stored answers.
+
+    Parameters:
+    - dimension (str): One of `results_store.DIMENSIONS`.
+    - mode (str): 'testing' or 'practice'; None combines both.
+    - limit (int): Maximum number of rows; None returns all.
+    - min_attempts (int): Skip values with fewer attempts than this.
+    - store (ResultsStore): Store to read; defaults to the process-wide one.
+
+    Returns:
+    - list: `Rollup` tuples ordered by misses, then error rate.
+    """
+    _check_dimension(dimension)
+    store = store or get_results_store()
+    store.flush()
+    query = ("SELECT value, SUM(attempts) AS attempts, SUM(correct) AS correct FROM rollups "
+             "WHERE dimension = ?")
+    params = [dimension]
+    if mode is not None:
+        query += " AND mode = ?"
+        params.append(mode)
+    query += (" GROUP BY value HAVING SUM(attempts) >= ? "
+              "ORDER BY attempts - correct DESC, CAST(attempts - correct AS REAL) / attempts DESC, value")
+    params.append(min_attempts)
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+
+    return [
+        Rollup(value, attempts, correct, attempts - correct, (attempts - correct) / attempts)
+        for value, attempts, correct in store._reader().execute(query, params)
+    ]
+
+
+def totals(mode=None, store=None):
+    """Return (correct, attempts) across all learners."""
+    store = store or get_results_store()
+    store.flush()
+    query = "SELECT COALESCE(SUM(correct), 0), COALESCE(SUM(attempts), 0) FROM rollups WHERE dimension = 'learner'"
+    params = []
+    if mode is not None:
+        query += " AND mode = ?"
+        params.append(mode)
+    return tuple(store._reader().execute(query, params).fetchone())
+
+
+def export_results(path, db_path=config.RESULTS_DB_PATH, batch_rows=65536):
+    """
+    Stream the results log to a Parquet file, one row group per batch.
+
+    Memory stays bounded by `batch_rows` whatever the size of the log.
+
+    Parameters:
+    - path (str): Output file.
+    - db_path (str): Results database to export.
+    - batch_rows (int): Rows read and written per row group.
+
+    Returns:
+    - int: The number of rows written.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError(
+            "The 'pyarrow' package is required for columnar export. "
+            "Install it with `pip install pyarrow`."
+        ) from e
+
+    schema = pa.schema([
+        ('session_id', pa.string()), ('mode', pa.dictionary(pa.int32(), pa.string())),
+        ('item_id', pa.string()), ('attempt', pa.int32()), ('position', pa.int32()),
+        ('label', pa.string()), ('pronunciation', pa.string()), ('correct', pa.bool_()),
+        ('recorded_at', pa.timestamp('ms')), ('phoneme_type', pa.dictionary(pa.int32(), pa.string())),
+        ('contrast', pa.dictionary(pa.int32(), pa.string())), ('level', pa.dictionary(pa.int32(), pa.string())),
+        ('contrasts', pa.dictionary(pa.int32(), pa.string())),
+    ])
+
+    if db_path == config.RESULTS_DB_PATH:
+        get_results_store().flush()
+    connection = connect(db_path)
+    cursor = connection.execute(f"SELECT {', '.join(EXPORT_COLUMNS)} FROM results ORDER BY recorded_at")
+    written = 0
+    try:
+        with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+            while True:
+                rows = cursor.fetchmany(batch_rows)
+                if not rows:
+                    break
+                columns = list(zip(*rows))
+                columns[7] = [bool(value) for value in columns[7]]
+                columns[8] = [int(value * 1000) for value in columns[8]]
+                writer.write_batch(pa.RecordBatch.from_arrays(
+                    # Low-cardinality columns are dictionary-encoded
+                    [pa.array(column, type=pa.string()).dictionary_encode()
+                     if pa.types.is_dictionary(field.type) else pa.array(column, type=field.type)
+                     for column, field in zip(columns, schema)],
+                    schema=schema,
+                ))
+                written += len(rows)
+    finally:
+        connection.close()
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query and export learner results.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    top = commands.add_parser('top', help="Show the most-missed values of a dimension.")
+    top.add_argument('--dimension', choices=DIMENSIONS, default='contrast')
+    top.add_argument('--mode', choices=('testing', 'practice'))
+    top.add_argument('--limit', type=int, default=10)
+    top.add_argument('--min-attempts', type=int, default=1)
+
+    export = commands.add_parser('export', help="Write the results log to a Parquet file.")
+    export.add_argument('path')
+    export.add_argument('--db', default=config.RESULTS_DB_PATH)
+
+    commands.add_parser('rebuild', help="Recompute rollups from the full results log.")
+    args = parser.parse_args()
+
+    if args.command == 'top':
+        for row in rollups(args.dimension, args.mode, args.limit, args.min_attempts):
+            print(f"{row.value:<24} {row.misses:>8} missed of {row.attempts:>8}  ({row.error_rate:.0%})")
+    elif args.command == 'export':
+        print(f"Wrote {export_results(args.path, args.db)} rows to {args.path}")
+    else:
+        get_results_store().rebuild_rollups()
+        print("Rollups rebuilt.")
+
+
+if __name__ == "__main__":
+    main()
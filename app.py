@@ -1,49 +1,55 @@
 import streamlit as st
-import json
-import speech_recognition as sr
-import pandas as pd
-import matplotlib.pyplot as plt
+import functools
+import hashlib
+import hmac
 import io
 import string
-from gtts import gTTS
+import threading
+import uuid
 from audio_recorder_streamlit import audio_recorder
 
 # Import the compare_phonemes function from phoneme_utils
-from phoneme_utils import compare_phonemes
+from phoneme_utils import compare_phonemes, get_contrast_index
+import config
+from corpus import EMPTY_CORPUS, CorpusError, load_corpus, practice_item_id, testing_item_id
+from recognition_pool import submit_recognition
+from prefetch import AudioPrefetcher
+from recording_store import RecordingStore
+from results_store import get_results_store
+import analytics
+from charts import pie_chart_svg
+import metrics
+import recording_store
+from reference_audio import load_reference_audio, reference_key
+from audio_server import audio_url, start_audio_server
+from tts_cache import get_default_cache
+from recognition_cache import get_default_cache as get_recognition_cache
+import audio_preprocess
+from lexicon import get_homophone_index
 
 # ==========================
 # Initialize Session State
 # ==========================
 
-# For Phoneme Testing
-if 'phoneme_data_testing' not in st.session_state:
-    st.session_state.phoneme_data_testing = {}
+# Sessions hold only selections and indices; corpus data is shared per process
 
+# For Phoneme Testing
 if 'current_word_index_testing' not in st.session_state:
     st.session_state.current_word_index_testing = 0
-    st.session_state.results_testing = []
+    st.session_state.results_attempt_testing = 0
     st.session_state.has_answered_testing = False
     st.session_state.error_occurred_testing = False
     st.session_state.recognized_text_testing = ''
     st.session_state.correct_testing = False
-    st.session_state.recorded_audio_testing = None  # Store recorded audio
+    st.session_state.recorded_audio_testing = None  # Handle to the recorded take
 
 # For Phoneme Practice
-if 'phoneme_data_practice' not in st.session_state:
-    st.session_state.phoneme_data_practice = {}
-
 if 'selected_practice_contrast' not in st.session_state:
     st.session_state.selected_practice_contrast = None
 
-if 'selected_practice_minimal_pairs' not in st.session_state:
-    st.session_state.selected_practice_minimal_pairs = None
-
 if 'selected_practice_level' not in st.session_state:
     st.session_state.selected_practice_level = None
 
-if 'practice_sentences' not in st.session_state:
-    st.session_state.practice_sentences = []
-
 if 'current_sentence_index_practice' not in st.session_state:
     st.session_state.current_sentence_index_practice = 0
 
@@ -53,11 +59,11 @@ if 'has_answered_practice' not in st.session_state:
 if 'error_occurred_practice' not in st.session_state:
     st.session_state.error_occurred_practice = False
 
-if 'results_practice' not in st.session_state:
-    st.session_state.results_practice = []
+if 'results_attempt_practice' not in st.session_state:
+    st.session_state.results_attempt_practice = 0
     st.session_state.recognized_text_practice = ''
     st.session_state.correct_practice = False
-    st.session_state.recorded_audio_practice = None  # Store recorded audio
+    st.session_state.recorded_audio_practice = None  # Handle to the recorded take
 
 if 'last_selected_contrast' not in st.session_state:
     st.session_state.last_selected_contrast = None
@@ -72,124 +78,252 @@ if 'last_selected_phoneme_type_practice' not in st.session_state:
 # Utility Functions
 # ==========================
 
-def load_phoneme_data(file_path):
-    try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            return json.load(file)
-    except FileNotFoundError:
-        st.error(f"File `{file_path}` not found. Please ensure it exists in the directory.")
-        return {}
-    except json.JSONDecodeError as e:
-        st.error(f"Error decoding JSON from `{file_path}`: {e}")
-        return {}
+@st.cache_resource
+def load_shared_corpus():
+    # Compiled once per process and shared read-only by every session
+    return load_corpus()
 
-def generate_audio(text):
+def get_corpus():
     try:
-        tts = gTTS(text=text, lang='en')
-        audio_bytes = io.BytesIO()
-        tts.write_to_fp(audio_bytes)
-        audio_bytes.seek(0)
-        return audio_bytes
-    except Exception as e:
-        st.error(f"Error generating audio: {e}")
+        return load_shared_corpus()
+    except CorpusError as e:
+        st.error(str(e))
+        return EMPTY_CORPUS
+
+def selected_practice_level_key():
+    # The radio shows "Level 1"; the corpus, item ids and results log use 'level_1'
+    level = st.session_state.selected_practice_level
+    return None if level is None else f"level_{level.split()[-1]}"
+
+def get_practice_sentences():
+    # An O(1) lookup into the shared corpus; nothing is copied into the session
+    level_key = selected_practice_level_key()
+    if st.session_state.selected_practice_contrast is None or level_key is None:
+        return ()
+    contrasts = get_corpus().practice.get(st.session_state.selected_phoneme_type_practice, {})
+    levels = contrasts.get(st.session_state.selected_practice_contrast, {})
+    return levels.get(level_key, ())
+
+def warm_up():
+    # Heavy libraries load on first use; fetch them while the learner reads the first page
+    try:
+        import numpy  # noqa: F401  (audio pre-processing)
+        if config.ASR_BACKEND == 'google':
+            import speech_recognition  # noqa: F401
+        if not config.TTS_ENDPOINT:
+            import gtts  # noqa: F401
+        get_contrast_index()
+        get_homophone_index()
+    except Exception:
+        # Anything broken here fails again, visibly, where it is first used
+        pass
+
+@st.cache_resource
+def start_warm_up():
+    thread = threading.Thread(target=warm_up, name='warm-up', daemon=True)
+    thread.start()
+    return thread
+
+def get_session_id():
+    # Identifies this browser session's rows in the results log
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    return st.session_state.session_id
+
+def get_prefetcher():
+    if 'audio_prefetcher' not in st.session_state:
+        st.session_state.audio_prefetcher = AudioPrefetcher()
+    return st.session_state.audio_prefetcher
+
+def get_recording_store():
+    # Spools are deleted when the store is garbage-collected with the session
+    if 'recording_store' not in st.session_state:
+        st.session_state.recording_store = RecordingStore()
+    return st.session_state.recording_store
+
+def set_recorded_take(mode, handle):
+    # Superseded takes are dropped from the store so its caps bound only live takes
+    key = f'recorded_audio_{mode}'
+    previous = st.session_state.get(key)
+    if previous is not None and previous is not handle:
+        get_recording_store().discard(previous)
+    st.session_state[key] = handle
+
+@metrics.timed('generate_audio')
+def generate_audio(text):
+    # Clips for the current and next items are normally prefetched already
+    audio = get_prefetcher().get(text)
+    if audio is None:
+        try:
+            audio = load_reference_audio(text)
+        except Exception as e:
+            st.error(f"Error generating audio: {e}")
+            return None
+
+    # A stable URL lets the browser cache the clip instead of resending it each rerun
+    if config.AUDIO_SERVE_BY_URL and start_audio_server():
+        return audio_url(reference_key(text))
+    return io.BytesIO(audio)
+
+def play_audio(source, format):
+    """Show an audio player, counting the bytes each call sends to the browser."""
+    if isinstance(source, str):
+        delivery, size = 'url', len(source)
+    elif isinstance(source, io.BytesIO):
+        delivery, size = 'inline', source.getbuffer().nbytes
+    else:
+        delivery, size = 'inline', len(source)
+    metrics.get_metrics().observe('minimal_pairs_audio_payload_bytes', size, buckets=metrics.BYTES_BUCKETS,
+                                  delivery=delivery, format=format)
+    st.audio(source, format=format)
+
+def grade_take(mode, audio_bytes, expected_word):
+    """
+    Submit new takes to the recognition pool and report the current outcome.
+
+    Parameters:
+    - mode (str): 'testing' or 'practice'.
+    - audio_bytes (bytes): The recording returned by the recorder widget.
+    - expected_word (str): The target word.
+
+    Returns:
+    - tuple: (recognized text, correct flag, confidence) once grading succeeded, else None.
+    """
+    job_key = f'grading_job_{mode}'
+    digest = hashlib.sha256(audio_bytes).hexdigest()
+    job = st.session_state.get(job_key)
+
+    if job is None or job.audio_digest != digest:
+        # A new take supersedes whatever is still being graded
+        if job is not None:
+            job.cancel()
+        job = submit_recognition(audio_bytes, expected_word, digest)
+        st.session_state[job_key] = job
+
+    if job.consumed:
         return None
 
-def recognize_speech_from_audio(audio_bytes, expected_word):
-    r = sr.Recognizer()
-    with sr.AudioFile(io.BytesIO(audio_bytes)) as source:
-        audio = r.record(source)
-    try:
-        result = r.recognize_google(audio)
-        # Normalize both the result and the expected word
-        normalized_result = result.lower().strip()
-        normalized_expected = expected_word.lower().strip()
-
-        # Remove punctuation for accurate comparison
-        normalized_result = normalized_result.translate(str.maketrans('', '', string.punctuation))
-        normalized_expected = normalized_expected.translate(str.maketrans('', '', string.punctuation))
-
-        # Check if the recognized text contains the target word
-        correct = normalized_expected in normalized_result.split()
-        return result, correct
-    except sr.UnknownValueError:
-        st.error("Google Speech Recognition could not understand the audio.")
-        return "", False
-    except sr.RequestError as e:
-        st.error(f"Could not request results from Google Speech Recognition service; {e}")
-        return "", False
+    if not job.done():
+        grading_poller(job_key)
+        return None
+
+    recognized_text, correct, error, confidence = job.result()
+    if error or not recognized_text:
+        if error:
+            st.error(error)
+        st.error("Could not understand the audio. Please try again.")
+        # Allow re-recording
+        return None
+
+    job.consumed = True
+    return recognized_text, correct, confidence
+
+@st.fragment(run_every=config.ASR_POLL_INTERVAL)
+def grading_poller(job_key):
+    # Only this fragment reruns while waiting; a full rerun shows the result
+    job = st.session_state.get(job_key)
+    if job is None or job.done():
+        st.rerun()
+    st.info("Grading…")
+
+def show_results_chart(correct_count, total_count):
+    # Plain SVG; importing pyplot would cost every fresh worker about half a second
+    with metrics.span('results_chart'):
+        st.html(pie_chart_svg(
+            [correct_count, total_count - correct_count],
+            ['Correct', 'Incorrect'],
+            ['#4CAF50', '#F44336'],
+        ))
+
+def timed_panel(func):
+    """Record the server time of each panel run, shown when timings are enabled."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with metrics.span(func.__name__) as span:
+            result = func(*args, **kwargs)
+        elapsed_ms = span.seconds * 1000
+        st.session_state.setdefault('panel_timings', {})[func.__name__] = elapsed_ms
+        if config.SHOW_TIMINGS:
+            st.caption(f"Server time ({func.__name__}): {elapsed_ms:.1f} ms")
+        return result
+    return wrapper
 
 # ==========================
 # Session End Functions
 # ==========================
 
+@st.fragment
+@timed_panel
 def end_session_testing():
     st.write("### Test Complete!")
     st.write("Here are your results:")
 
-    if st.session_state.results_testing:
-        results_df = pd.DataFrame(st.session_state.results_testing)
-        st.table(results_df[['Word', 'Your Pronunciation', 'Correct']])
+    # Rows and counts come from the results log, one row per answered item
+    results_store = get_results_store()
+    attempt = st.session_state.results_attempt_testing
+    rows = results_store.session_results(get_session_id(), 'testing', attempt)
+
+    if rows:
+        st.table([
+            {'Word': label, 'Your Pronunciation': pronunciation, 'Correct': correct}
+            for label, pronunciation, correct in rows
+        ])
 
-        correct_count = results_df['Correct'].sum()
-        total_count = len(results_df)
+        correct_count, total_count = results_store.session_counts(get_session_id(), 'testing', attempt)
         st.write(f"**You pronounced {correct_count}/{total_count} words correctly.**")
 
         # Visualization: Pie Chart
-        fig, ax = plt.subplots()
-        labels = ['Correct', 'Incorrect']
-        sizes = [correct_count, total_count - correct_count]
-        colors = ['#4CAF50', '#F44336']
-        ax.pie(sizes, labels=labels, autopct='%1.1f%%', colors=colors, startangle=90)
-        ax.axis('equal')
-        st.pyplot(fig)
+        show_results_chart(correct_count, total_count)
     else:
         st.write("No results to display.")
 
     if st.button("Restart Test"):
         st.session_state.current_word_index_testing = 0
-        st.session_state.results_testing = []
+        st.session_state.results_attempt_testing += 1
         st.session_state.has_answered_testing = False
         st.session_state.error_occurred_testing = False
         st.session_state.recognized_text_testing = ''
         st.session_state.correct_testing = False
-        st.session_state.recorded_audio_testing = None
+        set_recorded_take('testing', None)
+        st.rerun()
 
+@st.fragment
+@timed_panel
 def end_session_practice():
     st.write("### Practice Complete!")
     st.write("Here are your results:")
 
-    if st.session_state.results_practice:
-        results_df = pd.DataFrame(st.session_state.results_practice)
-        st.table(results_df[['Sentence', 'Your Pronunciation', 'Correct']])
+    # Rows and counts come from the results log, one row per answered item
+    results_store = get_results_store()
+    attempt = st.session_state.results_attempt_practice
+    rows = results_store.session_results(get_session_id(), 'practice', attempt)
 
-        correct_count = results_df['Correct'].sum()
-        total_count = len(results_df)
+    if rows:
+        st.table([
+            {'Sentence': label, 'Your Pronunciation': pronunciation, 'Correct': correct}
+            for label, pronunciation, correct in rows
+        ])
+
+        correct_count, total_count = results_store.session_counts(get_session_id(), 'practice', attempt)
         st.write(f"**You pronounced {correct_count}/{total_count} sentences correctly.**")
 
         # Visualization: Pie Chart
-        fig, ax = plt.subplots()
-        labels = ['Correct', 'Incorrect']
-        sizes = [correct_count, total_count - correct_count]
-        colors = ['#4CAF50', '#F44336']
-        ax.pie(sizes, labels=labels, autopct='%1.1f%%', colors=colors, startangle=90)
-        ax.axis('equal')
-        st.pyplot(fig)
+        show_results_chart(correct_count, total_count)
     else:
         st.write("No results to display.")
 
     if st.button("Restart Practice"):
         st.session_state.current_sentence_index_practice = 0
-        st.session_state.results_practice = []
+        st.session_state.results_attempt_practice += 1
         st.session_state.has_answered_practice = False
         st.session_state.error_occurred_practice = False
         st.session_state.recognized_text_practice = ''
         st.session_state.correct_practice = False
-        st.session_state.recorded_audio_practice = None
+        set_recorded_take('practice', None)
         st.session_state.selected_practice_contrast = None
-        st.session_state.selected_practice_minimal_pairs = None
         st.session_state.selected_practice_level = None
-        st.session_state.practice_sentences = []
         st.session_state.last_selected_contrast = None
+        st.rerun()
 
 # ==========================
 # Button Callback Functions
@@ -201,7 +335,7 @@ def continue_to_next_testing():
     st.session_state.error_occurred_testing = False
     st.session_state.recognized_text_testing = ''
     st.session_state.correct_testing = False
-    st.session_state.recorded_audio_testing = None
+    set_recorded_take('testing', None)
 
 def continue_to_next_practice():
     st.session_state.current_sentence_index_practice += 1
@@ -209,19 +343,154 @@ def continue_to_next_practice():
     st.session_state.error_occurred_practice = False
     st.session_state.recognized_text_practice = ''
     st.session_state.correct_practice = False
-    st.session_state.recorded_audio_practice = None
+    set_recorded_take('practice', None)
+
+# ==========================
+# Page Panels
+# ==========================
+
+@st.fragment
+@timed_panel
+def audio_example_panel(text, key):
+    # Toggling the checkbox reruns only this panel
+    if st.checkbox("Listen to audio example", key=key):
+        audio_bytes = generate_audio(text)
+        if audio_bytes:
+            play_audio(audio_bytes, format='audio/mp3')
+
+def record_take(mode, expected_word):
+    """
+    Show the recorder and grade the take; returns True once an answer is accepted.
+
+    The recorder lives in a placeholder so it can be cleared in the same run
+    that shows the feedback, without a rerun.
+    """
+    recorder_slot = st.empty()
+    outcome = None
+    with recorder_slot.container():
+        st.write("Please click on the microphone to start recording.")
+
+        # Use the correct parameter to change the microphone icon color
+        audio_bytes = audio_recorder(
+            recording_color="#006400",  # Dark green when recording
+            neutral_color="#404040"     # Dark gray when not recording
+        )
+
+        if audio_bytes:
+            # After Continue the recorder still returns the answered take; it is not stored again
+            job = st.session_state.get(f'grading_job_{mode}')
+            if job is None or not job.consumed or job.audio_digest != hashlib.sha256(audio_bytes).hexdigest():
+                # Keep a compact handle in session state rather than the raw WAV
+                set_recorded_take(mode, get_recording_store().add(audio_bytes))
+
+            # Perform speech recognition in the background
+            outcome = grade_take(mode, audio_bytes, expected_word)
+
+    if not outcome:
+        return False
+
+    recognized_text, correct, confidence = outcome
+    st.session_state[f'recognized_text_{mode}'] = recognized_text
+    st.session_state[f'correct_{mode}'] = correct
+    st.session_state[f'confidence_{mode}'] = confidence
+    st.session_state[f'has_answered_{mode}'] = True
+    recorder_slot.empty()
+    return True
+
+def show_confidence(confidence):
+    # Share of the recognizer's hypotheses that heard the target word
+    if confidence is not None:
+        st.caption(f"Recognition confidence that you said the target word: {confidence:.0%}")
+
+def show_progress(index, total):
+    progress = (index + 1) / total
+    st.progress(progress)
+    st.write(f"**Progress:** {index + 1}/{total}")
 
 # ==========================
 # Phoneme Testing Logic
 # ==========================
 
+@st.fragment
+@timed_panel
+def testing_item_panel(current_word_data, index):
+    st.write(f"### Pronounce the word in this sentence:")
+    st.markdown(f'"{current_word_data.sentence}"')
+    st.write(f"**IPA:** {current_word_data.ipa}")
+
+    audio_example_panel(current_word_data.sentence, f"audio_testing_{index}")
+
+@st.fragment
+@timed_panel
+def testing_answer_panel(current_word_data, phoneme_type, position):
+    # Recording, grading and feedback rerun here without redrawing the page
+    if not st.session_state.has_answered_testing:
+        if not record_take('testing', current_word_data.word):
+            return
+    testing_feedback(current_word_data, phoneme_type, position)
+
+def testing_feedback(current_word_data, phoneme_type, position):
+    word = current_word_data.word
+    sentence = current_word_data.sentence
+
+    # Display the user's recording with a label
+    st.write("Your Recording:")
+    if st.session_state.recorded_audio_testing:
+        play_audio(st.session_state.recorded_audio_testing.read(), format='audio/wav')
+
+    # Display the ideal pronunciation
+    st.write("Ideal Pronunciation:")
+    ideal_audio = generate_audio(sentence)
+    if ideal_audio:
+        play_audio(ideal_audio, format='audio/mp3')
+
+    # Display the recognized text and feedback
+    st.write(f"You said: **{st.session_state.recognized_text_testing}**")
+    show_confidence(st.session_state.get('confidence_testing'))
+
+    # Clean the recognized text to extract the recognized word
+    recognized_words = st.session_state.recognized_text_testing.strip().split()
+    if recognized_words:
+        recognized_word = recognized_words[-1].lower()
+        recognized_word = recognized_word.strip(string.punctuation)
+    else:
+        recognized_word = ""
+
+    # Compare phonemes and provide feedback; a homophone of the word also passes
+    if st.session_state.correct_testing:
+        feedback, contrast_description = compare_phonemes(word, word, current_word_data.phonemic_contrast)
+    else:
+        feedback, contrast_description = compare_phonemes(
+            word,
+            recognized_word,
+            current_word_data.phonemic_contrast
+        )
+    st.write(feedback)
+
+    # Every answer counts towards each contrast the word drills; a miss only against the one it showed
+    missed_contrast = contrast_description if contrast_description != "No contrast found" else ''
+    # Store result (an upsert, so reruns of this panel never add duplicates)
+    get_results_store().record(
+        get_session_id(), 'testing', testing_item_id(phoneme_type, position), st.session_state.results_attempt_testing,
+        position,
+        word,
+        recognized_word if not st.session_state.correct_testing else 'N/A',
+        st.session_state.correct_testing,
+        phoneme_type=phoneme_type,
+        contrast='' if st.session_state.correct_testing else missed_contrast,
+        contrasts=[contrast['contrast_description'] for contrast in current_word_data.phonemic_contrast],
+    )
+
+    if st.button("Continue"):
+        continue_to_next_testing()
+        # Moving to the next item redraws the whole page
+        st.rerun()
+
 def phoneme_testing(phoneme_type):
     st.title(f"{phoneme_type.capitalize()} Testing")
 
-    # Fetch all words for the selected phoneme type
-    all_words = []
-    for phoneme, word_list in st.session_state.phoneme_data_testing.get(phoneme_type, {}).items():
-        all_words.extend(word_list)
+    # Fetch all words for the selected phoneme type (pre-flattened per process)
+    all_words = get_corpus().testing.get(phoneme_type, ())
 
     # Update total_steps based on the number of words across all phonemes
     total_words = len(all_words)
@@ -230,88 +499,22 @@ def phoneme_testing(phoneme_type):
     # Ensure we are within bounds of the words
     if all_words and st.session_state.current_word_index_testing < len(all_words):
         current_word_data = all_words[st.session_state.current_word_index_testing]
-        word = current_word_data['word']
-        ipa = current_word_data['ipa']
-        sentence = current_word_data['sentence']
-
-        st.write(f"### Pronounce the word in this sentence:")
-        st.markdown(f'"{sentence}"')
-        st.write(f"**IPA:** {ipa}")
-
-        if st.checkbox("Listen to audio example", key=f"audio_testing_{st.session_state.current_word_index_testing}"):
-            audio_bytes = generate_audio(sentence)
-            if audio_bytes:
-                st.audio(audio_bytes, format='audio/mp3')
-
-        if not st.session_state.has_answered_testing:
-            st.write("Please click on the microphone to start recording.")
-
-            # Use the correct parameter to change the microphone icon color
-            audio_bytes = audio_recorder(
-                recording_color="#006400",  # Dark green when recording
-                neutral_color="#404040"     # Dark gray when not recording
-            )
-
-            if audio_bytes:
-                # Store the recorded audio in session state
-                st.session_state.recorded_audio_testing = audio_bytes
-
-                # Perform speech recognition
-                recognized_text, correct = recognize_speech_from_audio(audio_bytes, word)
-                if recognized_text:
-                    st.session_state.recognized_text_testing = recognized_text
-                    st.session_state.correct_testing = correct
-                    st.session_state.has_answered_testing = True
-
-                    st.rerun()
-                else:
-                    st.error("Could not understand the audio. Please try again.")
-                    # Allow re-recording
-        else:
-            # Display the user's recording with a label
-            st.write("Your Recording:")
-            if st.session_state.recorded_audio_testing:
-                st.audio(st.session_state.recorded_audio_testing, format='audio/wav')
-
-            # Display the ideal pronunciation
-            st.write("Ideal Pronunciation:")
-            ideal_audio = generate_audio(sentence)
-            if ideal_audio:
-                st.audio(ideal_audio, format='audio/mp3')
-
-            # Display the recognized text and feedback
-            st.write(f"You said: **{st.session_state.recognized_text_testing}**")
-
-            # Clean the recognized text to extract the recognized word
-            recognized_words = st.session_state.recognized_text_testing.strip().split()
-            if recognized_words:
-                recognized_word = recognized_words[-1].lower()
-                recognized_word = recognized_word.strip(string.punctuation)
-            else:
-                recognized_word = ""
-
-            # Compare phonemes and provide feedback
-            feedback, _ = compare_phonemes(
-                word,
-                recognized_word,
-                current_word_data.get('phonemic_contrast', [])
-            )
-            st.write(feedback)
-
-            # Store result
-            st.session_state.results_testing.append({
-                'Word': word,
-                'Your Pronunciation': recognized_word if not st.session_state.correct_testing else 'N/A',
-                'Correct': st.session_state.correct_testing
-            })
-
-            if st.button("Continue"):
-                continue_to_next_testing()
-                st.rerun()
-
-        progress = (st.session_state.current_word_index_testing + 1) / st.session_state.total_steps_testing
-        st.progress(progress)
-        st.write(f"**Progress:** {st.session_state.current_word_index_testing + 1}/{st.session_state.total_steps_testing}")
+
+        # Load this item's and the next items' reference audio in the background
+        get_prefetcher().prefetch(
+            ('testing', phoneme_type),
+            all_words,
+            st.session_state.current_word_index_testing,
+            lambda item: item.sentence,
+        )
+
+        testing_item_panel(current_word_data, st.session_state.current_word_index_testing)
+        testing_answer_panel(
+            current_word_data,
+            phoneme_type,
+            st.session_state.current_word_index_testing,
+        )
+        show_progress(st.session_state.current_word_index_testing, st.session_state.total_steps_testing)
 
     else:
         end_session_testing()
@@ -320,12 +523,74 @@ def phoneme_testing(phoneme_type):
 # Phoneme Practice Logic
 # ==========================
 
+@st.fragment
+@timed_panel
+def practice_item_panel(current_sentence_data, current_index, total):
+    st.subheader(f"Sentence {current_index + 1} of {total}")
+    st.write(f"**Phonemic Contrast:** {st.session_state.selected_practice_contrast}")
+    st.write(f"**Pronounce the following sentence:**")
+    st.markdown(f'"{current_sentence_data.sentence}"')
+
+    # Listen to Audio Example
+    audio_example_panel(current_sentence_data.sentence, f"audio_practice_{current_index}")
+
+@st.fragment
+@timed_panel
+def practice_answer_panel(current_sentence_data, item_id, position):
+    # Recording, grading and feedback rerun here without redrawing the page
+    if not st.session_state.has_answered_practice:
+        if not record_take('practice', current_sentence_data.target_word):
+            return
+    practice_feedback(current_sentence_data, item_id, position)
+
+def practice_feedback(current_sentence_data, item_id, position):
+    current_sentence = current_sentence_data.sentence
+    target_word = current_sentence_data.target_word
+
+    # Display the user's recording with a label
+    st.write("Your Recording:")
+    if st.session_state.recorded_audio_practice:
+        play_audio(st.session_state.recorded_audio_practice.read(), format='audio/wav')
+
+    # Display the ideal pronunciation
+    st.write("Ideal Pronunciation:")
+    ideal_audio = generate_audio(current_sentence)
+    if ideal_audio:
+        play_audio(ideal_audio, format='audio/mp3')
+
+    # Display the recognized text and feedback
+    st.write(f"You said: **{st.session_state.recognized_text_practice}**")
+    show_confidence(st.session_state.get('confidence_practice'))
+
+    # Provide feedback
+    if st.session_state.correct_practice:
+        feedback = f"**Good job!** You pronounced '{target_word}' correctly."
+    else:
+        feedback = f"**You said '{st.session_state.recognized_text_practice}', but the correct word was '{target_word}'.**"
+    st.write(feedback)
+
+    # Store result (an upsert, so reruns of this panel never add duplicates)
+    get_results_store().record(
+        get_session_id(), 'practice', item_id, st.session_state.results_attempt_practice, position,
+        current_sentence,
+        st.session_state.recognized_text_practice,
+        st.session_state.correct_practice,
+        phoneme_type=st.session_state.selected_phoneme_type_practice,
+        contrast=st.session_state.selected_practice_contrast,
+        level=selected_practice_level_key(),
+    )
+
+    if st.button("Continue"):
+        continue_to_next_practice()
+        # Moving to the next item redraws the whole page
+        st.rerun()
+
 def phoneme_practice():
     practice_type = st.session_state.selected_phoneme_type_practice
     st.title(f"{practice_type.capitalize()} Practice")
 
     # Fetch all pairs for the selected practice type
-    all_pairs = st.session_state.phoneme_data_practice.get(practice_type, {})
+    all_pairs = get_corpus().practice.get(practice_type, {})
 
     if not all_pairs:
         st.write(f"No data available for {practice_type.capitalize()} practice.")
@@ -348,19 +613,16 @@ def phoneme_practice():
         st.session_state.last_selected_contrast = selected_contrast
         if selected_contrast:
             st.session_state.selected_practice_contrast = selected_contrast
-            st.session_state.selected_practice_minimal_pairs = all_pairs[selected_contrast]
             st.session_state.selected_practice_level = None
-            st.session_state.practice_sentences = []
             st.session_state.current_sentence_index_practice = 0
             st.session_state.has_answered_practice = False
             st.session_state.error_occurred_practice = False
-            st.session_state.results_practice = []
+            st.session_state.results_attempt_practice += 1
             st.session_state.recognized_text_practice = ''
             st.session_state.correct_practice = False
-            st.session_state.recorded_audio_practice = None
+            set_recorded_take('practice', None)
         else:
             st.session_state.selected_practice_contrast = None
-            st.session_state.selected_practice_minimal_pairs = None
 
     # ==========================
     # Step 2: Select Practice Level
@@ -372,140 +634,128 @@ def phoneme_practice():
         # When the level changes, reset relevant session state variables
         if st.session_state.get('selected_practice_level') != level:
             st.session_state.selected_practice_level = level
-            # Prepare the list of sentences based on the selected level
-            level_key = f"level_{level.split()[-1]}"
-
-            practice_sentences = []
-
-            for pair_data in st.session_state.selected_practice_minimal_pairs:
-                sentence_1 = pair_data[level_key][0]
-                sentence_2 = pair_data[level_key][1]
-
-                practice_sentences.append({
-                    "sentence": sentence_1,
-                    "target_word": pair_data['pair'][0]
-                })
-                practice_sentences.append({
-                    "sentence": sentence_2,
-                    "target_word": pair_data['pair'][1]
-                })
-
-            st.session_state.practice_sentences = practice_sentences
             # Reset practice state variables
             st.session_state.current_sentence_index_practice = 0
             st.session_state.has_answered_practice = False
             st.session_state.error_occurred_practice = False
-            st.session_state.results_practice = []
+            st.session_state.results_attempt_practice += 1
             st.session_state.recognized_text_practice = ''
             st.session_state.correct_practice = False
-            st.session_state.recorded_audio_practice = None
+            set_recorded_take('practice', None)
 
     # ==========================
     # Step 3: Practice Sentences
     # ==========================
+    practice_sentences = get_practice_sentences()
+
     if (st.session_state.selected_practice_contrast is not None and
         st.session_state.selected_practice_level is not None and
-        st.session_state.current_sentence_index_practice < len(st.session_state.practice_sentences)):
+        st.session_state.current_sentence_index_practice < len(practice_sentences)):
 
-        current_sentence_data = st.session_state.practice_sentences[st.session_state.current_sentence_index_practice]
-        current_sentence = current_sentence_data['sentence']
-        target_word = current_sentence_data['target_word']
         current_index = st.session_state.current_sentence_index_practice
-
-        st.subheader(f"Sentence {current_index + 1} of {len(st.session_state.practice_sentences)}")
-        st.write(f"**Phonemic Contrast:** {st.session_state.selected_practice_contrast}")
-        st.write(f"**Pronounce the following sentence:**")
-        st.markdown(f'"{current_sentence}"')
-
-        # Listen to Audio Example
-        if st.checkbox("Listen to audio example", key=f"audio_practice_{current_index}"):
-            audio_bytes = generate_audio(current_sentence)
-            if audio_bytes:
-                st.audio(audio_bytes, format='audio/mp3')
-
-        if not st.session_state.has_answered_practice:
-            st.write("Please click on the microphone to start recording.")
-
-            # Use the correct parameter to change the microphone icon color
-            audio_bytes = audio_recorder(
-                recording_color="#006400",  # Dark green when recording
-                neutral_color="#404040"     # Dark gray when not recording
-            )
-
-            if audio_bytes:
-                # Store the recorded audio in session state
-                st.session_state.recorded_audio_practice = audio_bytes
-
-                # Perform speech recognition
-                recognized_text, correct = recognize_speech_from_audio(audio_bytes, target_word)
-                if recognized_text:
-                    st.session_state.recognized_text_practice = recognized_text
-                    st.session_state.correct_practice = correct
-                    st.session_state.has_answered_practice = True
-
-                    st.rerun()
-                else:
-                    st.error("Could not understand the audio. Please try again.")
-                    # Allow re-recording
-        else:
-            # Display the user's recording with a label
-            st.write("Your Recording:")
-            if st.session_state.recorded_audio_practice:
-                st.audio(st.session_state.recorded_audio_practice, format='audio/wav')
-
-            # Display the ideal pronunciation
-            st.write("Ideal Pronunciation:")
-            ideal_audio = generate_audio(current_sentence)
-            if ideal_audio:
-                st.audio(ideal_audio, format='audio/mp3')
-
-            # Display the recognized text and feedback
-            st.write(f"You said: **{st.session_state.recognized_text_practice}**")
-
-            # Provide feedback
-            if st.session_state.correct_practice:
-                feedback = f"**Good job!** You pronounced '{target_word}' correctly."
-            else:
-                feedback = f"**You said '{st.session_state.recognized_text_practice}', but the correct word was '{target_word}'.**"
-            st.write(feedback)
-
-            # Store result
-            st.session_state.results_practice.append({
-                'Sentence': current_sentence,
-                'Your Pronunciation': st.session_state.recognized_text_practice,
-                'Correct': st.session_state.correct_practice
-            })
-
-            if st.button("Continue"):
-                continue_to_next_practice()
-                st.rerun()
-
-        progress = (st.session_state.current_sentence_index_practice + 1) / len(st.session_state.practice_sentences)
-        st.progress(progress)
-        st.write(f"**Progress:** {st.session_state.current_sentence_index_practice + 1}/{len(st.session_state.practice_sentences)}")
+        current_sentence_data = practice_sentences[current_index]
+
+        # Load this item's and the next items' reference audio in the background
+        get_prefetcher().prefetch(
+            ('practice', practice_type, st.session_state.selected_practice_contrast,
+             st.session_state.selected_practice_level),
+            practice_sentences,
+            current_index,
+            lambda item: item.sentence,
+        )
+
+        practice_item_panel(current_sentence_data, current_index, len(practice_sentences))
+        practice_answer_panel(
+            current_sentence_data,
+            practice_item_id(practice_type, st.session_state.selected_practice_contrast,
+                             selected_practice_level_key(), current_index),
+            current_index,
+        )
+        show_progress(current_index, len(practice_sentences))
 
     # ==========================
     # Check if Practice Session is Complete
     # ==========================
     elif (st.session_state.selected_practice_contrast is not None and
           st.session_state.selected_practice_level is not None and
-          st.session_state.current_sentence_index_practice >= len(st.session_state.practice_sentences)):
+          st.session_state.current_sentence_index_practice >= len(practice_sentences)):
         end_session_practice()
 
+# ==========================
+# Cohort Analytics
+# ==========================
+
+ANALYTICS_DIMENSIONS = {
+    "Contrast": 'contrast',
+    "Phoneme type": 'phoneme_type',
+    "Practice level": 'level',
+    "Learner": 'learner',
+}
+
+def analytics_unlocked():
+    # Unlocking lasts for the browser session
+    if not st.session_state.get('analytics_unlocked'):
+        password = st.text_input("Password", type='password', key='analytics_password')
+        if not password:
+            return False
+        if not hmac.compare_digest(password.encode('utf-8'), config.ANALYTICS_PASSWORD.encode('utf-8')):
+            st.error("Incorrect password.")
+            return False
+        st.session_state.analytics_unlocked = True
+    return True
+
+def cohort_analytics():
+    st.title("Cohort Analytics")
+    if not analytics_unlocked():
+        return
+    st.write("Aggregated over every learner's answers; most-missed first.")
+
+    mode = st.radio("Mode", ["All", "Testing", "Practice"], horizontal=True)
+    mode = None if mode == "All" else mode.lower()
+    correct, attempts = analytics.totals(mode)
+    if not attempts:
+        st.info("No answers have been recorded yet.")
+        return
+    st.write(f"**Overall:** {correct}/{attempts} correct ({correct / attempts:.0%})")
+
+    label = st.selectbox("Group by", list(ANALYTICS_DIMENSIONS))
+    rows = analytics.rollups(ANALYTICS_DIMENSIONS[label], mode, limit=50)
+    if mode != 'practice' and ANALYTICS_DIMENSIONS[label] == 'contrast':
+        st.caption("A testing answer counts towards every contrast its word drills; "
+                   "a miss counts against the contrast it showed, or all of them if none could be told.")
+    st.table([
+        {label: row.value, 'Attempts': row.attempts, 'Missed': row.misses, 'Error rate': f"{row.error_rate:.0%}"}
+        for row in rows
+    ])
+
 # ==========================
 # Main Function with Sidebar
 # ==========================
 
-def main():
+def show_cache_stats():
+    stats = get_default_cache().stats()
+    with st.sidebar.expander("Audio cache"):
+        st.write(f"Hits: {stats['hits']} / Misses: {stats['misses']} ({stats['hit_rate']:.0%} hit rate)")
+    stats = get_recognition_cache().stats()
+    with st.sidebar.expander("Recognition cache"):
+        st.write(f"Hits: {stats['hits'] + stats['shared_hits']} / Misses: {stats['misses']} ({stats['hit_rate']:.0%} hit rate)")
+    stats = audio_preprocess.stats()
+    with st.sidebar.expander("Audio pre-processing"):
+        st.write(f"Takes: {stats['calls']} ({stats['rejected']} rejected locally)")
+        st.write(f"Upload saved: {stats['bytes_saved'] / 1024:.0f} KB")
+    usage = recording_store.memory_usage()
+    with st.sidebar.expander("Recordings"):
+        st.write(f"In memory: {usage['resident_bytes'] / 1024:.0f} KB in {usage['resident_takes']} takes")
+        st.write(f"Spilled to disk: {usage['spilled_bytes'] / 1024:.0f} KB across {usage['sessions']} sessions")
+
+def render_page():
     st.sidebar.title("Navigation")
-    section = st.sidebar.radio("Choose a Section", ["Phoneme Testing", "Phoneme Practice"])
+    sections = ["Phoneme Testing", "Phoneme Practice"]
+    if config.ANALYTICS_PASSWORD:
+        sections.append("Cohort Analytics")
+    section = st.sidebar.radio("Choose a Section", sections)
 
     if section == "Phoneme Testing":
-        # Load phoneme testing data if not already loaded
-        if not st.session_state.phoneme_data_testing:
-            data_testing = load_phoneme_data('phoneme_testing.json')
-            st.session_state.phoneme_data_testing = data_testing
-
         # Submenu for testing modes
         testing_mode = st.sidebar.radio("Select Phoneme Type", ["Vowel Testing", "Diphthong Testing", "Consonant Testing"])
 
@@ -522,11 +772,6 @@ def main():
             phoneme_testing(phoneme_type)
 
     elif section == "Phoneme Practice":
-        # Load phoneme practice data if not already loaded
-        if not st.session_state.phoneme_data_practice:
-            data_practice = load_phoneme_data('phoneme_practice.json')
-            st.session_state.phoneme_data_practice = data_practice.get('phoneme_practice', {})
-
         # Submenu for practice modes
         practice_mode = st.sidebar.radio("Select Phoneme Type", ["Vowel Practice", "Diphthong Practice", "Consonant Practice"])
 
@@ -542,18 +787,34 @@ def main():
         if st.session_state.get('last_selected_phoneme_type_practice') != st.session_state.selected_phoneme_type_practice:
             st.session_state.last_selected_phoneme_type_practice = st.session_state.selected_phoneme_type_practice
             st.session_state.selected_practice_contrast = None
-            st.session_state.selected_practice_minimal_pairs = None
             st.session_state.selected_practice_level = None
-            st.session_state.practice_sentences = []
             st.session_state.current_sentence_index_practice = 0
             st.session_state.has_answered_practice = False
             st.session_state.error_occurred_practice = False
-            st.session_state.results_practice = []
+            st.session_state.results_attempt_practice += 1
             st.session_state.recognized_text_practice = ''
             st.session_state.correct_practice = False
-            st.session_state.recorded_audio_practice = None
+            set_recorded_take('practice', None)
 
         phoneme_practice()
 
+    elif section == "Cohort Analytics":
+        cohort_analytics()
+
+    if config.SHOW_DIAGNOSTICS:
+        show_cache_stats()
+
+def main():
+    # Aggregated spans are scraped from this process at /metrics
+    metrics.start_metrics_server()
+    with metrics.span('script_run') as span:
+        render_page()
+    # Runs once per process, after the first page has been sent
+    start_warm_up()
+    elapsed_ms = span.seconds * 1000
+    st.session_state.setdefault('panel_timings', {})['script_run'] = elapsed_ms
+    if config.SHOW_TIMINGS:
+        st.sidebar.caption(f"Server time (full run): {elapsed_ms:.1f} ms")
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,538 @@
+# asr_backends.py
+
+import array
+import hashlib
+import io
+import json
+import logging
+import math
+import random
+import struct
+import sys
+import threading
+import time
+import wave
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import config
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class RecognitionError(Exception):
+    """The recognizer could not be reached or failed while decoding."""
+
+
+class RecognitionTimeout(RecognitionError):
+    """The recognizer did not answer within the requested deadline."""
+
+
+# ==========================
+# Backend Interface
+# ==========================
+
+class ASRBackend:
+    """
+    Base class for speech recognition engines.
+
+    Subclasses implement `recognize_n_best`; `recognize` returns its top
+    hypothesis. An empty result means the audio was not understood, while
+    service failures raise `RecognitionError`.
+    """
+
+    name = 'base'
+    display_name = 'Speech recognition'
+    # Whether to send the resampled, trimmed audio from audio_preprocess
+    preprocess = True
+
+    @property
+    def identity(self):
+        """A string that changes whenever the backend could transcribe differently."""
+        return self.name
+
+    def recognize(self, audio_bytes, timeout=None):
+        """
+        Transcribe a WAV recording.
+
+        Parameters:
+        - audio_bytes (bytes): The WAV file contents.
+        - timeout (float): Seconds to wait before raising `RecognitionTimeout`.
+
+        Returns:
+        - str: The best transcript, or an empty string if nothing was understood.
+        """
+        hypotheses = self.recognize_n_best(audio_bytes, n=1, timeout=timeout)
+        return hypotheses[0][0] if hypotheses else ""
+
+    def recognize_n_best(self, audio_bytes, n=5, timeout=None):
+        """
+        Transcribe a WAV recording into up to `n` ranked hypotheses.
+
+        Returns:
+        - list: `(transcript, confidence)` tuples, best first. Confidence is
+          a probability in [0, 1], or None when the engine does not report one.
+        """
+        raise NotImplementedError
+
+
+def _read_audio_data(audio_bytes):
+    import speech_recognition as sr
+
+    # sr.AudioFile handles WAV/AIFF/FLAC and downmixes to mono for us
+    recognizer = sr.Recognizer()
+    with sr.AudioFile(io.BytesIO(audio_bytes)) as source:
+        return recognizer.record(source)
+
+
+# ==========================
+# Google Web Speech API
+# ==========================
+
+class GoogleBackend(ASRBackend):
+    name = 'google'
+    display_name = 'Google Speech Recognition'
+
+    def recognize_n_best(self, audio_bytes, n=5, timeout=None):
+        import speech_recognition as sr
+
+        recognizer = sr.Recognizer()
+        recognizer.operation_timeout = timeout
+        audio = _read_audio_data(audio_bytes)
+        try:
+            response = recognizer.recognize_google(audio, show_all=True, endpoint=config.GOOGLE_ASR_ENDPOINT)
+        except sr.UnknownValueError:
+            return []
+        except sr.WaitTimeoutError as e:
+            raise RecognitionTimeout(str(e)) from e
+        except sr.RequestError as e:
+            if 'timed out' in str(e):
+                raise RecognitionTimeout(str(e)) from e
+            raise RecognitionError(str(e)) from e
+
+        # show_all returns [] when nothing was recognized
+        if not response:
+            return []
+        alternatives = response.get('alternative', [])
+        return [(alt['transcript'], alt.get('confidence')) for alt in alternatives[:n]]
+
+
+# ==========================
+# Vosk (offline, CPU)
+# ==========================
+
+_vosk_models = {}
+_vosk_models_lock = threading.Lock()
+
+
+def _load_vosk_model(model_path):
+    # Models are hundreds of MB; load each one once per process
+    with _vosk_models_lock:
+        model = _vosk_models.get(model_path)
+        if model is None:
+            try:
+                import vosk
+            except ImportError as e:
+                raise RecognitionError(
+                    "The 'vosk' package is required for the offline backend. "
+                    "Install it with `pip install vosk`."
+                ) from e
+            vosk.SetLogLevel(-1)
+            model = vosk.Model(model_path)
+            _vosk_models[model_path] = model
+        return model
+
+
+class VoskBackend(ASRBackend):
+    name = 'vosk'
+    display_name = 'Offline speech recognition'
+    sample_rate = 16000
+    # Frames fed to the decoder between deadline checks (0.25 s of audio)
+    chunk_bytes = 8000
+
+    def __init__(self, model_path):
+        self.model_path = model_path
+        self.model = _load_vosk_model(model_path)
+
+    @property
+    def identity(self):
+        return f"{self.name}:{self.model_path}"
+
+    def recognize_n_best(self, audio_bytes, n=5, timeout=None):
+        import vosk
+
+        audio = _read_audio_data(audio_bytes)
+        pcm = audio.get_raw_data(convert_rate=self.sample_rate, convert_width=2)
+
+        decoder = vosk.KaldiRecognizer(self.model, self.sample_rate)
+        decoder.SetMaxAlternatives(n)
+        deadline = time.monotonic() + timeout if timeout else None
+        for offset in range(0, len(pcm), self.chunk_bytes):
+            if deadline and time.monotonic() > deadline:
+                raise RecognitionTimeout(f"Offline recognition exceeded {timeout}s")
+            decoder.AcceptWaveform(pcm[offset:offset + self.chunk_bytes])
+
+        result = json.loads(decoder.FinalResult())
+        alternatives = [(alt.get('text', '').strip(), alt.get('confidence', 0.0))
+                        for alt in result.get('alternatives', [])]
+        alternatives = [(text, score) for text, score in alternatives if text][:n]
+        if not alternatives:
+            return []
+        # Vosk reports lattice log-scores; normalize them into probabilities
+        top = max(score for _, score in alternatives)
+        weights = [math.exp(score - top) for _, score in alternatives]
+        total = sum(weights)
+        return [(text, weight / total) for (text, _), weight in zip(alternatives, weights)]
+
+
+# ==========================
+# Fake (deterministic, for tests and load tests)
+# ==========================
+
+# RIFF chunk id used to embed the expected transcript in synthetic recordings
+FAKE_TRANSCRIPT_CHUNK = b'asrt'
+
+
+def make_fake_recording(transcript, seconds=1.0, sample_rate=16000):
+    """
+    Build a mono WAV whose embedded transcript the fake backend returns.
+
+    The signal is a tone between short silences, so it passes the voice
+    activity check in audio_preprocess like a real take. Alternatives for
+    n-best results can be given separated by '|'.
+    """
+    frame_count = int(seconds * sample_rate)
+    silence = min(frame_count // 4, int(0.2 * sample_rate))
+    samples = array.array('h', bytes(2 * frame_count))
+    for i in range(silence, frame_count - silence):
+        samples[i] = int(8000 * math.sin(2 * math.pi * 220 * i / sample_rate))
+    if sys.byteorder == 'big':
+        samples.byteswap()
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(samples.tobytes())
+    payload = transcript.encode('utf-8')
+    if len(payload) % 2:
+        payload += b'\0'
+    chunk = FAKE_TRANSCRIPT_CHUNK + struct.pack('<I', len(payload)) + payload
+    data = buffer.getvalue() + chunk
+    # Patch the RIFF size to cover the extra chunk
+    return data[:4] + struct.pack('<I', len(data) - 8) + data[8:]
+
+
+def _find_riff_chunk(audio_bytes, chunk_id):
+    if audio_bytes[:4] != b'RIFF' or audio_bytes[8:12] != b'WAVE':
+        return None
+    offset = 12
+    while offset + 8 <= len(audio_bytes):
+        current_id = audio_bytes[offset:offset + 4]
+        size = struct.unpack('<I', audio_bytes[offset + 4:offset + 8])[0]
+        if current_id == chunk_id:
+            return audio_bytes[offset + 8:offset + 8 + size]
+        offset += 8 + size + (size % 2)
+    return None
+
+
+class FakeBackend(ASRBackend):
+    """
+    Returns canned transcripts without touching the audio signal.
+
+    Lookup order: a transcript embedded by `make_fake_recording`, then the
+    `transcripts` mapping keyed on the SHA-256 of the audio bytes, then
+    `default`. `latency` seconds are slept per call to mimic a remote service.
+    """
+
+    name = 'fake'
+    display_name = 'Fake speech recognition'
+    # The transcript chunk would not survive re-encoding
+    preprocess = False
+
+    def __init__(self, transcripts=None, default='', latency=0.0):
+        self.transcripts = transcripts or {}
+        self.default = default
+        self.latency = latency
+
+    def recognize_n_best(self, audio_bytes, n=5, timeout=None):
+        if self.latency:
+            if timeout is not None and self.latency > timeout:
+                time.sleep(timeout)
+                raise RecognitionTimeout(f"Fake recognition exceeded {timeout}s")
+            time.sleep(self.latency)
+
+        embedded = _find_riff_chunk(audio_bytes, FAKE_TRANSCRIPT_CHUNK)
+        if embedded is not None:
+            transcript = embedded.rstrip(b'\0').decode('utf-8')
+        else:
+            digest = hashlib.sha256(audio_bytes).hexdigest()
+            transcript = self.transcripts.get(digest, self.default)
+
+        alternatives = [alt.strip() for alt in transcript.split('|') if alt.strip()][:n]
+        # Harmonic rank weights, normalized like a real engine's probabilities
+        weights = [1.0 / (rank + 1) for rank in range(len(alternatives))]
+        return [(alt, weight / sum(weights)) for alt, weight in zip(alternatives, weights)]
+
+
+# ==========================
+# Resilience
+# ==========================
+
+class CircuitBreaker:
+    """
+    Stops calling a backend after `failure_threshold` consecutive failures.
+
+    The circuit stays open for `reset_seconds`, then lets a single trial call
+    through (half-open): success closes it, failure opens it again.
+    """
+
+    def __init__(self, name, failure_threshold, reset_seconds):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def _transition(self, state):
+        self.state = state
+        metrics.get_metrics().increment('minimal_pairs_asr_breaker_transitions_total', backend=self.name, state=state)
+        if state == 'open':
+            logger.warning("Speech recognition backend %r failed %d times in a row; routing around it for %g s",
+                           self.name, self.failures, self.reset_seconds)
+
+    def allow(self):
+        """Return True if a call may go to the backend now."""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self._transition('half_open')
+                return True
+            # Half-open admits only the trial call already in flight
+            return False
+
+    def is_open(self):
+        with self._lock:
+            return self.state == 'open'
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            if self.state != 'closed':
+                self._transition('closed')
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or (self.state == 'closed' and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                self._transition('open')
+
+
+_call_executor = None
+_call_executor_lock = threading.Lock()
+
+
+def _get_call_executor():
+    # Calls run here so a recognition pool thread can wait on a primary and a hedge at once
+    global _call_executor
+    with _call_executor_lock:
+        if _call_executor is None:
+            _call_executor = ThreadPoolExecutor(max_workers=2 * config.ASR_MAX_CONCURRENCY,
+                                                thread_name_prefix='asr-call')
+        return _call_executor
+
+
+class ResilientBackend(ASRBackend):
+    """
+    Fronts a primary backend with retries, hedging and circuit breakers.
+
+    - Failed requests (not timeouts) are retried up to `retries` times with
+      full-jitter exponential backoff, within the caller's deadline.
+    - With a `hedge` backend, a second request goes to it once the primary is
+      slower than its recent p95 latency, or at once if the primary fails or
+      its circuit is open; the first answer wins.
+    - Each backend has its own `CircuitBreaker`.
+
+    Both backends receive the same audio, pre-processed if the primary wants
+    it. The losing request is not interrupted; its result is discarded.
+    """
+
+    # Recent primary latencies kept for the hedge delay, and how many are needed first
+    latency_window = 200
+    min_latency_samples = 20
+
+    def __init__(self, primary, hedge=None, retries=config.ASR_RETRIES,
+                 retry_base_delay=config.ASR_RETRY_BASE_DELAY, retry_max_delay=config.ASR_RETRY_MAX_DELAY,
+                 hedge_percentile=config.ASR_HEDGE_PERCENTILE, hedge_min_delay=config.ASR_HEDGE_MIN_DELAY,
+                 hedge_default_delay=config.ASR_HEDGE_DEFAULT_DELAY,
+                 breaker_failures=config.ASR_BREAKER_FAILURES, breaker_reset=config.ASR_BREAKER_RESET_SECONDS):
+        self.primary = primary
+        self.hedge = hedge
+        self.retries = retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_default_delay = hedge_default_delay
+        self.breakers = {
+            backend: CircuitBreaker(backend.name, breaker_failures, breaker_reset)
+            for backend in (primary, hedge) if backend is not None
+        }
+        self._latencies = deque(maxlen=self.latency_window)
+        self._latencies_lock = threading.Lock()
+
+    @property
+    def name(self):
+        return self.primary.name
+
+    @property
+    def display_name(self):
+        return self.primary.display_name
+
+    @property
+    def preprocess(self):
+        return self.primary.preprocess
+
+    @property
+    def identity(self):
+        # Cached results may have come from either engine
+        if self.hedge is None:
+            return self.primary.identity
+        return f"{self.primary.identity}|hedge={self.hedge.identity}"
+
+    def hedge_delay(self):
+        """Seconds to wait on the primary before hedging: its recent p95 latency."""
+        with self._latencies_lock:
+            samples = sorted(self._latencies)
+        if len(samples) < self.min_latency_samples:
+            return self.hedge_default_delay
+        index = min(len(samples) - 1, int(len(samples) * self.hedge_percentile / 100))
+        return max(self.hedge_min_delay, samples[index])
+
+    def _call(self, backend, audio_bytes, n, deadline, retries):
+        breaker = self.breakers[backend]
+        registry = metrics.get_metrics()
+        for attempt in range(retries + 1):
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise RecognitionTimeout(f"{backend.display_name} ran out of time")
+            start = time.monotonic()
+            try:
+                hypotheses = backend.recognize_n_best(audio_bytes, n=n, timeout=remaining)
+            except RecognitionTimeout:
+                # The remaining budget is spent; there is nothing left to retry with
+                breaker.record_failure()
+                registry.increment('minimal_pairs_asr_attempts_total', backend=backend.name, outcome='timeout')
+                raise
+            except RecognitionError:
+                breaker.record_failure()
+                registry.increment('minimal_pairs_asr_attempts_total', backend=backend.name, outcome='error')
+                delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+                out_of_time = deadline is not None and time.monotonic() + delay >= deadline
+                if attempt == retries or out_of_time or breaker.is_open():
+                    raise
+                registry.increment('minimal_pairs_asr_retries_total', backend=backend.name)
+                time.sleep(delay)
+                continue
+            breaker.record_success()
+            registry.increment('minimal_pairs_asr_attempts_total', backend=backend.name, outcome='success')
+            if backend is self.primary:
+                with self._latencies_lock:
+                    self._latencies.append(time.monotonic() - start)
+            return hypotheses
+
+    def recognize_n_best(self, audio_bytes, n=5, timeout=None):
+        registry = metrics.get_metrics()
+        executor = _get_call_executor()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        pending = {}
+        error = None
+
+        def send_hedge(reason):
+            if self.hedge is None:
+                return
+            if not self.breakers[self.hedge].allow():
+                registry.increment('minimal_pairs_asr_short_circuits_total', backend=self.hedge.name)
+                return
+            registry.increment('minimal_pairs_asr_hedges_total', reason=reason)
+            # The hedge is already the backup, so it gets a single attempt
+            pending[executor.submit(self._call, self.hedge, audio_bytes, n, deadline, 0)] = 'hedge'
+
+        hedged = self.hedge is None
+        if self.breakers[self.primary].allow():
+            pending[executor.submit(self._call, self.primary, audio_bytes, n, deadline, self.retries)] = 'primary'
+        else:
+            registry.increment('minimal_pairs_asr_short_circuits_total', backend=self.primary.name)
+            send_hedge('circuit_open')
+            hedged = True
+        hedge_at = time.monotonic() + self.hedge_delay()
+
+        while pending:
+            wait_until = deadline if hedged else hedge_at if deadline is None else min(hedge_at, deadline)
+            remaining = None if wait_until is None else max(0.0, wait_until - time.monotonic())
+            done, _ = wait(list(pending), timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                role = pending.pop(future)
+                try:
+                    hypotheses = future.result()
+                except RecognitionError as e:
+                    if error is None or role == 'primary':
+                        error = e
+                    continue
+                if self.hedge is not None and hedged:
+                    registry.increment('minimal_pairs_asr_hedge_winners_total', winner=role)
+                return hypotheses
+            if not hedged and (not pending or time.monotonic() >= hedge_at):
+                send_hedge('slow' if pending else 'failed')
+                hedged = True
+            elif not done and deadline is not None and time.monotonic() >= deadline:
+                raise RecognitionTimeout(f"{self.display_name} did not answer within {timeout}s")
+
+        if error is not None:
+            raise error
+        raise RecognitionError(f"{self.display_name} is temporarily unavailable; try again shortly.")
+
+
+# ==========================
+# Backend Selection
+# ==========================
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def create_backend(name):
+    if name == 'google':
+        return GoogleBackend()
+    if name == 'vosk':
+        return VoskBackend(config.VOSK_MODEL_PATH)
+    if name == 'fake':
+        return FakeBackend(default=config.FAKE_ASR_DEFAULT_TRANSCRIPT, latency=config.FAKE_ASR_LATENCY)
+    raise ValueError(f"Unknown ASR backend {name!r}; expected 'google', 'vosk' or 'fake'.")
+
+
+def get_backend():
+    """
+    Return the process-wide backend selected by `config.ASR_BACKEND`.
+
+    It is wrapped in a `ResilientBackend`, hedged with `config.ASR_HEDGE_BACKEND`
+    when that is set and loads.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            hedge = None
+            if config.ASR_HEDGE_BACKEND and config.ASR_HEDGE_BACKEND != config.ASR_BACKEND:
+                try:
+                    hedge = create_backend(config.ASR_HEDGE_BACKEND)
+                except Exception as e:
+                    # The hedge is optional; recognition still works without it
+                    logger.warning("Hedging disabled; could not load the %r backend: %s", config.ASR_HEDGE_BACKEND, e)
+            _backend = ResilientBackend(create_backend(config.ASR_BACKEND), hedge)
+        return _backend
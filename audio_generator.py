@@ -1,33 +1,178 @@
-from gtts import gTTS
-import os
+# audio_generator.py
+#
+# Pre-render reference audio for every item in the practice and testing corpora.
+#
+#     python audio_generator.py [--workers N] [--prune] [--no-pack] [--splice]
+#
+# Each clip is stored as `<content hash>.mp3` in the asset directory, so a
+# re-run only synthesizes text that is new or whose voice/language changed.
+# The manifest maps each text to its asset file, and all clips are also
+# bundled into one memory-mappable pack (see audio_pack.py) for the app to serve.
+#
+# With --splice, practice sentences are assembled from one clip per carrier
+# fragment ("That's a", "on the table.") and the clip of the word itself, so
+# the corpus needs a few hundred synthesis calls instead of one per sentence.
+
+import argparse
 import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import config
+from audio_pack import build_pack
+from corpus import iter_practice_items, iter_texts, load_corpus
+from reference_audio import synthesize
+from tts_cache import TTSCache
+
+
+def asset_filename(text):
+    return f"{TTSCache.make_key(text, config.TTS_LANG, config.TTS_VOICE)}.mp3"
+
+
+def _speakable(text):
+    return any(char.isalnum() for char in text)
+
+
+def splice_parts(item):
+    """
+    Return the texts whose clips make up a practice sentence, in order.
+
+    Returns:
+    - tuple: Carrier fragments and the filler, or None if the sentence has no slot.
+    """
+    if not item.filler:
+        return None
+    prefix, suffix = item.carrier
+    # Punctuation-only fragments ("." or "!") have nothing to say
+    return tuple(part for part in (prefix.strip(), item.filler, suffix.strip()) if _speakable(part))
+
+
+def render_asset(text, out_dir, parts=None):
+    path = os.path.join(out_dir, asset_filename(text))
+    if parts:
+        # MP3 frames are self-contained, so clips concatenate into one stream
+        data = b''.join(bytes(synthesize(part)) for part in parts)
+    else:
+        data = synthesize(text)
+    # Write atomically so a concurrent reader never sees a partial clip
+    fd, tmp_path = tempfile.mkstemp(dir=out_dir, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as file:
+        file.write(data)
+    os.replace(tmp_path, path)
+    return text
+
+
+def write_manifest(manifest, manifest_path, spliced=()):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(manifest_path), suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as file:
+        json.dump({'lang': config.TTS_LANG, 'voice': config.TTS_VOICE, 'assets': manifest,
+                   'spliced': sorted(spliced)},
+                  file, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def pack_assets(manifest, out_dir, pack_path):
+    """Bundle every asset in the manifest into a single pack file."""
+    def entries():
+        for asset in sorted(set(manifest.values())):
+            with open(os.path.join(out_dir, asset), 'rb') as file:
+                yield os.path.splitext(asset)[0], file.read()
+    return build_pack(entries(), pack_path)
+
+
+def _previously_spliced(manifest_path):
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as file:
+            return set(json.load(file).get('spliced', ()))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return set()
+
+
+def prerender(out_dir=config.AUDIO_ASSET_DIR, workers=config.AUDIO_RENDER_WORKERS, prune=False,
+              pack_path=config.AUDIO_PACK_PATH, splice=config.AUDIO_SPLICE_CARRIERS):
+    """
+    Synthesize all corpus texts whose asset is missing and rewrite the manifest.
+
+    Returns:
+    - dict: Counts of rendered, skipped, failed and pruned items, and of the
+      carrier fragments synthesized for spliced sentences.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    corpus = load_corpus()
+    # dict.fromkeys de-duplicates while keeping corpus order
+    texts = list(dict.fromkeys(iter_texts(corpus)))
+    manifest = {text: asset_filename(text) for text in texts}
+    manifest_path = os.path.join(out_dir, os.path.basename(config.AUDIO_MANIFEST_PATH))
+
+    splices = {}
+    if splice:
+        for item in iter_practice_items(corpus):
+            parts = splice_parts(item)
+            if parts:
+                splices[item.sentence] = parts
+
+    existing = set(os.listdir(out_dir))
+    # Clips switching between whole and spliced rendering keep their name, so redo them
+    switched = _previously_spliced(manifest_path) ^ set(splices)
+    pending = [text for text in texts if manifest[text] not in existing or text in switched]
+
+    summary = {'total': len(texts), 'rendered': 0, 'skipped': len(texts) - len(pending),
+               'failed': 0, 'pruned': 0, 'packed': 0, 'fragments': 0}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        # Synthesize each shared fragment once up front; assembling the
+        # sentences below then only reads the TTS cache
+        fragments = list(dict.fromkeys(part for text in pending for part in splices.get(text, ())))
+        for future in as_completed([executor.submit(synthesize, fragment) for fragment in fragments]):
+            if future.exception() is None:
+                summary['fragments'] += 1
+
+        futures = {executor.submit(render_asset, text, out_dir, splices.get(text)): text for text in pending}
+        for future in as_completed(futures):
+            text = futures[future]
+            try:
+                future.result()
+                summary['rendered'] += 1
+            except Exception as e:
+                summary['failed'] += 1
+                # Leave failed items out so the app falls back to live synthesis
+                del manifest[text]
+                print(f"Failed to render {text!r}: {e}")
+
+    if prune:
+        wanted = set(manifest.values())
+        for name in existing:
+            if name.endswith('.mp3') and name not in wanted:
+                os.remove(os.path.join(out_dir, name))
+                summary['pruned'] += 1
+
+    write_manifest(manifest, manifest_path, set(splices) & set(manifest))
+    if pack_path:
+        summary['packed'] = pack_assets(manifest, out_dir, pack_path)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-render reference audio for the corpora.")
+    parser.add_argument('--out', default=config.AUDIO_ASSET_DIR, help="Asset output directory.")
+    parser.add_argument('--workers', type=int, default=config.AUDIO_RENDER_WORKERS,
+                        help="Concurrent synthesis requests.")
+    parser.add_argument('--prune', action='store_true', help="Delete assets no longer in the corpora.")
+    parser.add_argument('--pack', default=config.AUDIO_PACK_PATH, help="Pack file to write.")
+    parser.add_argument('--no-pack', action='store_true', help="Skip writing the pack file.")
+    parser.add_argument('--splice', action=argparse.BooleanOptionalAction, default=config.AUDIO_SPLICE_CARRIERS,
+                        help="Assemble practice sentences from carrier and word clips.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    summary = prerender(args.out, args.workers, args.prune, None if args.no_pack else args.pack, args.splice)
+    elapsed = time.perf_counter() - start
+    print(f"{summary['total']} texts: {summary['rendered']} rendered ({summary['fragments']} carrier fragments), "
+          f"{summary['skipped']} unchanged, {summary['failed']} failed, {summary['pruned']} pruned, "
+          f"{summary['packed']} packed in {elapsed:.1f}s")
+
 
-# Load minimal pairs data
-def load_minimal_pairs(file_path):
-    with open(file_path, 'r') as file:
-        return json.load(file)
-
-data = load_minimal_pairs('minimal_pairs.json')
-
-# Function to generate audio
-def generate_audio(text, filename):
-    tts = gTTS(text=text, lang='en')
-    tts.save(filename)
-    print(f"Audio saved as {filename}")
-
-# Generate audio for Level 1
-for item in data['level_1']:
-    for word in item['pair']:
-        filename = f"audio/{word}.mp3"
-        if not os.path.exists(filename):
-            generate_audio(word, filename)
-
-# Generate audio for Level 2 and Level 3
-for level in ['level_2', 'level_3']:
-    for item in data[level]:
-        for pair in item['pair']:
-            sentence = pair['sentence']
-            # Create a safe filename
-            filename = f"audio/{'_'.join(sentence.lower().split())}.mp3"
-            if not os.path.exists(filename):
-                generate_audio(sentence, filename)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# audio_pack.py
+#
+# A single-file pack of reference clips with a sorted, fixed-size index.
+#
+# Layout (little-endian):
+#     header   MAGIC, version (u32), entry count (u32), index offset (u64)
+#     clips    raw MP3 bytes, back to back
+#     index    `count` records of (key digest (16 bytes), offset (u64), length (u32)),
+#              sorted by digest so lookups are a binary search over the mmap
+
+import mmap
+import os
+import struct
+import tempfile
+import threading
+
+import config
+
+MAGIC = b'MPPACK01'
+VERSION = 1
+HEADER = struct.Struct('<8sIIQ')
+RECORD = struct.Struct('<16sQI')
+DIGEST_BYTES = 16
+
+
+def key_digest(key):
+    """Truncate a hex cache key (see `TTSCache.make_key`) to the packed digest."""
+    return bytes.fromhex(key)[:DIGEST_BYTES]
+
+
+def build_pack(entries, pack_path):
+    """
+    Write a pack file atomically.
+
+    Parameters:
+    - entries (iterable): (hex key, clip bytes) pairs; duplicate keys keep the first clip.
+    - pack_path (str): Destination path.
+
+    Returns:
+    - int: The number of clips written.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(pack_path)), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(pack_path)), suffix='.tmp')
+    records = {}
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+            offset = HEADER.size
+            for key, data in entries:
+                digest = key_digest(key)
+                if digest in records:
+                    continue
+                file.write(data)
+                records[digest] = (offset, len(data))
+                offset += len(data)
+
+            index_offset = offset
+            for digest in sorted(records):
+                file.write(RECORD.pack(digest, *records[digest]))
+
+            file.seek(0)
+            file.write(HEADER.pack(MAGIC, VERSION, len(records), index_offset))
+        os.replace(tmp_path, pack_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return len(records)
+
+
+class AudioPack:
+    """
+    A read-only, memory-mapped view of a pack file.
+
+    `get` returns a memoryview into the mapping, so serving a clip costs no
+    syscalls and no copy until the bytes leave the process.
+    """
+
+    def __init__(self, pack_path):
+        self.pack_path = pack_path
+        with open(pack_path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+        magic, version, self.count, self.index_offset = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{pack_path} is not a version {VERSION} audio pack")
+
+    def __len__(self):
+        return self.count
+
+    def _record(self, position):
+        return RECORD.unpack_from(self._mmap, self.index_offset + position * RECORD.size)
+
+    def get(self, key):
+        """
+        Return the clip stored under a hex cache key.
+
+        Returns:
+        - memoryview: The clip bytes, or None if the key is not in the pack.
+        """
+        digest = key_digest(key)
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            record_digest, offset, length = self._record(middle)
+            if record_digest < digest:
+                low = middle + 1
+            elif record_digest > digest:
+                high = middle
+            else:
+                return self._view[offset:offset + length]
+        return None
+
+    def close(self):
+        self._view.release()
+        self._mmap.close()
+
+
+_pack = None
+_pack_loaded = False
+_pack_lock = threading.Lock()
+
+
+def get_default_pack():
+    """Return the process-wide pack at `config.AUDIO_PACK_PATH`, or None if there is none."""
+    global _pack, _pack_loaded
+    with _pack_lock:
+        if not _pack_loaded:
+            try:
+                _pack = AudioPack(config.AUDIO_PACK_PATH)
+            except (FileNotFoundError, ValueError):
+                _pack = None
+            _pack_loaded = True
+        return _pack
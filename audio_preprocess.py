@@ -0,0 +1,228 @@
+# audio_preprocess.py
+
+import io
+import threading
+import wave
+from collections import namedtuple
+
+import config
+import metrics
+
+# numpy is imported inside the functions that use it, so importing this module
+# for its counters costs nothing until the first take arrives
+
+PreprocessResult = namedtuple(
+    'PreprocessResult',
+    ['audio_bytes', 'input_bytes', 'output_bytes', 'bytes_saved', 'duration'],
+)
+
+# Analysis frame for the voice activity detector
+FRAME_SECONDS = 0.02
+# Silence kept around detected speech so word onsets are not clipped
+PADDING_SECONDS = 0.1
+# Length of the windowed-sinc anti-aliasing filter
+FILTER_TAPS = 63
+
+
+class AudioRejected(ValueError):
+    """The take is unusable and should be re-recorded without calling the recognizer."""
+
+
+# ==========================
+# Decode / Encode
+# ==========================
+
+def decode_wav(audio_bytes):
+    """
+    Decode PCM WAV bytes into float samples in [-1, 1].
+
+    Returns:
+    - tuple: (samples as a (frames, channels) float32 array, sample rate).
+    """
+    try:
+        with wave.open(io.BytesIO(audio_bytes), 'rb') as wav:
+            channels = wav.getnchannels()
+            sample_width = wav.getsampwidth()
+            sample_rate = wav.getframerate()
+            raw = wav.readframes(wav.getnframes())
+    except (wave.Error, EOFError) as e:
+        raise AudioRejected(f"The recording is not a readable WAV file ({e}).") from e
+
+    import numpy as np
+    if sample_width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif sample_width == 2:
+        samples = np.frombuffer(raw, dtype='<i2').astype(np.float32) / 32768.0
+    elif sample_width == 3:
+        # Widen 24-bit little-endian samples to int32 before scaling
+        packed = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+        widened = (packed[:, 0].astype(np.int32)
+                   | (packed[:, 1].astype(np.int32) << 8)
+                   | (packed[:, 2].astype(np.int32) << 16))
+        widened = np.where(widened & 0x800000, widened - 0x1000000, widened)
+        samples = widened.astype(np.float32) / 8388608.0
+    elif sample_width == 4:
+        samples = np.frombuffer(raw, dtype='<i4').astype(np.float32) / 2147483648.0
+    else:
+        raise AudioRejected(f"Unsupported sample width of {sample_width} bytes.")
+
+    return samples.reshape(-1, channels), sample_rate
+
+
+def encode_wav(samples, sample_rate):
+    """Encode mono float samples as 16-bit PCM WAV bytes."""
+    import numpy as np
+    pcm = np.clip(samples * 32767.0, -32768, 32767).astype('<i2')
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+# ==========================
+# Signal Processing
+# ==========================
+
+def downmix(samples):
+    """Average all channels into one."""
+    return samples.mean(axis=1) if samples.shape[1] > 1 else samples[:, 0]
+
+
+def resample(samples, source_rate, target_rate):
+    """
+    Resample mono audio with a windowed-sinc low-pass and linear interpolation.
+
+    Good enough for speech recognition input; not meant for playback quality.
+    """
+    if source_rate == target_rate or len(samples) == 0:
+        return samples
+
+    import numpy as np
+
+    if target_rate < source_rate:
+        # Low-pass just under the new Nyquist frequency to avoid aliasing
+        cutoff = 0.9 * target_rate / source_rate
+        taps = np.arange(FILTER_TAPS) - (FILTER_TAPS - 1) / 2
+        kernel = cutoff * np.sinc(cutoff * taps) * np.hamming(FILTER_TAPS)
+        kernel /= kernel.sum()
+        samples = np.convolve(samples, kernel.astype(np.float32), mode='same')
+
+    duration = len(samples) / source_rate
+    target_length = int(round(duration * target_rate))
+    source_times = np.arange(len(samples)) / source_rate
+    target_times = np.arange(target_length) / target_rate
+    return np.interp(target_times, source_times, samples).astype(np.float32)
+
+
+def detect_speech(samples, sample_rate, threshold_db=config.VAD_THRESHOLD_DB):
+    """
+    Find the span of speech with a frame-energy voice activity detector.
+
+    Returns:
+    - tuple: (start, end) sample indices, or None if no frame is voiced.
+    """
+    import numpy as np
+    frame_length = max(1, int(FRAME_SECONDS * sample_rate))
+    frame_count = len(samples) // frame_length
+    if frame_count == 0:
+        return None
+
+    frames = samples[:frame_count * frame_length].reshape(frame_count, frame_length)
+    energy = np.sqrt(np.mean(frames ** 2, axis=1))
+    peak = energy.max()
+    # Digital silence or a noise floor well below audible speech
+    if peak < 1e-3:
+        return None
+
+    voiced = np.flatnonzero(energy >= peak * 10 ** (-threshold_db / 20))
+    padding = int(PADDING_SECONDS * sample_rate)
+    start = max(0, voiced[0] * frame_length - padding)
+    end = min(len(samples), (voiced[-1] + 1) * frame_length + padding)
+    return start, end
+
+
+# ==========================
+# Pipeline
+# ==========================
+
+_stats = {'calls': 0, 'rejected': 0, 'input_bytes': 0, 'output_bytes': 0}
+_stats_lock = threading.Lock()
+
+
+def preprocess_recording(audio_bytes, target_rate=config.ASR_SAMPLE_RATE):
+    """
+    Prepare a browser recording for the recognizer.
+
+    Decodes the WAV once, downmixes to mono, checks for clipping, resamples to
+    `target_rate` and trims leading/trailing silence.
+
+    Parameters:
+    - audio_bytes (bytes): The WAV recording from the recorder widget.
+    - target_rate (int): The sample rate the recognizer expects.
+
+    Returns:
+    - PreprocessResult: The processed WAV and how many bytes it saved.
+
+    Raises:
+    - AudioRejected: If the take is empty, too short or clipped.
+    """
+    import numpy as np
+
+    try:
+        samples, sample_rate = decode_wav(audio_bytes)
+        if samples.size == 0:
+            raise AudioRejected("The recording is empty. Please try again.")
+
+        clipped = np.mean(np.abs(samples) >= 0.999)
+        if clipped > config.MAX_CLIPPED_FRACTION:
+            raise AudioRejected("The recording is too loud and distorted. Please move away from the microphone and try again.")
+
+        mono = resample(downmix(samples), sample_rate, target_rate)
+        span = detect_speech(mono, target_rate)
+        if span is None or (span[1] - span[0]) / target_rate < config.MIN_SPEECH_SECONDS:
+            raise AudioRejected("No speech was detected in the recording. Please try again.")
+    except AudioRejected:
+        with _stats_lock:
+            _stats['calls'] += 1
+            _stats['rejected'] += 1
+        raise
+
+    trimmed = mono[span[0]:span[1]]
+    processed = encode_wav(trimmed, target_rate)
+    result = PreprocessResult(
+        audio_bytes=processed,
+        input_bytes=len(audio_bytes),
+        output_bytes=len(processed),
+        bytes_saved=len(audio_bytes) - len(processed),
+        duration=len(trimmed) / target_rate,
+    )
+    with _stats_lock:
+        _stats['calls'] += 1
+        _stats['input_bytes'] += result.input_bytes
+        _stats['output_bytes'] += result.output_bytes
+    return result
+
+
+def stats():
+    """Return process-wide counters, including total bytes saved."""
+    with _stats_lock:
+        snapshot = dict(_stats)
+    snapshot['bytes_saved'] = snapshot['input_bytes'] - snapshot['output_bytes']
+    return snapshot
+
+
+def _collect_metrics():
+    snapshot = stats()
+    return [
+        ('minimal_pairs_preprocess_takes_total', 'counter', "Takes pre-processed before ASR, by outcome.",
+         [({'outcome': 'sent'}, snapshot['calls'] - snapshot['rejected']),
+          ({'outcome': 'rejected'}, snapshot['rejected'])]),
+        ('minimal_pairs_preprocess_saved_bytes_total', 'counter', "Upload bytes saved by pre-processing.",
+         [({}, snapshot['bytes_saved'])]),
+    ]
+
+
+metrics.get_metrics().register_collector(_collect_metrics)
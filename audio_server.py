@@ -0,0 +1,163 @@
+# audio_server.py
+#
+# A tiny static HTTP handler for reference clips. URLs are content-addressed
+# (/audio/<cache key>.mp3), so responses never change and browsers may cache
+# them forever; replaying a clip costs no Streamlit websocket traffic.
+
+import errno
+import os
+import re
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import config
+from audio_pack import get_default_pack
+from tts_cache import get_default_cache
+
+AUDIO_PATH = re.compile(r'^/audio/([0-9a-f]{64})\.mp3$')
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Answered on HEALTH_PATH, so a worker finding the port taken can tell a sibling from a stranger
+HEALTH_PATH = '/health'
+HEALTH_BODY = b'minimal-pairs-audio'
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def find_clip(key):
+    """Return the clip for a cache key from the pack, loose assets or TTS cache."""
+    pack = get_default_pack()
+    if pack is not None:
+        clip = pack.get(key)
+        if clip is not None:
+            return clip
+    try:
+        with open(os.path.join(config.AUDIO_ASSET_DIR, f"{key}.mp3"), 'rb') as file:
+            return file.read()
+    except FileNotFoundError:
+        pass
+    return get_default_cache().get(key)
+
+
+class AudioRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'MinimalPairsAudio/1'
+    protocol_version = 'HTTP/1.1'
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _serve(self, send_body):
+        path = self.path.split('?', 1)[0]
+        if path == HEALTH_PATH:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', str(len(HEALTH_BODY)))
+            self.send_header('Cache-Control', 'no-store')
+            self.end_headers()
+            if send_body:
+                self.wfile.write(HEALTH_BODY)
+            return
+
+        match = AUDIO_PATH.match(path)
+        clip = find_clip(match.group(1)) if match else None
+        if clip is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        etag = f'"{match.group(1)}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', CACHE_CONTROL)
+            self.end_headers()
+            return
+
+        # Browsers request byte ranges for media; serve a single range
+        start, end = 0, len(clip) - 1
+        range_match = RANGE.match(self.headers.get('Range', ''))
+        if range_match and (range_match.group(1) or range_match.group(2)):
+            if range_match.group(1):
+                start = int(range_match.group(1))
+                if range_match.group(2):
+                    end = min(int(range_match.group(2)), end)
+            else:
+                start = max(0, len(clip) - int(range_match.group(2)))
+            if start > end:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{len(clip)}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(clip)}')
+        else:
+            self.send_response(200)
+
+        self.send_header('Content-Type', 'audio/mpeg')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Cache-Control', CACHE_CONTROL)
+        self.send_header('ETag', etag)
+        # The page is served from another origin (the Streamlit port)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        if send_body:
+            # Pack clips are memoryviews, written straight from the mapping
+            self.wfile.write(clip[start:end + 1])
+
+    def log_message(self, format, *args):
+        # Access logs would dominate the app's output
+        pass
+
+
+_server = None
+# None until the first call decides; an unrelated program on the port is not re-probed
+_server_available = None
+_server_lock = threading.Lock()
+
+
+def _is_audio_server(host, port, timeout=1.0):
+    # A wildcard bind is reachable on loopback
+    if host in ('', '0.0.0.0', '::'):
+        host = '127.0.0.1'
+    if ':' in host:
+        host = f"[{host}]"
+    try:
+        with urllib.request.urlopen(f"http://{host}:{port}{HEALTH_PATH}", timeout=timeout) as response:
+            return response.status == 200 and response.read(len(HEALTH_BODY) + 1) == HEALTH_BODY
+    except (OSError, ValueError):
+        return False
+
+
+def start_audio_server(host=config.AUDIO_SERVER_HOST, port=config.AUDIO_SERVER_PORT):
+    """
+    Start the handler on a daemon thread, once per process.
+
+    Returns:
+    - bool: True if clips can be served by URL (by this process or, when the
+      port is already taken, by another worker on the same host). False if
+      the port belongs to some other program; callers then send bytes inline.
+    """
+    global _server, _server_available
+    with _server_lock:
+        if _server_available is not None:
+            return _server_available
+        try:
+            _server = ThreadingHTTPServer((host, port), AudioRequestHandler)
+        except OSError as e:
+            # Another worker on this host may already serve the same content-addressed clips;
+            # any other bind failure will not go away by retrying on every render
+            _server_available = e.errno == errno.EADDRINUSE and _is_audio_server(host, port)
+            return _server_available
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, name='audio-server', daemon=True).start()
+        _server_available = True
+        return True
+
+
+def audio_url(key):
+    return f"{config.AUDIO_BASE_URL.rstrip('/')}/audio/{key}.mp3"
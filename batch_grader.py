@@ -0,0 +1,331 @@
+# batch_grader.py
+#
+# Grade folders of learner recordings offline, outside the Streamlit app.
+# Each job runs the same pre-processing, recognition and phoneme comparison as
+# an interactive answer, spread over a pool of worker processes. Rows are
+# appended to the output as they finish, so an interrupted run resumes where
+# it stopped; rerunning also retries recordings whose rows recorded an error.
+#
+#     python batch_grader.py recordings/ --out results.csv [--workers 8]
+#     python batch_grader.py manifest.jsonl --out results.jsonl
+#
+# A directory is searched recursively for .wav files; each file's target is its
+# name up to an optional "__" suffix (pan__alice.wav grades "pan"). A manifest
+# is a CSV with `audio` and `target` columns, or JSON lines with those keys;
+# audio paths are relative to the manifest. A target is a testing word or an
+# item id as stored in the results log (e.g. "vowels/0", or
+# "vowels/%2Fæ%2F vs %2Fe%2F/level_1/0" for a practice sentence).
+
+import argparse
+import csv
+import json
+import os
+import string
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import config
+from asr_backends import get_backend
+from corpus import index_targets, load_corpus
+from grading import recognize_speech_from_audio
+from phoneme_utils import compare_phonemes, get_contrast_index
+
+Job = namedtuple('Job', ['audio', 'target'])
+
+OUTPUT_FIELDS = (
+    'audio', 'target', 'item_id', 'expected_word', 'recognized_text', 'recognized_word',
+    'correct', 'confidence', 'contrast', 'feedback', 'error', 'seconds',
+)
+
+
+# ==========================
+# Job Discovery
+# ==========================
+
+def scan_directory(directory):
+    """Return a job per .wav file below `directory`, in path order."""
+    jobs = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            stem, extension = os.path.splitext(name)
+            if extension.lower() == '.wav':
+                jobs.append(Job(os.path.join(root, name), stem.split('__')[0]))
+    return jobs
+
+
+def read_manifest(path):
+    """Return the jobs listed in a CSV or JSON-lines manifest."""
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, encoding='utf-8', newline='') as file:
+        if path.endswith(('.jsonl', '.ndjson')):
+            entries = [json.loads(line) for line in file if line.strip()]
+        else:
+            entries = list(csv.DictReader(file))
+    return [Job(os.path.join(base, entry['audio']), entry['target'].strip()) for entry in entries]
+
+
+def load_jobs(source):
+    return scan_directory(source) if os.path.isdir(source) else read_manifest(source)
+
+
+# ==========================
+# Grading (worker processes)
+# ==========================
+
+_targets = None
+
+
+def init_worker():
+    """Load the corpus, lexicon and recognizer once per worker process."""
+    global _targets
+    _targets = index_targets(load_corpus())
+    get_contrast_index()
+    get_backend()
+
+
+def _recognized_word(transcript, target):
+    # Testing answers end with the word; in a sentence, take the target's position
+    words = [word.strip(string.punctuation).lower() for word in transcript.split()]
+    if not words:
+        return ""
+    if target is not None and target.mode == 'practice':
+        sentence = [word.strip(string.punctuation).lower() for word in target.item.sentence.split()]
+        expected = target.item.target_word.lower()
+        if expected in words:
+            return expected
+        if len(words) == len(sentence) and expected in sentence:
+            return words[sentence.index(expected)]
+    return words[-1]
+
+
+def grade_job(job):
+    """
+    Grade one recording.
+
+    Parameters:
+    - job (Job): The audio file and its target.
+
+    Returns:
+    - dict: A row with `OUTPUT_FIELDS` keys; failures are reported in 'error'.
+    """
+    start = time.perf_counter()
+    row = dict.fromkeys(OUTPUT_FIELDS, '')
+    row.update(audio=job.audio, target=job.target, correct=False)
+
+    target = _targets.get(job.target) or _targets.get(job.target.lower())
+    if target is None:
+        # Unknown targets are graded as a bare word without contrast hints
+        expected_word, contrasts = job.target, ()
+    elif target.mode == 'testing':
+        expected_word, contrasts = target.item.word, target.item.phonemic_contrast
+        row['item_id'] = target.item_id
+    else:
+        expected_word, contrasts = target.item.target_word, ()
+        row['item_id'] = target.item_id
+    row['expected_word'] = expected_word
+
+    try:
+        with open(job.audio, 'rb') as file:
+            audio_bytes = file.read()
+    except OSError as e:
+        row.update(error=f"Could not read audio: {e.strerror or e}", seconds=round(time.perf_counter() - start, 3))
+        return row
+
+    result, correct, error, confidence = recognize_speech_from_audio(audio_bytes, expected_word)
+    row.update(recognized_text=result, correct=correct, error=error or '',
+               confidence='' if confidence is None else round(confidence, 3))
+    if error is None:
+        recognized_word = _recognized_word(result, target)
+        row['recognized_word'] = recognized_word
+        if correct:
+            row['feedback'] = "Your pronunciation was correct!"
+        else:
+            feedback, contrast_description = compare_phonemes(expected_word, recognized_word, contrasts)
+            row['feedback'] = feedback
+            if contrast_description != "No contrast found":
+                row['contrast'] = contrast_description or ''
+    row['seconds'] = round(time.perf_counter() - start, 3)
+    return row
+
+
+# ==========================
+# Streaming Output
+# ==========================
+
+def _is_jsonl(path):
+    return path.endswith(('.jsonl', '.ndjson'))
+
+
+def _truncate_partial_row(path):
+    # A run killed mid-write leaves at most one unterminated row
+    with open(path, 'rb+') as file:
+        data = file.read()
+        if data and not data.endswith(b'\n'):
+            file.truncate(data.rfind(b'\n') + 1)
+
+
+def read_rows(path):
+    """Return the rows already written to `path`, dropping a partial last row."""
+    if not os.path.exists(path):
+        return []
+    _truncate_partial_row(path)
+    with open(path, encoding='utf-8', newline='') as file:
+        if _is_jsonl(path):
+            return [json.loads(line) for line in file if line.strip()]
+        return list(csv.DictReader(file))
+
+
+def completed_jobs(rows):
+    """Return the (audio, target) pairs graded without an error."""
+    return {(row['audio'], row['target']) for row in rows if not row['error']}
+
+
+def drop_failed_rows(path, rows, jobs):
+    """
+    Rewrite `path` without the error rows of `jobs`, which are about to be retried.
+
+    The file is replaced atomically, so an interrupt leaves either version.
+    """
+    retried = {(job.audio, job.target) for job in jobs}
+    kept = [row for row in rows if not (row['error'] and (row['audio'], row['target']) in retried)]
+    if len(kept) == len(rows):
+        return
+    # Keep the extension, which selects the format
+    root, extension = os.path.splitext(path)
+    temporary = f"{root}.tmp{extension}"
+    with ResultWriter(temporary, fresh=True) as writer:
+        for row in kept:
+            writer.write(row)
+    os.replace(temporary, path)
+
+
+class ResultWriter:
+    """Append rows to a CSV or JSON-lines file, flushing each one."""
+
+    def __init__(self, path, fresh=False):
+        self.path = path
+        new_file = fresh or not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, 'w' if fresh else 'a', encoding='utf-8', newline='')
+        self._csv = None
+        if not _is_jsonl(path):
+            self._csv = csv.DictWriter(self._file, fieldnames=OUTPUT_FIELDS)
+            if new_file:
+                self._csv.writeheader()
+
+    def write(self, row):
+        if self._csv is not None:
+            self._csv.writerow(row)
+        else:
+            self._file.write(json.dumps(row, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def grade_batch(jobs, out_path, workers=config.BATCH_GRADE_WORKERS, resume=True, progress=None):
+    """
+    Grade `jobs` across `workers` processes, streaming rows to `out_path`.
+
+    Parameters:
+    - jobs (list): `Job`s to grade.
+    - out_path (str): Output file; '.jsonl' selects JSON lines, anything else CSV.
+    - workers (int): Worker processes; 1 grades in this process.
+    - resume (bool): Skip jobs already graded in `out_path` instead of starting
+      over; jobs whose rows recorded an error are graded again.
+    - progress (callable): Called with each finished row.
+
+    Returns:
+    - tuple: (rows graded now, jobs skipped as already done).
+    """
+    if resume:
+        rows = read_rows(out_path)
+        done = completed_jobs(rows)
+    else:
+        rows, done = [], set()
+        open(out_path, 'w').close()
+    pending = [job for job in jobs if (job.audio, job.target) not in done]
+    # Each retried job's new row replaces its error row rather than adding a second one
+    drop_failed_rows(out_path, rows, pending)
+    graded = 0
+
+    with ResultWriter(out_path) as writer:
+        if workers <= 1:
+            init_worker()
+            for job in pending:
+                row = grade_job(job)
+                writer.write(row)
+                graded += 1
+                if progress:
+                    progress(row)
+            return graded, len(jobs) - len(pending)
+
+        # Keep a bounded number of jobs queued so huge folders stay cheap to submit
+        queue_limit = workers * config.BATCH_GRADE_QUEUE_DEPTH
+        remaining = iter(pending)
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker)
+        try:
+            in_flight = set()
+            while True:
+                for job in remaining:
+                    in_flight.add(pool.submit(grade_job, job))
+                    if len(in_flight) >= queue_limit:
+                        break
+                if not in_flight:
+                    break
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    row = future.result()
+                    writer.write(row)
+                    graded += 1
+                    if progress:
+                        progress(row)
+        finally:
+            # On interrupt, drop queued jobs; written rows are kept for resuming
+            pool.shutdown(wait=True, cancel_futures=True)
+    return graded, len(jobs) - len(pending)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grade a folder or manifest of learner recordings.")
+    parser.add_argument('source', help="Directory of .wav files, or a CSV/JSON-lines manifest.")
+    parser.add_argument('--out', required=True, help="Output .csv or .jsonl file.")
+    parser.add_argument('--workers', type=int, default=config.BATCH_GRADE_WORKERS)
+    parser.add_argument('--restart', action='store_true', help="Discard existing output instead of resuming.")
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args()
+
+    jobs = load_jobs(args.source)
+    counts = {'correct': 0, 'errors': 0}
+
+    def progress(row):
+        counts['correct'] += bool(row['correct'])
+        counts['errors'] += bool(row['error'])
+        if not args.quiet:
+            status = row['error'] or ('correct' if row['correct'] else f"said '{row['recognized_word']}'")
+            print(f"{row['audio']}: {row['expected_word']} - {status}", file=sys.stderr)
+
+    start = time.perf_counter()
+    try:
+        graded, skipped = grade_batch(jobs, args.out, args.workers, resume=not args.restart, progress=progress)
+    except KeyboardInterrupt:
+        print(f"Interrupted; rerun the same command to resume from {args.out}.", file=sys.stderr)
+        sys.exit(130)
+    elapsed = time.perf_counter() - start
+
+    rate = graded / elapsed if elapsed else 0
+    print(f"Graded {graded} recordings ({skipped} already done) in {elapsed:.1f} s, {rate:.1f}/s "
+          f"with {args.workers} worker(s): {counts['correct']} correct, {counts['errors']} errors.")
+
+
+if __name__ == "__main__":
+    main()
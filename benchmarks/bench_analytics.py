@@ -0,0 +1,71 @@
+# benchmarks/bench_analytics.py
+#
+# Fill a results log with synthetic answers through the normal writer, then
+# time cohort dashboard queries against the rollups and check that the
+# incrementally maintained rollups match a full rebuild.
+#
+#     python benchmarks/bench_analytics.py [--answers 1000000] [--learners 20000]
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics  # noqa: E402
+from results_store import DIMENSIONS, ResultsStore  # noqa: E402
+
+CONTRASTS = [f"/{a}/ vs /{b}/" for a in "æeɪʌɒʊ" for b in "iuɑɔɜə"]
+PHONEME_TYPES = ('vowels', 'diphthongs', 'consonants')
+LEVELS = ('level_1', 'level_2', 'level_3')
+
+
+def fill(store, answers, learners):
+    rng = random.Random(0)
+    for i in range(answers):
+        learner = f"learner-{rng.randrange(learners)}"
+        contrast = rng.choice(CONTRASTS)
+        # Re-record about one answer in ten to exercise the upsert path
+        item = rng.randrange(12) if rng.random() < 0.1 else i
+        store.record(learner, 'practice', f"{contrast}/{item}", 0, item, "sentence", "said",
+                     rng.random() < 0.7, rng.choice(PHONEME_TYPES), contrast, rng.choice(LEVELS))
+    store.flush()
+
+
+def snapshot(store):
+    return {dimension: sorted(analytics.rollups(dimension, store=store)) for dimension in DIMENSIONS}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cohort analytics queries.")
+    parser.add_argument('--answers', type=int, default=1000000)
+    parser.add_argument('--learners', type=int, default=20000)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = ResultsStore(os.path.join(directory, 'results.sqlite3'), batch_size=1000)
+        start = time.perf_counter()
+        fill(store, args.answers, args.learners)
+        fill_seconds = time.perf_counter() - start
+        print(f"{args.answers} answers written in {fill_seconds:.1f} s "
+              f"({args.answers / fill_seconds:,.0f}/s including rollups)")
+
+        for dimension in DIMENSIONS:
+            timings = []
+            for _ in range(args.rounds):
+                start = time.perf_counter()
+                analytics.rollups(dimension, 'practice', limit=20, store=store)
+                timings.append(time.perf_counter() - start)
+            print(f"  top 20 by {dimension:<13} {min(timings) * 1000:8.2f} ms")
+
+        incremental = snapshot(store)
+        store.rebuild_rollups()
+        print("rollups match a full rebuild:", incremental == snapshot(store))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# benchmarks/bench_audio_pack.py
+#
+# Compare reading reference clips from one memory-mapped pack against reading
+# one MP3 file per clip.
+#
+#     python benchmarks/bench_audio_pack.py [--clips 2000] [--size 12000] [--rounds 5]
+
+import argparse
+import hashlib
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_pack import AudioPack, build_pack  # noqa: E402
+
+
+def make_clips(count, size):
+    rng = random.Random(0)
+    clips = {}
+    for i in range(count):
+        key = hashlib.sha256(f"clip {i}".encode()).hexdigest()
+        # Vary sizes around the typical length of a short sentence clip
+        clips[key] = rng.randbytes(int(size * rng.uniform(0.5, 1.5)))
+    return clips
+
+
+def read_files(directory, keys):
+    total = 0
+    for key in keys:
+        with open(os.path.join(directory, f"{key}.mp3"), 'rb') as file:
+            total += len(file.read())
+    return total
+
+
+def read_pack(pack, keys):
+    total = 0
+    for key in keys:
+        total += len(pack.get(key))
+    return total
+
+
+def best_of(rounds, func, *args):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pack reads against per-file reads.")
+    parser.add_argument('--clips', type=int, default=2000)
+    parser.add_argument('--size', type=int, default=12000, help="Average clip size in bytes.")
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    clips = make_clips(args.clips, args.size)
+    keys = list(clips)
+    random.Random(1).shuffle(keys)
+
+    with tempfile.TemporaryDirectory() as directory:
+        for key, data in clips.items():
+            with open(os.path.join(directory, f"{key}.mp3"), 'wb') as file:
+                file.write(data)
+        pack_path = os.path.join(directory, 'reference.pack')
+        build_pack(clips.items(), pack_path)
+        pack = AudioPack(pack_path)
+
+        file_seconds = best_of(args.rounds, read_files, directory, keys)
+        pack_seconds = best_of(args.rounds, read_pack, pack, keys)
+        pack.close()
+
+    print(f"{args.clips} clips, ~{args.size} bytes each, best of {args.rounds}")
+    print(f"  files: {file_seconds * 1e6 / args.clips:8.1f} µs/clip")
+    print(f"  pack:  {pack_seconds * 1e6 / args.clips:8.1f} µs/clip  ({file_seconds / pack_seconds:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# benchmarks/bench_shared_cache.py
+#
+# Start several worker processes that all request the same clips through the
+# shared cache, as workers behind a load balancer do after a deploy, and count
+# how many slow "synthesis" calls they make between them. Then time hits and
+# check that the size budget holds.
+#
+#     python benchmarks/bench_shared_cache.py [--workers 8] [--keys 50] [--synthesis-ms 200]
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared_cache import SharedCache  # noqa: E402
+
+
+def worker(path, keys, synthesis_seconds, clip_bytes, seed):
+    cache = SharedCache(path, 1 << 30)
+    calls = 0
+    order = list(keys)
+    random.Random(seed).shuffle(order)
+    for key in order:
+        if cache.get('tts', key) is not None:
+            continue
+        with cache.single_flight('tts', key) as clip:
+            if clip is None:
+                time.sleep(synthesis_seconds)
+                calls += 1
+                cache.put('tts', key, os.urandom(clip_bytes))
+    return calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cross-process single flight in the shared cache.")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--keys', type=int, default=50)
+    parser.add_argument('--synthesis-ms', type=float, default=200.0)
+    parser.add_argument('--clip-bytes', type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'shared.sqlite3')
+        SharedCache(path, 1 << 30)
+        keys = [f"clip-{i}" for i in range(args.keys)]
+
+        start = time.perf_counter()
+        with multiprocessing.Pool(args.workers) as pool:
+            calls = pool.starmap(worker, [(path, keys, args.synthesis_ms / 1000, args.clip_bytes, seed)
+                                          for seed in range(args.workers)])
+        elapsed = time.perf_counter() - start
+        print(f"{args.workers} workers x {args.keys} clips: {sum(calls)} synthesis calls "
+              f"(without sharing: {args.workers * args.keys}) in {elapsed:.2f} s")
+
+        cache = SharedCache(path, 1 << 30)
+        start = time.perf_counter()
+        rounds = 20
+        for _ in range(rounds):
+            for key in keys:
+                cache.get('tts', key)
+        print(f"hit latency: {(time.perf_counter() - start) / (rounds * len(keys)) * 1e6:.1f} us "
+              f"for {args.clip_bytes} byte clips")
+
+        budget = args.keys * args.clip_bytes // 2
+        small = SharedCache(path, budget)
+        for i in range(args.keys * 2):
+            small.put('asr', f"result-{i}", os.urandom(args.clip_bytes // 10))
+        used, entries = small.usage()
+        print(f"budget {budget} bytes: {used} bytes in {entries} entries after eviction "
+              f"({small.stats()['evicted']} evicted)")
+
+
+if __name__ == "__main__":
+    main()
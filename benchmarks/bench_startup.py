@@ -0,0 +1,92 @@
+# benchmarks/bench_startup.py
+#
+# Measure the cold start of a fresh worker: each sample is a new Python
+# process that imports Streamlit (as the server does before any session),
+# then runs app.py once headlessly. Reports the time to first render, the
+# resident memory the first run added, and which heavy modules it loaded.
+#
+#     python benchmarks/bench_startup.py [--samples 5] [--settle 2]
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+HEAVY_MODULES = ('matplotlib', 'pandas', 'numpy', 'gtts', 'speech_recognition', 'pyarrow')
+
+
+def rss_bytes():
+    with open('/proc/self/statm') as file:
+        return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def measure_once(settle):
+    """Run in a child process: one cold render, then optionally wait for background warm-up."""
+    import streamlit  # noqa: F401
+    from streamlit.testing.v1 import AppTest
+
+    baseline_rss = rss_bytes()
+    before = set(sys.modules)
+    start = time.perf_counter()
+    app = AppTest.from_file(os.path.join(ROOT, 'app.py'), default_timeout=60)
+    app.run()
+    first_render = time.perf_counter() - start
+    if app.exception:
+        raise RuntimeError(app.exception[0].value)
+    loaded = sorted(name for name in HEAVY_MODULES if name in sys.modules and name not in before)
+    first_rss = rss_bytes()
+
+    # A second run shows the steady-state cost once everything is imported
+    start = time.perf_counter()
+    app.run()
+    second_render = time.perf_counter() - start
+
+    time.sleep(settle)
+    return {
+        'first_render_ms': first_render * 1000,
+        'second_render_ms': second_render * 1000,
+        'first_render_rss_mb': (first_rss - baseline_rss) / 2 ** 20,
+        'settled_rss_mb': (rss_bytes() - baseline_rss) / 2 ** 20,
+        'heavy_modules_after_first_render': loaded,
+        'heavy_modules_after_settle': sorted(name for name in HEAVY_MODULES if name in sys.modules and name not in before),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark a fresh worker's time to first render.")
+    parser.add_argument('--samples', type=int, default=5)
+    parser.add_argument('--settle', type=float, default=2.0,
+                        help="Seconds to wait after the first render for background warm-up.")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure_once(args.settle)))
+        return
+
+    samples = []
+    with tempfile.TemporaryDirectory() as directory:
+        # Results go to a scratch log; caches stay shared so runs measure imports, not TTS
+        env = dict(os.environ, MINIMAL_PAIRS_DATA_DIR=directory, MINIMAL_PAIRS_METRICS_PORT='0',
+                   MINIMAL_PAIRS_AUDIO_SERVE_BY_URL='0')
+        for _ in range(args.samples):
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', '--settle', str(args.settle)],
+                                    env=env, cwd=ROOT, capture_output=True, text=True, check=True).stdout
+            samples.append(json.loads(output.strip().splitlines()[-1]))
+
+    for key in ('first_render_ms', 'second_render_ms', 'first_render_rss_mb', 'settled_rss_mb'):
+        values = [sample[key] for sample in samples]
+        print(f"{key:<22} median {statistics.median(values):8.1f}   min {min(values):8.1f}   max {max(values):8.1f}")
+    print("heavy modules after first render:", ', '.join(samples[-1]['heavy_modules_after_first_render']) or 'none')
+    print("heavy modules after warm-up:      ", ', '.join(samples[-1]['heavy_modules_after_settle']) or 'none')
+
+
+if __name__ == "__main__":
+    main()
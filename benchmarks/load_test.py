@@ -0,0 +1,526 @@
+# benchmarks/load_test.py
+#
+# Drive the testing and practice flows of app.py headlessly with Streamlit's
+# AppTest, at increasing numbers of concurrent learners, against local
+# stand-ins for the Google speech API and the TTS service.
+#
+#     python benchmarks/load_test.py [--concurrency 1,2,4,8] [--items 4]
+#         [--asr-latency 0.3] [--asr-error-rate 0.02] [--tts-latency 0.2] [--tts-error-rate 0]
+#         [--out load_test.json] [--baseline previous.json]
+#
+# The app runs unmodified with the google backend and an HTTP TTS endpoint
+# pointed at the stand-ins (MINIMAL_PAIRS_GOOGLE_ASR_ENDPOINT and
+# MINIMAL_PAIRS_TTS_ENDPOINT). Only the browser recorder widget is replaced.
+# Synthetic takes are tones whose pitch encodes the transcript, and the
+# stand-in recognizer decodes the FLAC it receives back into that transcript.
+#
+# AppTest swaps a process-wide runtime on every run, so script runs from
+# different learners are serialized here. Recognition, prefetch and TTS
+# requests still overlap in the background. Script CPU time would mostly
+# serialize on the GIL in a real server too.
+
+import argparse
+import gc
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, 'app.py')
+sys.path.insert(0, ROOT)
+
+SAMPLE_RATE = 16000
+# Transcript i is spoken as a tone of TONE_BASE_HZ + i * TONE_STEP_HZ
+TONE_BASE_HZ = 300.0
+TONE_STEP_HZ = 6.0
+TONE_CAPACITY = int((SAMPLE_RATE / 2 - 500 - TONE_BASE_HZ) // TONE_STEP_HZ)
+
+TESTING_TYPES = {"Vowel Testing": 'vowels', "Diphthong Testing": 'diphthongs', "Consonant Testing": 'consonants'}
+PRACTICE_TYPES = {"Vowel Practice": 'vowels', "Diphthong Practice": 'diphthongs', "Consonant Practice": 'consonants'}
+
+
+# ==========================
+# Synthetic Takes
+# ==========================
+
+class Vocabulary:
+    """Transcripts the stand-in recognizer can return, each assigned a tone pitch."""
+
+    def __init__(self):
+        self._indices = {}
+        self._texts = []
+        self._lock = threading.Lock()
+
+    def encode(self, text):
+        with self._lock:
+            index = self._indices.get(text)
+            if index is None:
+                if len(self._texts) >= TONE_CAPACITY:
+                    raise ValueError(f"More than {TONE_CAPACITY} distinct transcripts")
+                index = self._indices[text] = len(self._texts)
+                self._texts.append(text)
+            return index
+
+    def decode(self, index):
+        with self._lock:
+            return self._texts[index] if 0 <= index < len(self._texts) else None
+
+
+def make_take(index, variant):
+    """Return a WAV take for transcript `index`; `variant` makes every take's bytes unique."""
+    seconds = 0.6 + 0.01 * (variant % 40)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    tone = (6000 + variant % 1000) * np.sin(2 * np.pi * (TONE_BASE_HZ + index * TONE_STEP_HZ) * t)
+    silence = np.zeros(int(0.15 * SAMPLE_RATE))
+    samples = np.concatenate([silence, tone, silence]).astype('<i2')
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+def decode_take(wav_bytes):
+    """Return the transcript index encoded in a take's pitch."""
+    with wave.open(io.BytesIO(wav_bytes), 'rb') as wav:
+        rate = wav.getframerate()
+        pcm = np.frombuffer(wav.readframes(wav.getnframes()), dtype='<i2').astype(np.float64)
+    spectrum = np.abs(np.fft.rfft(pcm * np.hanning(len(pcm))))
+    pitch = (np.argmax(spectrum[1:]) + 1) * rate / len(pcm)
+    return int(round((pitch - TONE_BASE_HZ) / TONE_STEP_HZ))
+
+
+# ==========================
+# Stand-in Servers
+# ==========================
+
+class FaultInjector:
+    def __init__(self, latency, error_rate, seed):
+        self.latency = latency
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+
+    def delay_and_fail(self):
+        """Sleep for the injected latency; return True if this request should fail."""
+        with self._lock:
+            self.requests += 1
+            delay = self.latency * self._random.uniform(0.5, 1.5)
+            fail = self._random.random() < self.error_rate
+            self.failures += fail
+        time.sleep(delay)
+        return fail
+
+
+class SpeechHandler(BaseHTTPRequestHandler):
+    """Answers the Google Speech API v2 protocol used by speech_recognition."""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.server.faults.delay_and_fail():
+            self.send_error(500, "Injected failure")
+            return
+        decoded = subprocess.run([self.server.flac_path, '--decode', '--stdout', '--silent', '-'],
+                                 input=body, capture_output=True, check=True).stdout
+        transcript = self.server.vocabulary.decode(decode_take(decoded))
+        lines = ['{"result":[]}']
+        if transcript:
+            lines.append(json.dumps({'result': [{'alternative': [{'transcript': transcript, 'confidence': 0.92}],
+                                                 'final': True}], 'result_index': 0}))
+        payload = ('\n'.join(lines) + '\n').encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SpeechSynthesisHandler(BaseHTTPRequestHandler):
+    """Answers GET ?q=<text> with MP3-sized bytes, as expected by TTS_ENDPOINT."""
+
+    def do_GET(self):
+        text = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query).get('q', [''])[0]
+        if self.server.faults.delay_and_fail():
+            self.send_error(503, "Injected failure")
+            return
+        # Roughly the size of a 32 kbps clip of the text
+        payload = b'\xff\xfb\x90\x00' + bytes(800 + 300 * len(text.split()))
+        self.send_response(200)
+        self.send_header('Content-Type', 'audio/mpeg')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(handler, **attributes):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    for name, value in attributes.items():
+        setattr(server, name, value)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+# ==========================
+# Learners
+# ==========================
+
+_run_lock = threading.Lock()
+_variants = itertools.count()
+
+
+def rss_bytes():
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        # ru_maxrss is a high-water mark in KB; only an approximation of current usage
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Learner:
+    """One headless browser session answering `items` prompts in one mode."""
+
+    def __init__(self, number, mode, items, corpus, vocabulary, options):
+        self.number = number
+        self.mode = mode
+        self.items = items
+        self.corpus = corpus
+        self.vocabulary = vocabulary
+        self.options = options
+        self.random = random.Random(number)
+        self.timings = {}
+        self.server_ms = []
+        self.errors = {'recognition': 0, 'page': 0}
+        self.answers = 0
+        self.app = None
+
+    def _run(self, name, action):
+        start = time.perf_counter()
+        with _run_lock:
+            action()
+        self._record(name, time.perf_counter() - start)
+        timing = self.app.session_state['panel_timings'].get('script_run') if 'panel_timings' in self.app.session_state else None
+        if timing is not None:
+            self.server_ms.append(timing)
+        if self.app.exception:
+            self.errors['page'] += 1
+            raise RuntimeError(f"Learner {self.number}: {self.app.exception[0].value}")
+
+    def _record(self, name, seconds):
+        self.timings.setdefault(name, []).append(seconds)
+
+    def _choose(self, widget, value, name='navigate'):
+        self._run(name, lambda: widget.set_value(value).run())
+
+    def run(self):
+        from streamlit.testing.v1 import AppTest
+
+        self.app = AppTest.from_file(APP_PATH, default_timeout=self.options.timeout)
+        self._run('load', self.app.run)
+
+        if self.mode == 'testing':
+            label = self.random.choice(list(TESTING_TYPES))
+            self.phoneme_type = TESTING_TYPES[label]
+            self._choose(self.app.sidebar.radio[1], label)
+        else:
+            self._choose(self.app.sidebar.radio[0], "Phoneme Practice")
+            label = self.random.choice(list(PRACTICE_TYPES))
+            self.phoneme_type = PRACTICE_TYPES[label]
+            self._choose(self.app.sidebar.radio[1], label)
+            contrasts = self.app.selectbox(key='selected_contrast_option').options
+            self.contrast = self.random.choice(contrasts)
+            self._choose(self.app.selectbox(key='selected_contrast_option'), self.contrast)
+            self.level = self.random.choice(["Level 1", "Level 2", "Level 3"])
+            self._choose(self.app.radio(key='practice_level'), self.level)
+
+        for _ in range(self.items):
+            said = self._next_transcript()
+            if said is None:
+                break
+            self._answer(said)
+            self.app.session_state['_take'] = None
+            continue_button = next((button for button in self.app.button if button.label == "Continue"), None)
+            if continue_button is None:
+                break
+            self._run('continue', lambda: continue_button.click().run())
+
+    def _next_transcript(self):
+        """Return what this learner says for the current prompt, right or wrong."""
+        correct = self.random.random() < self.options.correct_rate
+        if self.mode == 'testing':
+            items = self.corpus.testing.get(self.phoneme_type, ())
+            index = self.app.session_state['current_word_index_testing']
+            if index >= len(items):
+                return None
+            if correct:
+                return items[index].sentence
+            other = self.random.choice([item.word for item in items if item.word != items[index].word] or ['mistake'])
+            return f"That's a {other}."
+
+        level_key = f"level_{self.level.split()[-1]}"
+        items = self.corpus.practice[self.phoneme_type][self.contrast][level_key]
+        index = self.app.session_state['current_sentence_index_practice']
+        if index >= len(items):
+            return None
+        item = items[index]
+        if correct:
+            return item.sentence
+        partners = [word for pair in self.corpus.pairs[self.phoneme_type][self.contrast]
+                    if item.target_word in pair for word in pair if word != item.target_word]
+        prefix, suffix = item.carrier
+        return prefix + (partners[0] if partners else 'mistake') + suffix
+
+    def _answer(self, said):
+        index = self.vocabulary.encode(said)
+        for _ in range(self.options.retries + 1):
+            self.app.session_state['_take'] = make_take(index, next(_variants))
+            start = time.perf_counter()
+            self._run('record', self.app.run)
+            deadline = start + self.options.timeout
+            while True:
+                if self.app.session_state[f'has_answered_{self.mode}']:
+                    self._record('answer', time.perf_counter() - start)
+                    self.answers += 1
+                    return
+                grading = any('Grading' in info.value for info in self.app.info)
+                if not grading or time.perf_counter() > deadline:
+                    break
+                # The grading fragment reruns on this interval in the browser
+                time.sleep(self.options.poll_interval)
+                self._run('poll', self.app.run)
+            self.errors['recognition'] += 1
+
+
+# ==========================
+# Reporting
+# ==========================
+
+def summarize(samples, scale=1000.0):
+    values = np.asarray(samples, dtype=np.float64) * scale
+    return {
+        'count': int(values.size),
+        'mean_ms': round(float(values.mean()), 2),
+        'p50_ms': round(float(np.percentile(values, 50)), 2),
+        'p95_ms': round(float(np.percentile(values, 95)), 2),
+        'p99_ms': round(float(np.percentile(values, 99)), 2),
+        'max_ms': round(float(values.max()), 2),
+    }
+
+
+def run_level(concurrency, options, corpus, vocabulary, servers):
+    if options.cold_cache:
+        # Imported late, like every repo module, once the environment is set
+        from shared_cache import get_shared_cache
+        get_shared_cache().clear('tts')
+
+    learners = [
+        Learner(number, 'testing' if number % 2 == 0 else 'practice', options.items, corpus, vocabulary, options)
+        for number in range(concurrency * 1000, concurrency * 1000 + concurrency)
+    ]
+    requests_before = {name: (server.faults.requests, server.faults.failures) for name, server in servers.items()}
+    gc.collect()
+    rss_before = rss_bytes()
+    failures = []
+
+    def drive(learner):
+        try:
+            learner.run()
+        except Exception as e:
+            failures.append(str(e))
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=drive, args=(learner,)) for learner in learners]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    gc.collect()
+    rss_after = rss_bytes()
+
+    timings = {}
+    for learner in learners:
+        for name, samples in learner.timings.items():
+            timings.setdefault(name, []).extend(samples)
+    server_ms = [value for learner in learners for value in learner.server_ms]
+    interactions = sum(len(samples) for name, samples in timings.items() if name != 'answer')
+    answers = sum(learner.answers for learner in learners)
+
+    return {
+        'concurrency': concurrency,
+        'wall_seconds': round(wall, 3),
+        'answers': answers,
+        'answers_per_second': round(answers / wall, 3),
+        'interactions_per_second': round(interactions / wall, 3),
+        'interactions': {name: summarize(samples) for name, samples in sorted(timings.items())},
+        'script_run': summarize(server_ms, scale=1.0) if server_ms else None,
+        'rss_per_session_kb': round((rss_after - rss_before) / concurrency / 1024, 1),
+        'errors': {
+            'recognition': sum(learner.errors['recognition'] for learner in learners),
+            'page': sum(learner.errors['page'] for learner in learners),
+            'failed_sessions': failures,
+        },
+        'upstream': {
+            name: {'requests': server.faults.requests - requests_before[name][0],
+                   'injected_failures': server.faults.failures - requests_before[name][1]}
+            for name, server in servers.items()
+        },
+    }
+
+
+def print_level(level):
+    print(f"\n{level['concurrency']} concurrent learners: {level['answers']} answers in {level['wall_seconds']:.1f} s "
+          f"({level['answers_per_second']:.2f} answers/s, {level['interactions_per_second']:.1f} runs/s), "
+          f"~{level['rss_per_session_kb']:.0f} KB RSS per session")
+    print(f"  {'interaction':<10} {'count':>6} {'p50':>9} {'p95':>9} {'p99':>9}")
+    rows = dict(level['interactions'])
+    if level['script_run']:
+        rows['(server)'] = level['script_run']
+    for name, stats in rows.items():
+        print(f"  {name:<10} {stats['count']:>6} {stats['p50_ms']:>7.1f}ms {stats['p95_ms']:>7.1f}ms "
+              f"{stats['p99_ms']:>7.1f}ms")
+    errors = level['errors']
+    print(f"  errors: {errors['recognition']} recognition, {errors['page']} page, "
+          f"{len(errors['failed_sessions'])} failed sessions")
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding='utf-8') as file:
+        baseline = {level['concurrency']: level for level in json.load(file)['levels']}
+    print(f"\np95 change against {baseline_path}:")
+    for level in results['levels']:
+        previous = baseline.get(level['concurrency'])
+        if previous is None:
+            continue
+        for name, stats in level['interactions'].items():
+            old = previous['interactions'].get(name)
+            if old and old['p95_ms']:
+                change = (stats['p95_ms'] - old['p95_ms']) / old['p95_ms']
+                print(f"  {level['concurrency']:>3} learners {name:<10} {old['p95_ms']:>8.1f} -> "
+                      f"{stats['p95_ms']:>8.1f} ms ({change:+.0%})")
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless load test of the testing and practice flows.")
+    parser.add_argument('--concurrency', default='1,2,4,8', help="Comma-separated learner counts.")
+    parser.add_argument('--items', type=int, default=4, help="Prompts answered per learner.")
+    parser.add_argument('--correct-rate', type=float, default=0.7)
+    parser.add_argument('--asr-latency', type=float, default=0.3, help="Mean stand-in recognition latency (s).")
+    parser.add_argument('--asr-error-rate', type=float, default=0.02)
+    parser.add_argument('--tts-latency', type=float, default=0.2, help="Mean stand-in synthesis latency (s).")
+    parser.add_argument('--tts-error-rate', type=float, default=0.0)
+    parser.add_argument('--poll-interval', type=float, default=0.5,
+                        help="Grading poll interval, as MINIMAL_PAIRS_ASR_POLL_INTERVAL.")
+    parser.add_argument('--retries', type=int, default=2, help="Re-recordings after a failed take.")
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--cold-cache', action='store_true', help="Clear the TTS cache before every level.")
+    parser.add_argument('--out', default='load_test.json')
+    parser.add_argument('--baseline', help="Earlier results file to compare p95 latencies against.")
+    options = parser.parse_args()
+    levels = [int(value) for value in options.concurrency.split(',') if value]
+
+    work_dir = tempfile.mkdtemp(prefix='minimal-pairs-load-')
+    try:
+        from speech_recognition.audio import get_flac_converter
+
+        vocabulary = Vocabulary()
+        servers = {
+            'asr': start_server(SpeechHandler, vocabulary=vocabulary, flac_path=get_flac_converter(),
+                                faults=FaultInjector(options.asr_latency, options.asr_error_rate, 1)),
+            'tts': start_server(SpeechSynthesisHandler,
+                                faults=FaultInjector(options.tts_latency, options.tts_error_rate, 2)),
+        }
+        cache_dir = os.path.join(work_dir, 'cache')
+        os.environ.update({
+            'MINIMAL_PAIRS_ASR_BACKEND': 'google',
+            'MINIMAL_PAIRS_GOOGLE_ASR_ENDPOINT': f"http://127.0.0.1:{servers['asr'].server_port}/speech-api/v2/recognize",
+            'MINIMAL_PAIRS_TTS_ENDPOINT': f"http://127.0.0.1:{servers['tts'].server_port}/tts",
+            'MINIMAL_PAIRS_TTS_VOICE': 'load-test',
+            'MINIMAL_PAIRS_ASR_POLL_INTERVAL': str(options.poll_interval),
+            'MINIMAL_PAIRS_CACHE_DIR': cache_dir,
+            'MINIMAL_PAIRS_AUDIO_DIR': os.path.join(work_dir, 'audio'),
+            'MINIMAL_PAIRS_AUDIO_PACK': os.path.join(work_dir, 'audio', 'reference.pack'),
+            'MINIMAL_PAIRS_DATA_DIR': os.path.join(work_dir, 'data'),
+            'MINIMAL_PAIRS_RECORDING_SPOOL_DIR': work_dir,
+            'MINIMAL_PAIRS_AUDIO_SERVE_BY_URL': '1',
+            'MINIMAL_PAIRS_AUDIO_SERVER_PORT': str(free_port()),
+        })
+
+        # Configuration is read at import, so repo modules load only now
+        import audio_recorder_streamlit
+        import streamlit as st
+
+        from corpus import load_corpus
+
+        # The browser widget is the one piece replaced: it returns the learner's current take
+        audio_recorder_streamlit.audio_recorder = lambda **kwargs: st.session_state.get('_take')
+        corpus = load_corpus()
+
+        results = {
+            'benchmark': 'load_test',
+            'revision': git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'options': vars(options),
+            'levels': [],
+        }
+        # One uncounted session pays for imports and caches so levels compare like for like
+        Learner(-1, 'testing', 1, corpus, vocabulary, options).run()
+        for concurrency in levels:
+            level = run_level(concurrency, options, corpus, vocabulary, servers)
+            print_level(level)
+            results['levels'].append(level)
+
+        with open(options.out, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+        print(f"\nWrote {options.out}")
+        if options.baseline:
+            compare(results, options.baseline)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
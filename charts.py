@@ -0,0 +1,69 @@
+# charts.py
+#
+# Small charts rendered straight to SVG markup. The results pie needs a few
+# arcs and labels, not a plotting library: pyplot alone costs about half a
+# second and tens of MB to import in every fresh worker.
+
+import html
+import math
+
+
+def pie_chart_svg(sizes, labels, colors, width=360, start_angle=90):
+    """
+    Draw a pie chart with percentage labels, laid out like matplotlib's `ax.pie`.
+
+    Slices run counter-clockwise from `start_angle` degrees. Names sit just
+    outside the pie in the page's text colour, '%1.1f%%' percentages inside it.
+
+    Parameters:
+    - sizes (list): Slice values; zero-sized slices are left out.
+    - labels (list): One name per slice.
+    - colors (list): One CSS colour per slice.
+    - width (int): Width of the SVG in pixels; the height is 3/4 of it.
+
+    Returns:
+    - str: An SVG document, or '' when every size is zero.
+    """
+    total = sum(sizes)
+    if total <= 0:
+        return ''
+    height = width * 3 // 4
+    cx, cy = width / 2, height / 2
+    radius = height * 0.38
+
+    def point(angle, distance):
+        radians = math.radians(angle)
+        return cx + distance * math.cos(radians), cy - distance * math.sin(radians)
+
+    shapes, texts = [], []
+    angle = start_angle
+    for size, label, color in zip(sizes, labels, colors):
+        if size <= 0:
+            continue
+        sweep = 360.0 * size / total
+        end = angle + sweep
+        if sweep >= 359.999:
+            shapes.append(f'<circle cx="{cx:.2f}" cy="{cy:.2f}" r="{radius:.2f}" fill="{color}"/>')
+        else:
+            x1, y1 = point(angle, radius)
+            x2, y2 = point(end, radius)
+            # Counter-clockwise on screen is SVG's negative sweep direction
+            shapes.append(
+                f'<path d="M{cx:.2f},{cy:.2f} L{x1:.2f},{y1:.2f} '
+                f'A{radius:.2f},{radius:.2f} 0 {int(sweep > 180)} 0 {x2:.2f},{y2:.2f} Z" fill="{color}"/>'
+            )
+        middle = angle + sweep / 2
+        x, y = point(middle, radius * 1.1)
+        anchor = 'start' if math.cos(math.radians(middle)) >= 0 else 'end'
+        texts.append(f'<text x="{x:.2f}" y="{y:.2f}" text-anchor="{anchor}" '
+                     f'dominant-baseline="middle" fill="currentColor">{html.escape(str(label))}</text>')
+        x, y = point(middle, radius * 0.6)
+        texts.append(f'<text x="{x:.2f}" y="{y:.2f}" text-anchor="middle" '
+                     f'dominant-baseline="middle" fill="#ffffff">{100.0 * size / total:.1f}%</text>')
+        angle = end
+
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}" font-family="sans-serif" font-size="14" role="img">'
+        + ''.join(shapes) + ''.join(texts) + '</svg>'
+    )
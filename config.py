@@ -0,0 +1,206 @@
+# config.py
+
+import os
+
+# ==========================
+# Paths
+# ==========================
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.environ.get('MINIMAL_PAIRS_CACHE_DIR', os.path.join(BASE_DIR, '.cache'))
+
+# ==========================
+# Shared Cache
+# ==========================
+
+# One SQLite file per host holding synthesized clips and recognition results
+# for every worker process; all of them must point at the same file
+SHARED_CACHE_PATH = os.environ.get('MINIMAL_PAIRS_SHARED_CACHE_PATH', os.path.join(CACHE_DIR, 'shared.sqlite3'))
+SHARED_CACHE_MAX_BYTES = int(os.environ.get('MINIMAL_PAIRS_SHARED_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+# How long a worker computing a missing entry keeps others waiting before they take over
+SHARED_CACHE_LEASE_SECONDS = float(os.environ.get('MINIMAL_PAIRS_SHARED_CACHE_LEASE_SECONDS', 30.0))
+
+# ==========================
+# Text-to-Speech
+# ==========================
+
+TTS_LANG = os.environ.get('MINIMAL_PAIRS_TTS_LANG', 'en')
+# Identifies the synthesizer in cache keys so switching voices never serves stale clips
+TTS_VOICE = os.environ.get('MINIMAL_PAIRS_TTS_VOICE', 'gtts')
+# Optional self-hosted synthesizer answering GET ?q=<text>&tl=<lang> with MP3; empty uses gTTS.
+# Give it its own TTS_VOICE so its clips never mix with cached gTTS ones
+TTS_ENDPOINT = os.environ.get('MINIMAL_PAIRS_TTS_ENDPOINT', '')
+TTS_TIMEOUT = float(os.environ.get('MINIMAL_PAIRS_TTS_TIMEOUT', 10.0))
+
+# ==========================
+# Corpora and Pre-rendered Audio
+# ==========================
+
+PRACTICE_CORPUS_PATH = os.path.join(BASE_DIR, 'phoneme_practice.json')
+TESTING_CORPUS_PATH = os.path.join(BASE_DIR, 'phoneme_testing.json')
+AUDIO_ASSET_DIR = os.environ.get('MINIMAL_PAIRS_AUDIO_DIR', os.path.join(BASE_DIR, 'audio'))
+AUDIO_MANIFEST_PATH = os.path.join(AUDIO_ASSET_DIR, 'manifest.json')
+AUDIO_PACK_PATH = os.environ.get('MINIMAL_PAIRS_AUDIO_PACK', os.path.join(AUDIO_ASSET_DIR, 'reference.pack'))
+AUDIO_RENDER_WORKERS = int(os.environ.get('MINIMAL_PAIRS_AUDIO_RENDER_WORKERS', 8))
+# Build practice sentences from one clip per carrier frame plus the word clip,
+# instead of synthesizing every sentence; far fewer TTS calls, flatter prosody
+AUDIO_SPLICE_CARRIERS = os.environ.get('MINIMAL_PAIRS_AUDIO_SPLICE_CARRIERS', '') not in ('', '0', 'false')
+
+# ==========================
+# Speech Recognition
+# ==========================
+
+# One of: google, vosk, fake
+ASR_BACKEND = os.environ.get('MINIMAL_PAIRS_ASR_BACKEND', 'google')
+ASR_TIMEOUT = float(os.environ.get('MINIMAL_PAIRS_ASR_TIMEOUT', 10.0))
+ASR_N_BEST = int(os.environ.get('MINIMAL_PAIRS_ASR_N_BEST', 5))
+# Speech API URL for the google backend, e.g. a proxy or a local stand-in
+GOOGLE_ASR_ENDPOINT = os.environ.get('MINIMAL_PAIRS_GOOGLE_ASR_ENDPOINT', 'http://www.google.com/speech-api/v2/recognize')
+# Share of the n-best weight that must name the target (or a homophone) to pass when the top hypothesis does not
+ASR_ACCEPT_THRESHOLD = float(os.environ.get('MINIMAL_PAIRS_ASR_ACCEPT_THRESHOLD', 0.5))
+VOSK_MODEL_PATH = os.environ.get('MINIMAL_PAIRS_VOSK_MODEL_PATH', os.path.join(BASE_DIR, 'models', 'vosk'))
+# Transcript the fake backend returns for recordings without an embedded one
+FAKE_ASR_DEFAULT_TRANSCRIPT = os.environ.get('MINIMAL_PAIRS_FAKE_ASR_TRANSCRIPT', '')
+FAKE_ASR_LATENCY = float(os.environ.get('MINIMAL_PAIRS_FAKE_ASR_LATENCY', 0.0))
+# Upper bound on concurrent outbound recognition calls per process
+ASR_MAX_CONCURRENCY = int(os.environ.get('MINIMAL_PAIRS_ASR_MAX_CONCURRENCY', 8))
+ASR_POLL_INTERVAL = float(os.environ.get('MINIMAL_PAIRS_ASR_POLL_INTERVAL', 0.5))
+
+# ==========================
+# Recognition Resilience
+# ==========================
+
+# Extra attempts after a failed request (timeouts are not retried), with full-jitter backoff
+ASR_RETRIES = int(os.environ.get('MINIMAL_PAIRS_ASR_RETRIES', 2))
+ASR_RETRY_BASE_DELAY = float(os.environ.get('MINIMAL_PAIRS_ASR_RETRY_BASE_DELAY', 0.2))
+ASR_RETRY_MAX_DELAY = float(os.environ.get('MINIMAL_PAIRS_ASR_RETRY_MAX_DELAY', 2.0))
+# Second backend raced against a slow or failing primary, e.g. 'vosk'; empty disables hedging
+ASR_HEDGE_BACKEND = os.environ.get('MINIMAL_PAIRS_ASR_HEDGE_BACKEND', '')
+# Hedge once the primary is slower than this percentile of its recent latencies
+ASR_HEDGE_PERCENTILE = float(os.environ.get('MINIMAL_PAIRS_ASR_HEDGE_PERCENTILE', 95))
+ASR_HEDGE_MIN_DELAY = float(os.environ.get('MINIMAL_PAIRS_ASR_HEDGE_MIN_DELAY', 0.5))
+# Hedge delay until enough primary latencies have been seen
+ASR_HEDGE_DEFAULT_DELAY = float(os.environ.get('MINIMAL_PAIRS_ASR_HEDGE_DEFAULT_DELAY', 2.0))
+# Consecutive failures that open a backend's circuit, and how long it stays open
+ASR_BREAKER_FAILURES = int(os.environ.get('MINIMAL_PAIRS_ASR_BREAKER_FAILURES', 5))
+ASR_BREAKER_RESET_SECONDS = float(os.environ.get('MINIMAL_PAIRS_ASR_BREAKER_RESET_SECONDS', 30.0))
+
+# ==========================
+# Recognition Result Cache
+# ==========================
+
+RECOGNITION_CACHE_MAX_ENTRIES = int(os.environ.get('MINIMAL_PAIRS_RECOGNITION_CACHE_MAX_ENTRIES', 2048))
+RECOGNITION_CACHE_TTL = float(os.environ.get('MINIMAL_PAIRS_RECOGNITION_CACHE_TTL', 3600.0))
+# Share results with the other workers (and restarts) through the shared cache
+RECOGNITION_CACHE_SHARED = os.environ.get('MINIMAL_PAIRS_RECOGNITION_CACHE_SHARED', '1') not in ('', '0', 'false')
+
+# ==========================
+# Audio Pre-processing
+# ==========================
+
+ASR_SAMPLE_RATE = int(os.environ.get('MINIMAL_PAIRS_ASR_SAMPLE_RATE', 16000))
+# Frames quieter than this (dB below the loudest frame) count as silence
+VAD_THRESHOLD_DB = float(os.environ.get('MINIMAL_PAIRS_VAD_THRESHOLD_DB', 35.0))
+# Speech shorter than this is rejected as an empty take
+MIN_SPEECH_SECONDS = float(os.environ.get('MINIMAL_PAIRS_MIN_SPEECH_SECONDS', 0.15))
+# Takes with more than this fraction of full-scale samples are rejected as clipped
+MAX_CLIPPED_FRACTION = float(os.environ.get('MINIMAL_PAIRS_MAX_CLIPPED_FRACTION', 0.01))
+
+# ==========================
+# Pronunciation Lexicon
+# ==========================
+
+# Lexicon files separated by os.pathsep; `.tsv` is word<TAB>/IPA/, anything
+# else is read as CMUdict (ARPAbet). Later files add pronunciations.
+LEXICON_PATHS = [
+    path for path in os.environ.get(
+        'MINIMAL_PAIRS_LEXICON_PATHS', os.path.join(BASE_DIR, 'lexicon.tsv')
+    ).split(os.pathsep) if path
+]
+
+# Optional word list, most frequent first, used by `pair_finder.py --max-rank`
+WORD_FREQUENCY_PATH = os.environ.get('MINIMAL_PAIRS_WORD_FREQUENCIES') or None
+
+# Alignment costs used to locate the substituted phoneme in a wrong answer
+ALIGN_INSERT_COST = 1.0
+ALIGN_DELETE_COST = 1.0
+# Swapping within a class (vowel for vowel) is the expected minimal-pair error
+ALIGN_SUBSTITUTE_COST = 1.0
+ALIGN_CROSS_CLASS_COST = 2.5
+
+# Compiled corpus artifact written by `python corpus.py`
+CORPUS_ARTIFACT_PATH = os.environ.get('MINIMAL_PAIRS_CORPUS_ARTIFACT', os.path.join(CACHE_DIR, 'corpus.json'))
+
+# ==========================
+# Diagnostics
+# ==========================
+
+# Show per-panel and per-run server time captions
+SHOW_TIMINGS = os.environ.get('MINIMAL_PAIRS_SHOW_TIMINGS', '') not in ('', '0', 'false')
+# Show cache, pre-processing and recording stats in the sidebar. They cover every session in
+# the process, so learners do not see them by default; /metrics exports the same numbers
+SHOW_DIAGNOSTICS = os.environ.get('MINIMAL_PAIRS_SHOW_DIAGNOSTICS', '') not in ('', '0', 'false')
+
+# Prometheus text format at http://<host>:<port>/metrics; port 0 disables the endpoint
+METRICS_HOST = os.environ.get('MINIMAL_PAIRS_METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.environ.get('MINIMAL_PAIRS_METRICS_PORT', 9464))
+# JSON-lines file receiving one event per timed span; empty disables tracing
+METRICS_TRACE_PATH = os.environ.get('MINIMAL_PAIRS_TRACE_PATH') or None
+
+# ==========================
+# Reference Audio Prefetch
+# ==========================
+
+# Items after the current one whose reference audio is loaded in the background
+PREFETCH_AHEAD = int(os.environ.get('MINIMAL_PAIRS_PREFETCH_AHEAD', 3))
+PREFETCH_WORKERS = int(os.environ.get('MINIMAL_PAIRS_PREFETCH_WORKERS', 4))
+PREFETCH_MAX_BYTES = int(os.environ.get('MINIMAL_PAIRS_PREFETCH_MAX_BYTES', 2 * 1024 * 1024))
+
+# ==========================
+# Reference Audio by URL
+# ==========================
+
+# Public prefix learners' browsers use to reach the handler, e.g. behind a reverse proxy
+AUDIO_BASE_URL = os.environ.get('MINIMAL_PAIRS_AUDIO_BASE_URL', '')
+# Serve reference clips from a small static HTTP handler instead of inline bytes. Off unless
+# AUDIO_BASE_URL is set: a remote browser cannot reach the server's localhost
+AUDIO_SERVE_BY_URL = os.environ.get('MINIMAL_PAIRS_AUDIO_SERVE_BY_URL',
+                                    '1' if AUDIO_BASE_URL else '0') not in ('', '0', 'false')
+AUDIO_SERVER_HOST = os.environ.get('MINIMAL_PAIRS_AUDIO_SERVER_HOST', '127.0.0.1')
+AUDIO_SERVER_PORT = int(os.environ.get('MINIMAL_PAIRS_AUDIO_SERVER_PORT', 8765))
+# Enabled without a base URL, only a browser on this machine can fetch the clips
+AUDIO_BASE_URL = AUDIO_BASE_URL or f"http://localhost:{AUDIO_SERVER_PORT}"
+
+# ==========================
+# Learner Recordings
+# ==========================
+
+# Compressed takes kept in memory per session and per process before spilling to disk
+RECORDING_SESSION_MAX_BYTES = int(os.environ.get('MINIMAL_PAIRS_RECORDING_SESSION_MAX_BYTES', 256 * 1024))
+RECORDING_PROCESS_MAX_BYTES = int(os.environ.get('MINIMAL_PAIRS_RECORDING_PROCESS_MAX_BYTES', 64 * 1024 * 1024))
+# Parent directory of per-session spools; defaults to the system temp dir
+RECORDING_SPOOL_DIR = os.environ.get('MINIMAL_PAIRS_RECORDING_SPOOL_DIR') or None
+# Playback copies are stored at this rate (mono, 16-bit)
+RECORDING_SAMPLE_RATE = int(os.environ.get('MINIMAL_PAIRS_RECORDING_SAMPLE_RATE', 16000))
+
+# ==========================
+# Results Log
+# ==========================
+
+DATA_DIR = os.environ.get('MINIMAL_PAIRS_DATA_DIR', os.path.join(BASE_DIR, 'data'))
+RESULTS_DB_PATH = os.environ.get('MINIMAL_PAIRS_RESULTS_DB', os.path.join(DATA_DIR, 'results.sqlite3'))
+# Most rows the writer thread commits in one transaction
+RESULTS_BATCH_SIZE = int(os.environ.get('MINIMAL_PAIRS_RESULTS_BATCH_SIZE', 256))
+# Longest a page waits for queued results to be committed before reading
+RESULTS_FLUSH_TIMEOUT = float(os.environ.get('MINIMAL_PAIRS_RESULTS_FLUSH_TIMEOUT', 10.0))
+# The cohort dashboard shows every learner's results; it is hidden unless a password is set
+ANALYTICS_PASSWORD = os.environ.get('MINIMAL_PAIRS_ANALYTICS_PASSWORD', '')
+
+# ==========================
+# Batch Grading
+# ==========================
+
+# Worker processes for `batch_grader.py`; recognition and pre-processing are CPU-bound locally
+BATCH_GRADE_WORKERS = int(os.environ.get('MINIMAL_PAIRS_BATCH_GRADE_WORKERS', os.cpu_count() or 1))
+# Jobs queued per worker, bounding memory on very large folders
+BATCH_GRADE_QUEUE_DEPTH = int(os.environ.get('MINIMAL_PAIRS_BATCH_GRADE_QUEUE_DEPTH', 4))
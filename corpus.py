@@ -0,0 +1,405 @@
+# corpus.py
+#
+# Validate and compile phoneme_testing.json / phoneme_practice.json into a
+# flat, read-only structure that every session in the process shares.
+#
+#     python corpus.py [--out PATH]
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import tempfile
+from collections import namedtuple
+
+import config
+
+# Bumped whenever the compiled layout changes so stale artifacts are rebuilt
+ARTIFACT_VERSION = 3
+
+PHONEME_TYPES = ('vowels', 'diphthongs', 'consonants')
+LEVEL_KEYS = ('level_1', 'level_2', 'level_3')
+
+TestingItem = namedtuple('TestingItem', ['word', 'ipa', 'sentence', 'phoneme', 'phonemic_contrast'])
+
+
+class PracticeItem(namedtuple('PracticeItem', ['carrier', 'filler', 'target_word', 'ipa'])):
+    """
+    A practice sentence stored as a shared carrier frame plus its slot filler.
+
+    `carrier` is a (prefix, suffix) tuple interned across the corpus, so each
+    frame such as ("That's a ", ".") is stored once; `filler` is the target
+    word as written in the sentence. Sentences that do not contain their
+    target word keep the whole text as the prefix and an empty filler.
+    """
+
+    __slots__ = ()
+
+    @property
+    def sentence(self):
+        prefix, suffix = self.carrier
+        return prefix + self.filler + suffix
+
+# A testing word or practice sentence addressed by its results-log id
+GradingTarget = namedtuple('GradingTarget', ['item_id', 'mode', 'phoneme_type', 'contrast', 'level', 'item'])
+
+# testing: {phoneme type: (TestingItem, ...)} in display order
+# practice: {phoneme type: {contrast: {level key: (PracticeItem, ...)}}}
+# pairs: {phoneme type: {contrast: ((word, word), ...)}}
+Corpus = namedtuple('Corpus', ['testing', 'practice', 'pairs', 'source_digest'])
+EMPTY_CORPUS = Corpus({}, {}, {}, '')
+
+
+class CorpusError(ValueError):
+    """A corpus file is missing, unreadable or does not match the expected schema."""
+
+
+# ==========================
+# Validation
+# ==========================
+
+def _require(condition, location, message):
+    if not condition:
+        raise CorpusError(f"{location}: {message}")
+
+
+def validate_testing(data, source='phoneme_testing.json'):
+    _require(isinstance(data, dict), source, "expected an object keyed by phoneme type")
+    for phoneme_type, phonemes in data.items():
+        _require(isinstance(phonemes, dict), f"{source}/{phoneme_type}", "expected an object keyed by phoneme")
+        for phoneme, items in phonemes.items():
+            location = f"{source}/{phoneme_type}/{phoneme}"
+            _require(isinstance(items, list), location, "expected a list of items")
+            for i, item in enumerate(items):
+                for key in ('word', 'ipa', 'sentence'):
+                    _require(isinstance(item.get(key), str) and item[key], f"{location}[{i}]", f"missing '{key}'")
+                for contrast in item.get('phonemic_contrast', []):
+                    _require('contrast_phoneme' in contrast and 'contrast_description' in contrast,
+                             f"{location}[{i}]", "phonemic_contrast entries need a phoneme and description")
+
+
+def validate_practice(data, source='phoneme_practice.json'):
+    _require(isinstance(data, dict) and isinstance(data.get('phoneme_practice'), dict),
+             source, "expected a top-level 'phoneme_practice' object")
+    for phoneme_type, contrasts in data['phoneme_practice'].items():
+        for contrast, pairs in contrasts.items():
+            location = f"{source}/{phoneme_type}/{contrast}"
+            _require(isinstance(pairs, list), location, "expected a list of pairs")
+            for i, pair_data in enumerate(pairs):
+                for key in ('pair', 'ipa') + LEVEL_KEYS:
+                    value = pair_data.get(key)
+                    _require(isinstance(value, list) and len(value) == 2,
+                             f"{location}[{i}]", f"'{key}' must list exactly two entries")
+
+
+# ==========================
+# Compilation
+# ==========================
+
+def split_carrier(sentence, word):
+    """
+    Split `sentence` around the first whole-word occurrence of `word`.
+
+    Matching ignores case and curly apostrophes, so 'Jerry' fills the slot
+    for 'jerry' and 'Who’d' for "who'd".
+
+    Returns:
+    - tuple: (prefix, filler, suffix), or None if the word does not occur.
+    """
+    # Folding ’ keeps string lengths, so match offsets apply to the original
+    pattern = r"(?<!\w)" + re.escape(word.replace('’', "'")) + r"(?!\w)"
+    match = re.search(pattern, sentence.replace('’', "'"), re.IGNORECASE)
+    if match is None:
+        return None
+    return sentence[:match.start()], sentence[match.start():match.end()], sentence[match.end():]
+
+
+def _read_json(file_path):
+    try:
+        with open(file_path, 'rb') as file:
+            raw = file.read()
+    except FileNotFoundError as e:
+        raise CorpusError(f"File `{file_path}` not found. Please ensure it exists in the directory.") from e
+    try:
+        return raw, json.loads(raw.decode('utf-8'))
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise CorpusError(f"Error decoding JSON from `{file_path}`: {e}") from e
+
+
+def source_digest(testing_path=config.TESTING_CORPUS_PATH, practice_path=config.PRACTICE_CORPUS_PATH):
+    digest = hashlib.sha256(str(ARTIFACT_VERSION).encode())
+    for path in (testing_path, practice_path):
+        with open(path, 'rb') as file:
+            digest.update(hashlib.sha256(file.read()).digest())
+    return digest.hexdigest()
+
+
+def compile_corpus(testing_path=config.TESTING_CORPUS_PATH, practice_path=config.PRACTICE_CORPUS_PATH):
+    """
+    Validate both corpus files and pre-flatten them for the app.
+
+    Returns:
+    - Corpus: Tuples of items per phoneme type, contrast and level.
+
+    Raises:
+    - CorpusError: If a file is missing or malformed.
+    """
+    testing_raw, testing_data = _read_json(testing_path)
+    practice_raw, practice_data = _read_json(practice_path)
+    validate_testing(testing_data, os.path.basename(testing_path))
+    validate_practice(practice_data, os.path.basename(practice_path))
+
+    # Intern repeated strings (contrast labels, carrier words) once
+    intern = {}
+
+    def shared(value):
+        return intern.setdefault(value, value)
+
+    testing = {}
+    for phoneme_type, phonemes in testing_data.items():
+        items = []
+        for phoneme, word_list in phonemes.items():
+            for item in word_list:
+                contrasts = tuple(
+                    {'contrast_phoneme': shared(c['contrast_phoneme']),
+                     'contrast_description': shared(c['contrast_description'])}
+                    for c in item.get('phonemic_contrast', [])
+                )
+                items.append(TestingItem(item['word'], item['ipa'], item['sentence'], shared(phoneme), contrasts))
+        testing[phoneme_type] = tuple(items)
+
+    practice, pairs = {}, {}
+    for phoneme_type, contrasts in practice_data['phoneme_practice'].items():
+        practice[phoneme_type], pairs[phoneme_type] = {}, {}
+        for contrast, pair_list in contrasts.items():
+            levels = {}
+            for level_key in LEVEL_KEYS:
+                items = []
+                for pair_data in pair_list:
+                    for sentence, word, ipa in zip(pair_data[level_key], pair_data['pair'], pair_data['ipa']):
+                        parts = split_carrier(sentence, word)
+                        if parts is None:
+                            prefix, filler, suffix = sentence, '', ''
+                        else:
+                            prefix, filler, suffix = parts
+                        word = shared(word)
+                        items.append(PracticeItem(shared((shared(prefix), shared(suffix))),
+                                                  word if filler == word else shared(filler), word, shared(ipa)))
+                levels[level_key] = tuple(items)
+            practice[phoneme_type][shared(contrast)] = levels
+            pairs[phoneme_type][contrast] = tuple(tuple(pair_data['pair']) for pair_data in pair_list)
+
+    digest = hashlib.sha256(str(ARTIFACT_VERSION).encode())
+    digest.update(hashlib.sha256(testing_raw).digest())
+    digest.update(hashlib.sha256(practice_raw).digest())
+    return Corpus(testing, practice, pairs, digest.hexdigest())
+
+
+# ==========================
+# Compiled Artifact
+# ==========================
+#
+# Plain JSON, never pickle: the cache directory is writable, and loading must
+# not be able to run code. The first line is a header with the source digest
+# and a SHA-256 of the body on the second line.
+
+def write_artifact(corpus, artifact_path=config.CORPUS_ARTIFACT_PATH):
+    body = json.dumps({
+        'testing': corpus.testing,
+        'practice': corpus.practice,
+        'pairs': corpus.pairs,
+    }, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    header = json.dumps({
+        'version': ARTIFACT_VERSION,
+        'source_digest': corpus.source_digest,
+        'body_sha256': hashlib.sha256(body).hexdigest(),
+    }).encode('utf-8')
+    os.makedirs(os.path.dirname(artifact_path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(artifact_path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as file:
+        file.write(header + b'\n' + body)
+    os.replace(tmp_path, artifact_path)
+
+
+def read_artifact(artifact_path=config.CORPUS_ARTIFACT_PATH):
+    """
+    Load a compiled corpus written by `write_artifact`.
+
+    Raises:
+    - ValueError: If the file is corrupt, from another version or malformed.
+    """
+    with open(artifact_path, 'rb') as file:
+        header_line, _, body = file.read().partition(b'\n')
+    header = json.loads(header_line)
+    if header.get('version') != ARTIFACT_VERSION:
+        raise ValueError("Corpus artifact was written by another version")
+    if hashlib.sha256(body).hexdigest() != header.get('body_sha256'):
+        raise ValueError("Corpus artifact does not match its digest")
+    data = json.loads(body)
+
+    # JSON turns tuples into lists; rebuild the items and intern repeated strings again
+    intern = {}
+
+    def shared(value):
+        if not isinstance(value, str):
+            raise ValueError(f"Expected a string in the corpus artifact, got {value!r}")
+        return intern.setdefault(value, value)
+
+    testing = {
+        phoneme_type: tuple(
+            TestingItem(shared(word), shared(ipa), shared(sentence), shared(phoneme), tuple(
+                {'contrast_phoneme': shared(c['contrast_phoneme']),
+                 'contrast_description': shared(c['contrast_description'])}
+                for c in contrasts
+            ))
+            for word, ipa, sentence, phoneme, contrasts in items
+        )
+        for phoneme_type, items in data['testing'].items()
+    }
+    carriers = {}
+    practice = {
+        phoneme_type: {
+            shared(contrast): {
+                level_key: tuple(
+                    PracticeItem(carriers.setdefault((prefix, suffix), (shared(prefix), shared(suffix))),
+                                 shared(filler), shared(target_word), shared(ipa))
+                    for (prefix, suffix), filler, target_word, ipa in levels[level_key]
+                )
+                for level_key in LEVEL_KEYS
+            }
+            for contrast, levels in contrasts.items()
+        }
+        for phoneme_type, contrasts in data['practice'].items()
+    }
+    pairs = {
+        phoneme_type: {
+            contrast: tuple(tuple(shared(word) for word in pair) for pair in pair_list)
+            for contrast, pair_list in contrasts.items()
+        }
+        for phoneme_type, contrasts in data['pairs'].items()
+    }
+    return Corpus(testing, practice, pairs, shared(header['source_digest']))
+
+
+def load_corpus(artifact_path=config.CORPUS_ARTIFACT_PATH):
+    """
+    Load the compiled corpus, recompiling it if the JSON sources changed.
+
+    Raises:
+    - CorpusError: If the sources are missing or malformed.
+    """
+    try:
+        current_digest = source_digest()
+    except FileNotFoundError as e:
+        raise CorpusError(f"File `{e.filename}` not found. Please ensure it exists in the directory.") from e
+
+    try:
+        corpus = read_artifact(artifact_path)
+        if corpus.source_digest == current_digest:
+            return corpus
+    except (OSError, ValueError, TypeError, KeyError, AttributeError):
+        # Missing, stale or damaged; recompile
+        pass
+
+    corpus = compile_corpus()
+    try:
+        write_artifact(corpus, artifact_path)
+    except OSError:
+        # A read-only deployment can still run from the in-memory copy
+        pass
+    return corpus
+
+
+def testing_item_id(phoneme_type, index):
+    """Return the stable id of a testing word, as stored in the results log."""
+    return f"{phoneme_type}/{index}"
+
+
+def _escape_id_part(part):
+    # Contrast labels such as '/æ/ vs /e/' contain the separator
+    return part.replace('%', '%25').replace('/', '%2F')
+
+
+def practice_item_id(phoneme_type, contrast, level, index):
+    """
+    Return the stable id of a practice sentence, as stored in the results log.
+
+    Parameters:
+    - phoneme_type (str): 'vowels', 'diphthongs' or 'consonants'.
+    - contrast (str): The contrast label; '/' and '%' are escaped in the id.
+    - level (str): A level key from `LEVEL_KEYS`, e.g. 'level_1'.
+    - index (int): Position of the sentence within the level.
+
+    Returns:
+    - str: e.g. 'vowels/%2Fæ%2F vs %2Fe%2F/level_1/0'.
+    """
+    return f"{phoneme_type}/{_escape_id_part(contrast)}/{level}/{index}"
+
+
+def split_item_id(item_id):
+    """Return the unescaped '/'-separated parts of a testing or practice item id."""
+    return [part.replace('%2F', '/').replace('%25', '%') for part in item_id.split('/')]
+
+
+def index_targets(corpus):
+    """
+    Map item ids to `GradingTarget`s for every testing word and practice sentence.
+
+    Testing words are also reachable by the word itself, so batch jobs can name
+    either an id or the target word.
+    """
+    targets = {}
+    for phoneme_type, items in corpus.testing.items():
+        for index, item in enumerate(items):
+            item_id = testing_item_id(phoneme_type, index)
+            target = GradingTarget(item_id, 'testing', phoneme_type, '', '', item)
+            targets[item_id] = target
+            targets.setdefault(item.word.lower(), target)
+    for phoneme_type, contrasts in corpus.practice.items():
+        for contrast, levels in contrasts.items():
+            for level_key in LEVEL_KEYS:
+                for index, item in enumerate(levels[level_key]):
+                    item_id = practice_item_id(phoneme_type, contrast, level_key, index)
+                    targets[item_id] = GradingTarget(item_id, 'practice', phoneme_type, contrast, level_key, item)
+    return targets
+
+
+def iter_practice_items(corpus):
+    """Yield every PracticeItem in corpus order."""
+    for contrasts in corpus.practice.values():
+        for levels in contrasts.values():
+            for level_key in LEVEL_KEYS:
+                yield from levels[level_key]
+
+
+def iter_texts(corpus):
+    """Yield every text the app may play back as reference audio, in corpus order."""
+    for contrasts in corpus.pairs.values():
+        for pair_list in contrasts.values():
+            for pair in pair_list:
+                yield from pair
+    for item in iter_practice_items(corpus):
+        yield item.sentence
+    for items in corpus.testing.values():
+        for item in items:
+            yield item.sentence
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate and compile the phoneme corpora.")
+    parser.add_argument('--out', default=config.CORPUS_ARTIFACT_PATH, help="Artifact path.")
+    args = parser.parse_args()
+
+    corpus = compile_corpus()
+    write_artifact(corpus, args.out)
+    testing_count = sum(len(items) for items in corpus.testing.values())
+    practice_count = sum(len(levels['level_1']) for contrasts in corpus.practice.values()
+                         for levels in contrasts.values())
+    carriers = {item.carrier for item in iter_practice_items(corpus)}
+    print(f"Compiled {testing_count} testing items and {practice_count} practice items per level "
+          f"({len(carriers)} carrier frames) to {args.out} ({os.path.getsize(args.out)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# grading.py
+
+import string
+from collections import namedtuple
+from functools import lru_cache
+
+import config
+import metrics
+from asr_backends import RecognitionError, RecognitionTimeout, get_backend
+from audio_preprocess import AudioRejected, preprocess_recording
+from lexicon import get_homophone_index, normalize_word
+from recognition_cache import get_default_cache
+
+# The outcome of grading one take; confidence is None when nothing was recognized
+Grade = namedtuple('Grade', ['text', 'correct', 'error', 'confidence'])
+
+# Built once at import; every hypothesis is normalized with one translate()
+_PUNCTUATION_TABLE = str.maketrans('', '', string.punctuation + '‘’“”')
+
+# Rank weights for hypotheses whose engine reports no confidence
+_RANK_DECAY = 0.5
+
+
+def normalize_transcript(text):
+    """Lowercase, drop punctuation and split into words."""
+    return text.lower().translate(_PUNCTUATION_TABLE).split()
+
+
+@lru_cache(maxsize=4096)
+def accepted_forms(expected_word):
+    """
+    Return the normalized word sequences that count as saying `expected_word`.
+
+    These are the word itself plus every homophone the lexicon lists, so 'flee'
+    is accepted for 'flea'.
+
+    Returns:
+    - frozenset: Tuples of normalized words.
+    """
+    forms = {tuple(normalize_transcript(expected_word))}
+    for homophone in get_homophone_index().get(normalize_word(expected_word), ()):
+        forms.add(tuple(normalize_transcript(homophone)))
+    forms.discard(())
+    return frozenset(forms)
+
+
+def _contains(words, form):
+    if len(form) == 1:
+        return form[0] in words
+    return any(tuple(words[i:i + len(form)]) == form for i in range(len(words) - len(form) + 1))
+
+
+def hypothesis_weights(hypotheses):
+    """
+    Turn n-best confidences into weights that sum to 1.
+
+    Reported confidences are used as given; hypotheses without one share the
+    remaining mass, halving with each rank.
+
+    Parameters:
+    - hypotheses (list): `(transcript, confidence or None)` tuples, best first.
+
+    Returns:
+    - list: One weight per hypothesis.
+    """
+    known = sum(confidence for _, confidence in hypotheses if confidence is not None)
+    missing = [rank for rank, (_, confidence) in enumerate(hypotheses) if confidence is None]
+    weights = [confidence or 0.0 for _, confidence in hypotheses]
+    if missing:
+        remaining = max(0.0, 1.0 - known)
+        decay = [_RANK_DECAY ** rank for rank in missing]
+        for rank, share in zip(missing, decay):
+            weights[rank] = remaining * share / sum(decay)
+    total = sum(weights)
+    return [weight / total for weight in weights] if total else [1.0 / len(hypotheses)] * len(hypotheses)
+
+
+def score_hypotheses(hypotheses, expected_word, accept_threshold=config.ASR_ACCEPT_THRESHOLD):
+    """
+    Score every hypothesis against the target word and its homophones.
+
+    A take is correct when the top hypothesis names the target, whatever its
+    confidence, or when lower-ranked matches together carry `accept_threshold`.
+
+    Parameters:
+    - hypotheses (list): `(transcript, confidence or None)` tuples, best first.
+    - expected_word (str): The target word.
+    - accept_threshold (float): Share of the weight that must name the target
+      when the top hypothesis does not.
+
+    Returns:
+    - tuple: (transcript to show, correct flag, confidence that the target was said).
+      The transcript is the best matching hypothesis when correct, else the
+      best one that does not name the target.
+    """
+    forms = accepted_forms(expected_word)
+    confidence = 0.0
+    best_match = None
+    best_miss = None
+    for (text, _), weight in zip(hypotheses, hypothesis_weights(hypotheses)):
+        words = normalize_transcript(text)
+        if any(_contains(words, form) for form in forms):
+            confidence += weight
+            if best_match is None:
+                best_match = text
+        elif best_miss is None:
+            best_miss = text
+    correct = best_match == hypotheses[0][0] or confidence >= accept_threshold
+    return (best_match if correct else best_miss), correct, confidence
+
+
+def recognize_speech_from_audio(audio_bytes, expected_word, timeout=config.ASR_TIMEOUT, backend=None):
+    """
+    Transcribe a recording and check it against the expected word.
+
+    This function never touches Streamlit, so it is safe to run on a worker
+    thread; errors are returned as a message for the page to display.
+
+    Parameters:
+    - audio_bytes (bytes): The WAV recording.
+    - expected_word (str): The target word.
+    - timeout (float): Seconds the backend may take.
+    - backend (ASRBackend): Overrides the configured backend.
+
+    Returns:
+    - Grade: (recognized text, correct flag, error message or None, confidence).
+    """
+    backend = backend or get_backend()
+
+    # Reruns and retries resend identical audio; answer those from the cache
+    cache = get_default_cache()
+    cache_key = cache.make_key(audio_bytes, f"{backend.identity}|n={config.ASR_N_BEST}")
+    hypotheses = cache.get(cache_key)
+
+    if hypotheses is None:
+        # Identical takes graded by several workers at once reach the recognizer once
+        with cache.single_flight(cache_key, wait=timeout) as hypotheses:
+            if hypotheses is None:
+                # Resample and trim locally; unusable takes never reach the recognizer
+                try:
+                    prepared = preprocess_recording(audio_bytes)
+                except AudioRejected as e:
+                    return Grade("", False, str(e), None)
+                sent_bytes = prepared.audio_bytes if backend.preprocess else audio_bytes
+
+                try:
+                    with metrics.span('asr', backend=backend.name):
+                        hypotheses = backend.recognize_n_best(sent_bytes, n=config.ASR_N_BEST, timeout=timeout)
+                except RecognitionTimeout:
+                    return Grade("", False, f"{backend.display_name} took too long to respond. Please try again.", None)
+                except RecognitionError as e:
+                    return Grade("", False, f"Could not request results from {backend.display_name}; {e}", None)
+                # Empty results may be transient, so only successes are cached
+                if hypotheses:
+                    cache.put(cache_key, [list(hypothesis) for hypothesis in hypotheses])
+
+    if not hypotheses:
+        return Grade("", False, f"{backend.display_name} could not understand the audio.", None)
+
+    text, correct, confidence = score_hypotheses([tuple(hypothesis) for hypothesis in hypotheses], expected_word)
+    return Grade(text, correct, None, confidence)
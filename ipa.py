@@ -0,0 +1,85 @@
+# ipa.py
+
+from functools import lru_cache
+
+# Spelling variants found in the corpora and common dictionaries, folded onto
+# the symbols used by the contrast labels in phoneme_testing.json
+_NORMALIZE_TABLE = str.maketrans({
+    ':': 'ː',
+    'g': 'ɡ',
+    'ɛ': 'e',
+    'ʧ': 'tʃ',
+    'ʤ': 'dʒ',
+    'ɹ': 'r',
+    '’': None,
+    "'": None,
+    'ˈ': None,
+    'ˌ': None,
+    '/': None,
+    '.': None,
+    ' ': None,
+})
+
+# Multi-character phonemes, matched before single symbols
+DIGRAPHS = frozenset({
+    # Long vowels
+    'iː', 'ɑː', 'ɔː', 'uː', 'ɜː',
+    # Diphthongs
+    'eɪ', 'aɪ', 'ɔɪ', 'əʊ', 'oʊ', 'aʊ', 'ɪə', 'eə', 'ʊə',
+    # Affricates
+    'tʃ', 'dʒ',
+})
+
+
+def normalize_ipa(transcription):
+    """Strip slashes and stress marks and fold symbol variants, e.g. '/ˈkɔ:d/' -> 'kɔːd'."""
+    return transcription.translate(_NORMALIZE_TABLE)
+
+
+@lru_cache(maxsize=65536)
+def tokenize_ipa(transcription):
+    """
+    Split an IPA transcription into phonemes.
+
+    Length marks stay attached to their vowel and diphthongs and affricates
+    are kept as single units, e.g. '/ʃiːp/' -> ('ʃ', 'iː', 'p').
+
+    Results are memoized, so repeated words cost a dict lookup.
+
+    Parameters:
+    - transcription (str): An IPA string, with or without slashes.
+
+    Returns:
+    - tuple: The phonemes as strings.
+    """
+    text = normalize_ipa(transcription)
+    phonemes = []
+    i = 0
+    while i < len(text):
+        if text[i:i + 2] in DIGRAPHS:
+            phonemes.append(text[i:i + 2])
+            i += 2
+        elif text[i] == 'ː' and phonemes:
+            # A length mark after a symbol not listed above
+            phonemes[-1] += 'ː'
+            i += 1
+        else:
+            phonemes.append(text[i])
+            i += 1
+    return tuple(phonemes)
+
+
+def format_ipa(phonemes):
+    """Join phonemes back into a slash-delimited transcription."""
+    return f"/{''.join(phonemes)}/"
+
+
+# Vowel nuclei; every other phoneme is scored as a consonant
+VOWELS = frozenset({
+    'iː', 'i', 'ɪ', 'e', 'æ', 'ʌ', 'ɑː', 'ɒ', 'ɔː', 'ʊ', 'uː', 'ɜː', 'ə',
+    'eɪ', 'aɪ', 'ɔɪ', 'əʊ', 'oʊ', 'aʊ', 'ɪə', 'eə', 'ʊə', 'a', 'o', 'u',
+})
+
+
+def is_vowel(phoneme):
+    return phoneme in VOWELS
@@ -0,0 +1,203 @@
+# lexicon.py
+
+import threading
+from array import array
+
+import config
+from ipa import format_ipa, tokenize_ipa
+
+# CMUdict ARPAbet symbols (stress digits removed) mapped to the IPA used in the corpora
+ARPABET_TO_IPA = {
+    'AA': 'ɑː', 'AE': 'æ', 'AH': 'ʌ', 'AO': 'ɔː', 'AW': 'aʊ', 'AY': 'aɪ',
+    'EH': 'e', 'ER': 'ɜː', 'EY': 'eɪ', 'IH': 'ɪ', 'IY': 'iː', 'OW': 'əʊ',
+    'OY': 'ɔɪ', 'UH': 'ʊ', 'UW': 'uː',
+    'B': 'b', 'CH': 'tʃ', 'D': 'd', 'DH': 'ð', 'F': 'f', 'G': 'ɡ', 'HH': 'h',
+    'JH': 'dʒ', 'K': 'k', 'L': 'l', 'M': 'm', 'N': 'n', 'NG': 'ŋ', 'P': 'p',
+    'R': 'r', 'S': 's', 'SH': 'ʃ', 'T': 't', 'TH': 'θ', 'V': 'v', 'W': 'w',
+    'Y': 'j', 'Z': 'z', 'ZH': 'ʒ',
+}
+# Unstressed AH is a schwa
+ARPABET_UNSTRESSED = {'AH0': 'ə', 'ER0': 'ə'}
+
+# Words map to (first pronunciation << COUNT_BITS) | pronunciation count
+COUNT_BITS = 4
+MAX_PRONUNCIATIONS = (1 << COUNT_BITS) - 1
+
+
+def normalize_word(word):
+    return word.strip().lower().replace('’', "'")
+
+
+class Lexicon:
+    """
+    A read-only pronunciation dictionary stored in flat arrays.
+
+    Phonemes are interned to small integer IDs and every pronunciation is a
+    slice of one `array('H')`, so a CMUdict-sized lexicon costs a few MB and
+    every lookup is a single dict access plus slicing. Words may have several
+    pronunciations, kept in file order.
+    """
+
+    def __init__(self, entries):
+        """
+        Parameters:
+        - entries (iterable): (word, phoneme tuple) pairs, in any order.
+        """
+        self.phonemes = []
+        self._phoneme_ids = {}
+        self._phones = array('H')
+        self._offsets = array('I', [0])
+        self._words = {}
+
+        grouped = {}
+        for word, phonemes in entries:
+            pronunciations = grouped.setdefault(normalize_word(word), [])
+            if phonemes not in pronunciations and len(pronunciations) < MAX_PRONUNCIATIONS:
+                pronunciations.append(phonemes)
+
+        for word, pronunciations in grouped.items():
+            first = len(self._offsets) - 1
+            for phonemes in pronunciations:
+                self._phones.extend(self.intern(phoneme) for phoneme in phonemes)
+                self._offsets.append(len(self._phones))
+            self._words[word] = (first << COUNT_BITS) | len(pronunciations)
+
+    def intern(self, phoneme):
+        """Return the integer ID of `phoneme`, assigning one if it is new."""
+        phoneme_id = self._phoneme_ids.get(phoneme)
+        if phoneme_id is None:
+            phoneme_id = len(self.phonemes)
+            self.phonemes.append(phoneme)
+            self._phoneme_ids[phoneme] = phoneme_id
+        return phoneme_id
+
+    def phoneme_id(self, phoneme):
+        return self._phoneme_ids.get(phoneme)
+
+    def __contains__(self, word):
+        return normalize_word(word) in self._words
+
+    def __len__(self):
+        return len(self._words)
+
+    def words(self):
+        return self._words.keys()
+
+    def pronunciation_ids(self, word):
+        """
+        Return every pronunciation of `word` as phoneme-ID arrays.
+
+        Returns:
+        - list: `array('H')` slices, empty if the word is unknown.
+        """
+        packed = self._words.get(normalize_word(word))
+        if packed is None:
+            return []
+        first, count = packed >> COUNT_BITS, packed & MAX_PRONUNCIATIONS
+        offsets = self._offsets
+        return [self._phones[offsets[i]:offsets[i + 1]] for i in range(first, first + count)]
+
+    def pronunciations(self, word):
+        """Return every pronunciation of `word` as phoneme tuples."""
+        phonemes = self.phonemes
+        return [tuple(phonemes[i] for i in ids) for ids in self.pronunciation_ids(word)]
+
+    def transcription(self, word):
+        """Return the first pronunciation as '/.../', or None if the word is unknown."""
+        pronunciations = self.pronunciations(word)
+        return format_ipa(pronunciations[0]) if pronunciations else None
+
+
+# ==========================
+# Loading
+# ==========================
+
+def read_tsv(file_path):
+    """Yield (word, phonemes) from `word<TAB>/IPA/` lines; '#' starts a comment."""
+    with open(file_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            if not line.strip() or line.startswith('#'):
+                continue
+            word, transcription = line.rstrip('\n').split('\t')[:2]
+            yield word, tokenize_ipa(transcription)
+
+
+def read_cmudict(file_path):
+    """Yield (word, phonemes) from CMUdict, converting ARPAbet to IPA."""
+    with open(file_path, 'r', encoding='latin-1') as file:
+        for line in file:
+            if not line.strip() or line.startswith(';;;'):
+                continue
+            # Comments may trail the pronunciation after '#'
+            fields = line.split('#', 1)[0].split()
+            word, symbols = fields[0], fields[1:]
+            # Alternate pronunciations are listed as WORD(2), WORD(3), ...
+            if word.endswith(')') and '(' in word:
+                word = word[:word.index('(')]
+            phonemes = []
+            for symbol in symbols:
+                if symbol in ARPABET_UNSTRESSED:
+                    phonemes.append(ARPABET_UNSTRESSED[symbol])
+                else:
+                    phonemes.append(ARPABET_TO_IPA[symbol.rstrip('012')])
+            yield word, tuple(phonemes)
+
+
+def load_lexicon(paths):
+    """Build a `Lexicon` from the given TSV and CMUdict files."""
+    def entries():
+        for path in paths:
+            reader = read_tsv if path.endswith('.tsv') else read_cmudict
+            yield from reader(path)
+    return Lexicon(entries())
+
+
+def build_homophone_index(lexicon):
+    """
+    Map each word to the other words sharing one of its pronunciations.
+
+    Words with several pronunciations collect homophones of each, so 'read'
+    lists both 'reed' and 'red'. Words without homophones are left out.
+
+    Returns:
+    - dict: word -> tuple of homophones, in lexicon order.
+    """
+    by_pronunciation = {}
+    for word in lexicon.words():
+        for ids in lexicon.pronunciation_ids(word):
+            by_pronunciation.setdefault(ids.tobytes(), []).append(word)
+
+    index = {}
+    for words in by_pronunciation.values():
+        if len(words) < 2:
+            continue
+        for word in words:
+            homophones = index.setdefault(word, [])
+            homophones.extend(other for other in words if other != word and other not in homophones)
+    return {word: tuple(homophones) for word, homophones in index.items()}
+
+
+_lexicon = None
+_lexicon_lock = threading.Lock()
+
+
+def get_lexicon():
+    """Return the process-wide lexicon loaded from `config.LEXICON_PATHS`."""
+    global _lexicon
+    with _lexicon_lock:
+        if _lexicon is None:
+            _lexicon = load_lexicon(config.LEXICON_PATHS)
+        return _lexicon
+
+
+_homophone_index = None
+_homophone_index_lock = threading.Lock()
+
+
+def get_homophone_index():
+    """Return the process-wide homophone index of `get_lexicon()`."""
+    global _homophone_index
+    with _homophone_index_lock:
+        if _homophone_index is None:
+            _homophone_index = build_homophone_index(get_lexicon())
+        return _homophone_index
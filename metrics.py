@@ -0,0 +1,277 @@
+# metrics.py
+#
+# In-process timing spans, counters and histograms for the hot paths (TTS,
+# recognition, result charts, whole script runs). Aggregates are exported in
+# the Prometheus text format on a local port, and every span can also be
+# appended to a JSON-lines trace file.
+#
+# Recording a span costs two perf_counter() calls, a bisect and a short lock,
+# a few microseconds against reruns of several milliseconds. Counters that
+# other modules already keep (cache hits) are read only when scraped.
+
+import bisect
+import errno
+import functools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import config
+
+# Upper bounds (le) of the histogram buckets
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+SPAN_METRIC = 'minimal_pairs_span_seconds'
+
+METRIC_HELP = {
+    SPAN_METRIC: "Time spent in instrumented code paths, by span.",
+    'minimal_pairs_audio_payload_bytes': "Bytes handed to st.audio per call, by delivery and format.",
+    'minimal_pairs_asr_attempts_total': "Recognizer calls by backend and outcome.",
+    'minimal_pairs_asr_retries_total': "Failed recognizer calls retried after a backoff.",
+    'minimal_pairs_asr_hedges_total': "Requests sent to the hedge backend, by reason.",
+    'minimal_pairs_asr_hedge_winners_total': "Hedged recognitions by which request answered first.",
+    'minimal_pairs_asr_short_circuits_total': "Calls skipped because the backend's circuit was open.",
+    'minimal_pairs_asr_breaker_transitions_total': "Circuit breaker state changes by backend and new state.",
+}
+
+
+class Histogram:
+    """Cumulative-bucket histogram; the registry lock guards updates."""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Span:
+    """Times a block into the span histogram; `seconds` is set on exit."""
+
+    __slots__ = ('registry', 'name', 'labels', 'seconds', '_start')
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+        self.seconds = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.seconds = time.perf_counter() - self._start
+        self.registry.record_span(self.name, self.seconds, error=exc_info[0] is not None, **self.labels)
+        return False
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """
+    Process-wide store of histograms and counters.
+
+    Parameters:
+    - trace_path (str): Optional JSON-lines file receiving one event per span.
+    """
+
+    def __init__(self, trace_path=None):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._collectors = []
+        self._trace = open(trace_path, 'a', encoding='utf-8', buffering=1) if trace_path else None
+        self._trace_lock = threading.Lock()
+
+    def span(self, name, **labels):
+        """Return a context manager timing its block as span `name`."""
+        return Span(self, name, labels)
+
+    def record_span(self, name, seconds, error=False, **labels):
+        """Record an already measured duration as span `name`."""
+        labels['span'] = name
+        self.observe(SPAN_METRIC, seconds, **labels)
+        if self._trace is not None:
+            event = {'ts': round(time.time(), 6), 'span': name, 'ms': round(seconds * 1000, 3),
+                     'thread': threading.current_thread().name}
+            if error:
+                event['error'] = True
+            event.update((key, value) for key, value in labels.items() if key != 'span')
+            line = json.dumps(event, ensure_ascii=False) + '\n'
+            with self._trace_lock:
+                self._trace.write(line)
+
+    def observe(self, metric, value, buckets=SECONDS_BUCKETS, **labels):
+        """Add `value` to the histogram `metric` with `labels`."""
+        key = (metric, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def increment(self, metric, amount=1, **labels):
+        """Add `amount` to the counter `metric` with `labels`."""
+        key = (metric, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def register_collector(self, collector):
+        """
+        Add a callable read at scrape time.
+
+        It returns (metric, type, help, [(labels dict, value), ...]) tuples,
+        which lets modules export counters they already keep.
+        """
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        with self._lock:
+            histograms = {key: (h.buckets, list(h.counts), h.sum, h.count) for key, h in self._histograms.items()}
+            counters = dict(self._counters)
+            collectors = list(self._collectors)
+
+        lines = []
+        for metric in sorted({metric for metric, _ in histograms}):
+            lines.append(f"# HELP {metric} {METRIC_HELP.get(metric, metric)}")
+            lines.append(f"# TYPE {metric} histogram")
+            for (name, labels), (buckets, counts, total, count) in sorted(histograms.items()):
+                if name != metric:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    lines.append(f"{metric}_bucket{_format_labels(labels, [('le', _format_value(bound))])} {cumulative}")
+                lines.append(f"{metric}_sum{_format_labels(labels)} {total!r}")
+                lines.append(f"{metric}_count{_format_labels(labels)} {count}")
+
+        for metric in sorted({metric for metric, _ in counters}):
+            lines.append(f"# HELP {metric} {METRIC_HELP.get(metric, metric)}")
+            lines.append(f"# TYPE {metric} counter")
+            for (name, labels), value in sorted(counters.items()):
+                if name == metric:
+                    lines.append(f"{metric}{_format_labels(labels)} {_format_value(value)}")
+
+        for collector in collectors:
+            for metric, metric_type, help_text, samples in collector():
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{metric}{_format_labels(_label_key(labels))} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    """Return the process-wide registry configured in `config`."""
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = MetricsRegistry(config.METRICS_TRACE_PATH)
+    return _metrics
+
+
+def span(name, **labels):
+    """Time a block as span `name` in the process-wide registry."""
+    return get_metrics().span(name, **labels)
+
+
+def timed(name):
+    """Decorator timing every call of a function as span `name`."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with get_metrics().span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# ==========================
+# Prometheus Endpoint
+# ==========================
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'MinimalPairsMetrics/1'
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = get_metrics().render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_started = False
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(host=config.METRICS_HOST, port=config.METRICS_PORT):
+    """
+    Serve /metrics on a daemon thread, once per process.
+
+    Returns:
+    - bool: True if this process serves the endpoint. With several workers on
+      one host, the first to bind the port is the one scraped.
+    """
+    global _server, _server_started
+    if _server_started or not port:
+        return _server is not None
+    with _server_lock:
+        if _server_started:
+            return _server is not None
+        try:
+            _server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+        except OSError as e:
+            if e.errno != errno.EADDRINUSE:
+                return False
+        else:
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name='metrics-server', daemon=True).start()
+        _server_started = True
+        return _server is not None
@@ -0,0 +1,271 @@
+# pair_finder.py
+#
+# Discover minimal pairs in the pronunciation lexicon and emit them in the
+# phoneme_practice.json schema, ready for curation.
+#
+#     python pair_finder.py --contrast "/æ/ vs /e/" [--max-rank 20000] [--out pairs.json]
+#     python pair_finder.py --testing-contrasts --per-contrast 10 --exclude-existing
+#
+# Every pronunciation is indexed under one key per phoneme position, with that
+# phoneme masked out. Two words differ by exactly one phoneme iff they share a
+# key, so pairs come straight out of the hash buckets instead of comparing
+# every word with every other.
+
+import argparse
+import json
+import sys
+from collections import namedtuple
+
+import config
+from corpus import CorpusError, load_corpus
+from ipa import DIGRAPHS, format_ipa, is_vowel, tokenize_ipa
+from lexicon import get_lexicon, load_lexicon, normalize_word
+
+# The masked position in an index key; phoneme IDs never reach it
+WILDCARD = b'\xff\xff'
+
+# Carrier sentences for generated entries, in the style of the curated ones
+LEVEL_TEMPLATES = {
+    'level_1': "That's a {word}.",
+    'level_2': "He waited for the {word}.",
+    'level_3': "She placed the {word} on the table.",
+}
+
+# A pair of words whose pronunciations differ only in `phonemes`, in contrast order
+MinimalPair = namedtuple('MinimalPair', ['contrast', 'words', 'ipa', 'position'])
+Contrast = namedtuple('Contrast', ['phonemes', 'description', 'phoneme_type'])
+
+
+# ==========================
+# Contrasts
+# ==========================
+
+def _phoneme_type(phonemes):
+    if not any(is_vowel(phoneme) for phoneme in phonemes):
+        return 'consonants'
+    # Long vowels are digraphs too, but only gliding vowels are diphthongs
+    if any(phoneme in DIGRAPHS and is_vowel(phoneme) and not phoneme.endswith('ː') for phoneme in phonemes):
+        return 'diphthongs'
+    return 'vowels'
+
+
+def parse_contrast(description):
+    """
+    Parse a label such as '/æ/ vs /e/' into a `Contrast`.
+
+    Raises:
+    - ValueError: If either side is not a single phoneme.
+    """
+    sides = description.split(' vs ')
+    phonemes = tuple(tokenize_ipa(side) for side in sides)
+    if len(phonemes) != 2 or any(len(side) != 1 for side in phonemes):
+        raise ValueError(f"Expected a contrast like '/æ/ vs /e/', got {description!r}")
+    phonemes = (phonemes[0][0], phonemes[1][0])
+    return Contrast(phonemes, description, _phoneme_type(phonemes))
+
+
+def testing_contrasts(corpus):
+    """Return every single-phoneme contrast in the testing corpus, once per unordered pair."""
+    contrasts = {}
+    for phoneme_type, items in corpus.testing.items():
+        for item in items:
+            target = tokenize_ipa(item.phoneme)
+            for contrast in item.phonemic_contrast:
+                other = tokenize_ipa(contrast['contrast_phoneme'])
+                if len(target) != 1 or len(other) != 1 or target == other:
+                    continue
+                contrasts.setdefault(
+                    frozenset((target[0], other[0])),
+                    Contrast((target[0], other[0]), contrast['contrast_description'], phoneme_type),
+                )
+    return list(contrasts.values())
+
+
+# ==========================
+# Word Frequency
+# ==========================
+
+def read_frequency_ranks(file_path):
+    """
+    Read a frequency list, most frequent first, into word -> rank (1-based).
+
+    Each line starts with a word; anything after it (such as a count) is
+    ignored, so plain word lists and `word count` exports both work.
+    """
+    ranks = {}
+    with open(file_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            fields = line.split()
+            if fields and not line.startswith('#'):
+                ranks.setdefault(normalize_word(fields[0]), len(ranks) + 1)
+    return ranks
+
+
+# ==========================
+# Discovery
+# ==========================
+
+def find_minimal_pairs(lexicon, contrasts=None, words=None):
+    """
+    Yield every pair of words whose pronunciations differ in one phoneme.
+
+    Runs in time linear in the total number of phonemes plus the number of
+    pairs produced. With `contrasts`, only positions holding one of their
+    phonemes are indexed, which shrinks the index to a fraction of the lexicon.
+
+    Parameters:
+    - lexicon (Lexicon): Pronunciations to search.
+    - contrasts (list): `Contrast`s to keep; None yields every substitution.
+    - words (set): Restrict the search to these words, e.g. frequent ones.
+
+    Returns:
+    - generator: `MinimalPair`s, each unordered pair once per contrast.
+    """
+    wanted = None
+    if contrasts is not None:
+        wanted = {}
+        for contrast in contrasts:
+            ids = tuple(lexicon.phoneme_id(phoneme) for phoneme in contrast.phonemes)
+            if None not in ids:
+                wanted[frozenset(ids)] = (ids, contrast)
+        indexed_ids = {phoneme_id for pair in wanted for phoneme_id in pair}
+
+    buckets = {}
+    variant_words = set()
+    for word in lexicon.words():
+        if words is not None and word not in words:
+            continue
+        pronunciations = lexicon.pronunciation_ids(word)
+        if len(pronunciations) > 1:
+            variant_words.add(word)
+        for ids in pronunciations:
+            raw = ids.tobytes()
+            for position, phoneme_id in enumerate(ids):
+                if wanted is not None and phoneme_id not in indexed_ids:
+                    continue
+                key = raw[:2 * position] + WILDCARD + raw[2 * position + 2:]
+                buckets.setdefault(key, []).append((phoneme_id, word, ids, position))
+
+    phonemes = lexicon.phonemes
+    seen = set()
+    for entries in buckets.values():
+        if len(entries) < 2:
+            continue
+        for i, (id_a, word_a, ids_a, position) in enumerate(entries):
+            for id_b, word_b, ids_b, _ in entries[i + 1:]:
+                if id_a == id_b or word_a == word_b:
+                    continue
+                if wanted is None:
+                    order = (id_a, id_b) if phonemes[id_a] <= phonemes[id_b] else (id_b, id_a)
+                else:
+                    match = wanted.get(frozenset((id_a, id_b)))
+                    if match is None:
+                        continue
+                    order = match[0]
+                first, second = ((word_a, ids_a), (word_b, ids_b)) if order[0] == id_a else \
+                    ((word_b, ids_b), (word_a, ids_a))
+                # Alternate pronunciations can surface the same pair twice
+                if word_a in variant_words or word_b in variant_words:
+                    key = (first[0], second[0], order)
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                yield MinimalPair(
+                    (phonemes[order[0]], phonemes[order[1]]),
+                    (first[0], second[0]),
+                    tuple(format_ipa(tuple(phonemes[p] for p in ids)) for ids in (first[1], second[1])),
+                    position,
+                )
+
+
+def practice_entry(pair, templates=LEVEL_TEMPLATES):
+    """Return `pair` as a phoneme_practice.json entry with carrier sentences."""
+    entry = {'pair': list(pair.words), 'ipa': list(pair.ipa)}
+    for level_key, template in templates.items():
+        entry[level_key] = [template.format(word=word) for word in pair.words]
+    return entry
+
+
+def discover(lexicon, contrasts, ranks=None, max_rank=None, per_contrast=None, exclude=()):
+    """
+    Build a phoneme_practice.json document of new pairs for `contrasts`.
+
+    Parameters:
+    - lexicon (Lexicon): Pronunciations to search.
+    - contrasts (list): `Contrast`s to cover.
+    - ranks (dict): Word -> frequency rank; pairs of common words sort first.
+    - max_rank (int): Skip words rarer than this rank (requires `ranks`).
+    - per_contrast (int): Keep at most this many pairs per contrast.
+    - exclude (set): Unordered word pairs (frozensets) to leave out.
+
+    Returns:
+    - dict: {'phoneme_practice': {type: {contrast: [entry, ...]}}}.
+    """
+    words = None
+    if ranks is not None and max_rank is not None:
+        words = {word for word, rank in ranks.items() if rank <= max_rank}
+
+    by_phonemes = {contrast.phonemes: contrast for contrast in contrasts}
+    found = {}
+    for pair in find_minimal_pairs(lexicon, contrasts, words):
+        if frozenset(pair.words) not in exclude:
+            found.setdefault(pair.contrast, []).append(pair)
+
+    unranked = len(ranks or ()) + 1
+    document = {}
+    for phonemes, pairs in found.items():
+        contrast = by_phonemes[phonemes]
+        pairs.sort(key=lambda pair: (max((ranks or {}).get(word, unranked) for word in pair.words), pair.words))
+        entries = [practice_entry(pair) for pair in pairs[:per_contrast]]
+        document.setdefault(contrast.phoneme_type, {})[contrast.description] = entries
+    return {'phoneme_practice': document}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find minimal pairs in the pronunciation lexicon.")
+    parser.add_argument('--contrast', action='append', default=[], help="A contrast such as '/æ/ vs /e/'.")
+    parser.add_argument('--testing-contrasts', action='store_true',
+                        help="Cover every contrast listed in the testing corpus.")
+    parser.add_argument('--lexicon', action='append', help="Lexicon files; defaults to LEXICON_PATHS.")
+    parser.add_argument('--frequencies', default=config.WORD_FREQUENCY_PATH,
+                        help="Word list ordered by frequency, one word per line.")
+    parser.add_argument('--max-rank', type=int, help="Only use the N most frequent words.")
+    parser.add_argument('--per-contrast', type=int, help="Keep at most N pairs per contrast.")
+    parser.add_argument('--exclude-existing', action='store_true',
+                        help="Leave out pairs already in phoneme_practice.json.")
+    parser.add_argument('--out', help="Output JSON file; defaults to stdout.")
+    args = parser.parse_args()
+
+    contrasts = [parse_contrast(description) for description in args.contrast]
+    exclude = set()
+    if args.testing_contrasts or args.exclude_existing:
+        try:
+            corpus = load_corpus()
+        except CorpusError as e:
+            parser.error(str(e))
+        if args.testing_contrasts:
+            contrasts.extend(testing_contrasts(corpus))
+        if args.exclude_existing:
+            exclude = {frozenset(pair) for contrasts_ in corpus.pairs.values()
+                       for pair_list in contrasts_.values() for pair in pair_list}
+    if not contrasts:
+        parser.error("Give at least one --contrast or --testing-contrasts.")
+    if args.max_rank is not None and not args.frequencies:
+        parser.error("--max-rank needs a frequency list (--frequencies or MINIMAL_PAIRS_WORD_FREQUENCIES).")
+
+    lexicon = load_lexicon(args.lexicon) if args.lexicon else get_lexicon()
+    ranks = read_frequency_ranks(args.frequencies) if args.frequencies else None
+    document = discover(lexicon, contrasts, ranks, args.max_rank, args.per_contrast, exclude)
+
+    text = json.dumps(document, ensure_ascii=False, indent=4)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as file:
+            file.write(text + '\n')
+    else:
+        sys.stdout.write(text + '\n')
+    total = sum(len(entries) for contrasts_ in document['phoneme_practice'].values() for entries in contrasts_.values())
+    print(f"{total} pairs across {len(contrasts)} contrasts.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
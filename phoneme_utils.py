@@ -1,5 +1,148 @@
 # phoneme_utils.py
 
+import threading
+from functools import lru_cache
+
+import config
+from corpus import CorpusError, load_corpus
+from ipa import format_ipa, is_vowel, tokenize_ipa
+from lexicon import get_lexicon, normalize_word
+
+# ==========================
+# Alignment
+# ==========================
+
+@lru_cache(maxsize=65536)
+def word_pronunciations(word):
+    """Return the lexicon pronunciations of `word` as phoneme tuples (memoized)."""
+    return tuple(get_lexicon().pronunciations(word))
+
+
+def substitution_cost(expected, recognized):
+    if expected == recognized:
+        return 0.0
+    if is_vowel(expected) == is_vowel(recognized):
+        return config.ALIGN_SUBSTITUTE_COST
+    return config.ALIGN_CROSS_CLASS_COST
+
+
+@lru_cache(maxsize=65536)
+def align_phonemes(expected, recognized):
+    """
+    Align two phoneme sequences by weighted edit distance.
+
+    Parameters:
+    - expected (tuple): Phonemes of the target word.
+    - recognized (tuple): Phonemes of the word that was heard.
+
+    Returns:
+    - tuple: (total cost, alignment) where the alignment is a tuple of
+      (expected phoneme or None, recognized phoneme or None) pairs.
+    """
+    rows, cols = len(expected) + 1, len(recognized) + 1
+    cost = [[0.0] * cols for _ in range(rows)]
+    for i in range(1, rows):
+        cost[i][0] = i * config.ALIGN_DELETE_COST
+    for j in range(1, cols):
+        cost[0][j] = j * config.ALIGN_INSERT_COST
+
+    for i in range(1, rows):
+        previous_row, row = cost[i - 1], cost[i]
+        expected_phoneme = expected[i - 1]
+        for j in range(1, cols):
+            row[j] = min(
+                previous_row[j - 1] + substitution_cost(expected_phoneme, recognized[j - 1]),
+                previous_row[j] + config.ALIGN_DELETE_COST,
+                row[j - 1] + config.ALIGN_INSERT_COST,
+            )
+
+    # Trace back from the bottom-right corner
+    alignment = []
+    i, j = rows - 1, cols - 1
+    while i or j:
+        if i and j and cost[i][j] == cost[i - 1][j - 1] + substitution_cost(expected[i - 1], recognized[j - 1]):
+            alignment.append((expected[i - 1], recognized[j - 1]))
+            i, j = i - 1, j - 1
+        elif i and cost[i][j] == cost[i - 1][j] + config.ALIGN_DELETE_COST:
+            alignment.append((expected[i - 1], None))
+            i -= 1
+        else:
+            alignment.append((None, recognized[j - 1]))
+            j -= 1
+    alignment.reverse()
+    return cost[-1][-1], tuple(alignment)
+
+
+def find_substitutions(expected_word, recognized_word):
+    """
+    Find which phonemes of the expected word were replaced.
+
+    Every pronunciation of both words is tried and the cheapest alignment wins.
+
+    Returns:
+    - list: (expected phoneme, recognized phoneme) substitutions, empty if
+      either word is unknown or the pronunciations match.
+    """
+    best = None
+    for expected in word_pronunciations(normalize_word(expected_word)):
+        for recognized in word_pronunciations(normalize_word(recognized_word)):
+            aligned = align_phonemes(expected, recognized)
+            if best is None or aligned[0] < best[0]:
+                best = aligned
+    if best is None:
+        return []
+    return [(e, r) for e, r in best[1] if e is not None and r is not None and e != r]
+
+
+# ==========================
+# Contrast Index
+# ==========================
+
+_contrast_index = None
+_contrast_index_lock = threading.Lock()
+
+
+def build_contrast_index(testing):
+    """
+    Map (target phoneme, contrast phoneme) to its description.
+
+    Both orders are indexed, since saying /e/ for /æ/ and /æ/ for /e/ are the
+    same contrast.
+
+    Parameters:
+    - testing (dict): `Corpus.testing`, phoneme type -> TestingItem tuple.
+    """
+    index = {}
+    for items in testing.values():
+        for item in items:
+            target_key = tokenize_ipa(item.phoneme)
+            for contrast in item.phonemic_contrast:
+                contrast_key = tokenize_ipa(contrast['contrast_phoneme'])
+                if len(target_key) != 1 or len(contrast_key) != 1:
+                    continue
+                description = contrast['contrast_description']
+                index.setdefault((target_key[0], contrast_key[0]), description)
+    for (target, contrast), description in list(index.items()):
+        index.setdefault((contrast, target), description)
+    return index
+
+
+def get_contrast_index():
+    """Return the process-wide contrast index built from the testing corpus."""
+    global _contrast_index
+    with _contrast_index_lock:
+        if _contrast_index is None:
+            try:
+                _contrast_index = build_contrast_index(load_corpus().testing)
+            except CorpusError:
+                _contrast_index = {}
+        return _contrast_index
+
+
+# ==========================
+# Feedback
+# ==========================
+
 def compare_phonemes(expected_word, recognized_word, phonemic_contrasts):
     """
     Compare the phonemes of the expected word and the recognized word,
@@ -13,186 +156,33 @@ def compare_phonemes(expected_word, recognized_word, phonemic_contrasts):
     Returns:
     - tuple: A message string and the contrast description (if any).
     """
-    
-    # Expanded word-to-phoneme mapping with minimal pairs
-    word_to_phoneme = {
-        # Monophthongs (Vowels)
-        "pan": "/pæn/",
-        "cap": "/kæp/",
-        "pen": "/pɛn/",
-        "bed": "/bɛd/",
-        "cup": "/kʌp/",
-        "bud": "/bʌd/",
-        "pot": "/pɒt/",
-        "cot": "/kɒt/",
-        "pin": "/pɪn/",
-        "sheep": "/ʃiːp/",
-        "ship": "/ʃɪp/",
-        "keep": "/kiːp/",
-        "port": "/pɔːt/",
-        "pull": "/pʊl/",
-        "pool": "/puːl/",
-        "pain": "/peɪn/",
-        "pawn": "/pɔːn/",
-        "part": "/pɑːt/",
-        "purn": "/pɜːn/",
-        "pun": "/pʌn/",
-        "poon": "/puːn/",
-        "pon": "/pɒn/",
-        "pint": "/paɪnt/",
-        "kite": "/kaɪt/",
-        "cute": "/kjuːt/",
-        "caught": "/kɔːt/",
-        "cat": "/kæt/",
-        "kit": "/kɪt/",
-        "cop": "/kɒp/",
-        "cope": "/kəʊp/",
-        "cape": "/keɪp/",
-        "kept": "/kɛpt/",
-        "flea": "/fliː/",
-        "flee": "/fliː/",
-        "fly": "/flaɪ/",
-        "flow": "/fləʊ/",
-        "flaw": "/flɔː/",
-        "flew": "/fluː/",
-        "floor": "/flɔː/",
-        "flower": "/flaʊə/",
-        "flair": "/fleə/",
-        "flour": "/flaʊə/",
-        "fright": "/fraɪt/",
-        "fruit": "/fruːt/",
-        "free": "/friː/",
-        "fee": "/fiː/",
-        "few": "/fjuː/",
-        "go": "/gəʊ/",
-        "guy": "/gaɪ/",
-        "gay": "/geɪ/",
-        "gore": "/gɔː/",
-        "gear": "/gɪə/",
-        "gare": "/geə/",
-        "tour": "/tʊə/",
-        "beer": "/bɪə/",
-        "bear": "/beə/",
-        "poor": "/pʊə/",
-        "peer": "/pɪə/",
-        "pair": "/peə/",
-        "power": "/paʊə/",
-        "par": "/pɑː/",
-        "paw": "/pɔː/",
-        "pear": "/peə/",
-        "pier": "/pɪə/",
-        "put": "/pʊt/",
-        "poo": "/puː/",
-        "purr": "/pɜː/",
-        
-        # Minimal pairs for "pan" (/æ/)
-        "pain": "/peɪn/",    # pan vs pain
-        "pawn": "/pɔːn/",    # pan vs pawn
-        "part": "/pɑːt/",    # pan vs part
-        "purn": "/pɜːn/",    # pan vs purn
-        "pun": "/pʌn/",       # pan vs pun
-        "poon": "/puːn/",     # pan vs poon
-        "pin": "/pɪn/",       # pan vs pin
-        "pen": "/pɛn/",       # pan vs pen
-        
-        # Minimal pairs for "cap" (/æ/)
-        "cape": "/keɪp/",     # cap vs cape
-        "cup": "/kʌp/",       # cap vs cup
-        "cop": "/kɒp/",       # cap vs cop
-        "keep": "/kiːp/",     # cap vs keep
-        "kit": "/kɪt/",       # cap vs kit
-        "caught": "/kɔːt/",   # cap vs caught
-        "carp": "/kɑːp/",     # cap vs carp
-        "curb": "/kɜːb/",     # cap vs curb
-        
-        # Minimal pairs for "pen" (/e/)
-        "pan": "/pæn/",       # pen vs pan
-        "pin": "/pɪn/",       # pen vs pin
-        "pain": "/peɪn/",     # pen vs pain
-        "pun": "/pʌn/",       # pen vs pun
-        "pawn": "/pɔːn/",     # pen vs pawn
-        "purn": "/pɜːn/",     # pen vs purn
-        "poon": "/puːn/",     # pen vs poon
-        
-        # Minimal pairs for "keep" (/iː/)
-        "cape": "/keɪp/",     # keep vs cape
-        "kip": "/kɪp/",       # keep vs kip
-        "cup": "/kʌp/",       # keep vs cup
-        "coop": "/kuːp/",     # keep vs coop
-        "cop": "/kɒp/",       # keep vs cop
-        "cap": "/kæp/",       # keep vs cap
-        "carp": "/kɑːp/",     # keep vs carp
-        
-        # Minimal pairs for "fly" (/aɪ/)
-        "flew": "/fluː/",     # fly vs flew
-        "flow": "/fləʊ/",     # fly vs flow
-        "flea": "/fliː/",     # fly vs flea
-        "flee": "/fliː/",     # fly vs flee
-        "flue": "/fluː/",     # fly vs flue
-        "flaw": "/flɔː/",     # fly vs flaw
-        "floor": "/flɔː/",    # fly vs floor
-        
-        # Minimal pairs for "cape" (/eɪ/)
-        "keep": "/kiːp/",     # cape vs keep
-        "cop": "/kɒp/",       # cape vs cop
-        "cap": "/kæp/",       # cape vs cap
-        "cup": "/kʌp/",       # cape vs cup
-        "cope": "/kəʊp/",     # cape vs cope
-        "kip": "/kɪp/",       # cape vs kip
-        "carp": "/kɑːp/",     # cape vs carp
-        
-        # Minimal pairs for "go" (/əʊ/)
-        "guy": "/gaɪ/",       # go vs guy
-        "gay": "/geɪ/",       # go vs gay
-        "gow": "/gaʊ/",       # go vs gow
-        "goo": "/guː/",       # go vs goo
-        "gore": "/gɔː/",      # go vs gore
-        "gear": "/gɪə/",      # go vs gear
-        "gare": "/geə/",      # go vs gare
-        
-        # Minimal pairs for "tour" (/ʊə/)
-        "tire": "/taɪə/",     # tour vs tire
-        "tear": "/teə/",      # tour vs tear
-        "tower": "/taʊə/",    # tour vs tower
-        "tore": "/tɔː/",      # tour vs tore
-        "tear": "/tɪə/",      # tour vs tear
-        "too": "/tuː/",       # tour vs too
-        "tug": "/tʌg/",       # tour vs tug
-        
-        # Minimal pairs for Phoneme Practice
-        # Vowel Minimal Pairs
-        "sit": "/sɪt/",
-        "seat": "/siːt/",
-        "desk": "/dɛsk/",
-        "disk": "/dɪsk/",
-        "wet": "/wɛt/",
-        "wait": "/weɪt/",
-        
-        # Additional minimal pairs can be added here...
-    }
-
-    # Retrieve phonemes for the expected and recognized words
-    expected_phoneme = word_to_phoneme.get(expected_word.lower())
-    recognized_phoneme = word_to_phoneme.get(recognized_word.lower())
-
-    # Check if both phonemes exist
-    if not expected_phoneme or not recognized_phoneme:
-        # Provide feedback if either word is not found
-        return f"You said '{recognized_word}', but the correct word was '{expected_word}'.", "No contrast found"
 
     # Check for exact match (case-insensitive)
     if expected_word.lower() == recognized_word.lower():
         return "Your pronunciation was correct!", None
 
-    # Iterate through phonemic contrasts to find a match
+    # Check if both words are in the lexicon
+    if not word_pronunciations(normalize_word(expected_word)) or not word_pronunciations(normalize_word(recognized_word)):
+        # Provide feedback if either word is not found
+        return f"You said '{recognized_word}', but the correct word was '{expected_word}'.", "No contrast found"
+
+    substitutions = find_substitutions(expected_word, recognized_word)
+
+    # Prefer the contrasts listed for this item, then any contrast in the corpus
+    item_contrasts = {}
     for contrast in phonemic_contrasts:
-        contrast_phoneme = contrast.get('contrast_phoneme')
-        contrast_description = contrast.get('contrast_description')
+        contrast_phoneme = tokenize_ipa(contrast.get('contrast_phoneme', ''))
+        if len(contrast_phoneme) == 1:
+            item_contrasts[contrast_phoneme[0]] = contrast.get('contrast_description')
 
-        if recognized_phoneme == contrast_phoneme:
+    contrast_index = get_contrast_index()
+    for expected, recognized in substitutions:
+        contrast_description = item_contrasts.get(recognized) or contrast_index.get((expected, recognized))
+        if contrast_description:
             return (
                 f"You said '{recognized_word}', but the correct word was '{expected_word}' "
-                f"({contrast_description}).",
+                f"({contrast_description}: you used {format_ipa((recognized,))} "
+                f"instead of {format_ipa((expected,))}).",
                 contrast_description
             )
 
@@ -0,0 +1,117 @@
+# prefetch.py
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from reference_audio import load_reference_audio
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the process-wide pool shared by every session's prefetcher."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=config.PREFETCH_WORKERS,
+                thread_name_prefix='prefetch',
+            )
+        return _executor
+
+
+class AudioPrefetcher:
+    """
+    Loads reference audio for the current and upcoming items of one session.
+
+    Clips are fetched on the shared pool and kept in memory until they leave
+    the prefetch window or the session switches to another item list
+    (phoneme type, contrast or level), at which point pending work is
+    cancelled and the memory released.
+    """
+
+    def __init__(self, ahead=config.PREFETCH_AHEAD, max_bytes=config.PREFETCH_MAX_BYTES):
+        self.ahead = ahead
+        self.max_bytes = max_bytes
+        self.context = None
+        self._futures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def prefetch(self, context, items, index, text_of):
+        """
+        Schedule the current item and the next `ahead` ones; drop everything else.
+
+        Parameters:
+        - context (tuple): Identifies the item list, e.g. ('practice', type, contrast, level).
+        - items (sequence): Every item in the list.
+        - index (int): The item the learner is on.
+        - text_of (callable): Returns the text to play for an item.
+        """
+        window = list(dict.fromkeys(text_of(item) for item in items[index:index + self.ahead + 1]))
+        with self._lock:
+            if context != self.context:
+                self._cancel_all()
+                self.context = context
+
+            for text in list(self._futures):
+                if text not in window:
+                    self._futures.pop(text).cancel()
+
+            executor = get_executor()
+            for text in window:
+                if text not in self._futures:
+                    self._futures[text] = executor.submit(load_reference_audio, text)
+
+            self._enforce_budget()
+
+    def get(self, text, timeout=None):
+        """
+        Return the prefetched clip for `text`, waiting for an in-flight fetch.
+
+        Returns:
+        - bytes: The clip, or None if it was never scheduled or failed.
+        """
+        with self._lock:
+            future = self._futures.get(text)
+        if future is None or future.cancelled():
+            return None
+        try:
+            audio = future.result(timeout=timeout)
+        except Exception:
+            # Let the caller fall back to a synchronous load and report the error
+            with self._lock:
+                if self._futures.get(text) is future:
+                    del self._futures[text]
+            return None
+
+        # Clips finish after `prefetch` returns, so re-check the budget here
+        with self._lock:
+            self._enforce_budget()
+        return audio
+
+    def cancel(self):
+        with self._lock:
+            self._cancel_all()
+            self.context = None
+
+    def _cancel_all(self):
+        for future in self._futures.values():
+            future.cancel()
+        self._futures.clear()
+
+    def _enforce_budget(self):
+        # Drop the furthest-ahead clips first; the current item stays
+        while len(self._futures) > 1 and self.memory_usage() > self.max_bytes:
+            _, future = self._futures.popitem(last=True)
+            future.cancel()
+
+    def memory_usage(self):
+        """Bytes held by finished clips."""
+        total = 0
+        for future in self._futures.values():
+            if future.done() and not future.cancelled() and future.exception() is None:
+                total += len(future.result())
+        return total
@@ -0,0 +1,155 @@
+# recognition_cache.py
+
+import contextlib
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import config
+import metrics
+from shared_cache import get_shared_cache
+
+
+class RecognitionCache:
+    """
+    Two-tier cache of recognizer output keyed on the audio content.
+
+    The memory tier is an LRU bounded by `max_entries`. With a `shared` tier,
+    entries are also published to the host's shared cache as JSON so other
+    workers and restarts reuse them. Both tiers drop entries older than `ttl`
+    seconds.
+    """
+
+    namespace = 'asr'
+
+    def __init__(self, max_entries, ttl, shared=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared = shared
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(audio_bytes, backend_identity):
+        """
+        Build the cache key for a recording.
+
+        Parameters:
+        - audio_bytes (bytes): The recording as sent to the recognizer.
+        - backend_identity (str): `ASRBackend.identity` of the recognizer.
+
+        Returns:
+        - str: A hex SHA-256 digest.
+        """
+        digest = hashlib.sha256(audio_bytes)
+        digest.update(b'\0' + backend_identity.encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return the cached value for `key`, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if now - stored_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+        value = self._shared_get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.shared_hits += 1
+            self._remember(key, now, value)
+        return value
+
+    def put(self, key, value):
+        """Store a JSON-serializable `value` under `key`."""
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+        if self.shared is not None:
+            self.shared.put(self.namespace, key, json.dumps(value).encode('utf-8'), ttl=self.ttl)
+
+    @contextlib.contextmanager
+    def single_flight(self, key, wait=None):
+        """
+        After a miss, let only one worker on the host recognize the same audio.
+
+        Yields the value if another worker published it while this one waited,
+        else None; the caller then recognizes and `put`s the result.
+        """
+        if self.shared is None:
+            yield None
+            return
+        with self.shared.single_flight(self.namespace, key, wait) as published:
+            value = None if published is None else json.loads(published)
+            if value is not None:
+                with self._lock:
+                    self.shared_hits += 1
+                    self._remember(key, time.time(), value)
+            yield value
+
+    def _remember(self, key, stored_at, value):
+        self._entries[key] = (stored_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _shared_get(self, key):
+        if self.shared is None:
+            return None
+        data = self.shared.get(self.namespace, key)
+        return None if data is None else json.loads(data)
+
+    def stats(self):
+        """Return hit/miss counters for this process."""
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """Return the process-wide cache configured in `config`."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = RecognitionCache(
+                config.RECOGNITION_CACHE_MAX_ENTRIES,
+                config.RECOGNITION_CACHE_TTL,
+                get_shared_cache() if config.RECOGNITION_CACHE_SHARED else None,
+            )
+            metrics.get_metrics().register_collector(_collect_metrics)
+        return _default_cache
+
+
+def _collect_metrics():
+    stats = _default_cache.stats()
+    return [
+        ('minimal_pairs_recognition_cache_lookups_total', 'counter', "Recognition cache lookups by result.",
+         [({'result': 'memory_hit'}, stats['hits']), ({'result': 'shared_hit'}, stats['shared_hits']),
+          ({'result': 'miss'}, stats['misses'])]),
+        ('minimal_pairs_recognition_cache_hit_ratio', 'gauge', "Share of recognition cache lookups that hit.",
+         [({}, stats['hit_rate'])]),
+        ('minimal_pairs_recognition_cache_entries', 'gauge', "Results held in memory.",
+         [({}, stats['entries'])]),
+    ]
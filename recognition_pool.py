@@ -0,0 +1,90 @@
+# recognition_pool.py
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+import metrics
+from grading import Grade, recognize_speech_from_audio
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the process-wide pool that caps concurrent recognition calls."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=config.ASR_MAX_CONCURRENCY,
+                thread_name_prefix='asr',
+            )
+        return _executor
+
+
+class RecognitionJob:
+    """
+    A recognition request running on the shared pool.
+
+    The job is identified by the digest of the recorded audio so the page can
+    tell a new take from the same bytes handed back on a rerun.
+    """
+
+    def __init__(self, audio_digest, expected_word, timeout):
+        self.audio_digest = audio_digest
+        self.expected_word = expected_word
+        self.submitted = time.monotonic()
+        self.deadline = self.submitted + timeout
+        self.cancelled = False
+        # Set once the page has acted on the outcome
+        self.consumed = False
+        self.future = None
+
+    def _run(self, audio_bytes):
+        # Time spent queued behind other sessions counts against the deadline
+        started = time.monotonic()
+        metrics.get_metrics().record_span('asr_queue', started - self.submitted)
+        remaining = self.deadline - started
+        if self.cancelled:
+            return Grade("", False, None, None)
+        if remaining <= 0:
+            return Grade("", False, "Speech recognition is busy. Please try again.", None)
+        return recognize_speech_from_audio(audio_bytes, self.expected_word, timeout=remaining)
+
+    def done(self):
+        return self.future.done() or self.expired()
+
+    def expired(self):
+        return time.monotonic() > self.deadline
+
+    def cancel(self):
+        """Drop the job; a call already in flight finishes but is ignored."""
+        self.cancelled = True
+        self.future.cancel()
+
+    def result(self):
+        """
+        Return the `Grade` (recognized text, correct flag, error message or None, confidence).
+
+        Must only be called once `done()` is true.
+        """
+        if self.future.done() and not self.future.cancelled():
+            try:
+                return self.future.result()
+            except Exception as e:
+                return Grade("", False, f"Speech recognition failed; {e}", None)
+        return Grade("", False, "Speech recognition took too long to respond. Please try again.", None)
+
+
+def submit_recognition(audio_bytes, expected_word, audio_digest, timeout=config.ASR_TIMEOUT):
+    """
+    Queue a recording for grading without blocking the script thread.
+
+    Returns:
+    - RecognitionJob: Poll `done()` and read `result()` on later reruns.
+    """
+    job = RecognitionJob(audio_digest, expected_word, timeout)
+    job.future = get_executor().submit(job._run, audio_bytes)
+    return job
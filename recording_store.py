@@ -0,0 +1,250 @@
+# recording_store.py
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+import zlib
+from collections import OrderedDict
+
+import config
+import metrics
+from audio_preprocess import AudioRejected, decode_wav, downmix, encode_wav, resample
+
+# Process-wide accounting, oldest take first: id(handle) -> [weakref, size, in memory]
+_takes = OrderedDict()
+_totals = {'resident_bytes': 0, 'spilled_bytes': 0}
+_sessions = weakref.WeakSet()
+_lock = threading.RLock()
+
+
+def _account(handle_id, resident):
+    # Called with _lock held; moves a take's bytes between the two totals
+    entry = _takes.get(handle_id)
+    if entry is None or entry[2] == resident:
+        return
+    entry[2] = resident
+    direction = 1 if resident else -1
+    _totals['resident_bytes'] += direction * entry[1]
+    _totals['spilled_bytes'] -= direction * entry[1]
+
+
+def _forget(handle_id):
+    with _lock:
+        entry = _takes.pop(handle_id, None)
+        if entry is not None:
+            _totals['resident_bytes' if entry[2] else 'spilled_bytes'] -= entry[1]
+
+
+def compress_take(audio_bytes):
+    """
+    Shrink a browser recording for storage.
+
+    The take is re-encoded as 16-bit mono at `config.RECORDING_SAMPLE_RATE`
+    (plenty for speech playback) and then deflated. Undecodable input is
+    stored deflated as-is.
+    """
+    try:
+        samples, sample_rate = decode_wav(audio_bytes)
+        mono = resample(downmix(samples), sample_rate, config.RECORDING_SAMPLE_RATE)
+        audio_bytes = encode_wav(mono, config.RECORDING_SAMPLE_RATE)
+    except AudioRejected:
+        pass
+    return zlib.compress(audio_bytes, 6)
+
+
+class RecordingHandle:
+    """
+    A learner's take, held compressed in memory or spilled to the session spool.
+
+    Pages keep the handle in session state and call `read()` only when the
+    take is played back.
+    """
+
+    def __init__(self, digest, blob, spool_dir):
+        self.digest = digest
+        self.size = len(blob)
+        self._blob = blob
+        self._spilling = False
+        self._path = os.path.join(spool_dir, f"{digest}.wav.z")
+
+    @property
+    def spilled(self):
+        return self._blob is None
+
+    def read(self):
+        """Return the take as WAV bytes."""
+        with _lock:
+            blob = self._blob
+        if blob is None:
+            with open(self._path, 'rb') as file:
+                blob = file.read()
+        return zlib.decompress(blob)
+
+    def spill(self):
+        """
+        Move the take from memory to the spool; returns the bytes released.
+
+        The file is written without holding the process-wide lock, so one
+        session's disk write never stalls another session's `add()`. Reads
+        keep using the in-memory copy until the file is complete.
+        """
+        with _lock:
+            blob = self._blob
+            if blob is None or self._spilling:
+                return 0
+            self._spilling = True
+        try:
+            with open(self._path, 'wb') as file:
+                file.write(blob)
+        except BaseException:
+            with _lock:
+                self._spilling = False
+            raise
+        with _lock:
+            self._spilling = False
+            if id(self) not in _takes:
+                # Discarded while the file was being written
+                _remove_file(self._path)
+                return 0
+            self._blob = None
+            _account(id(self), resident=False)
+            return self.size
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _remove_spool(spool_dir):
+    shutil.rmtree(spool_dir, ignore_errors=True)
+
+
+class RecordingStore:
+    """
+    Per-session store of learner takes with bounded memory.
+
+    Takes beyond `session_max_bytes` in this session, or beyond
+    `process_max_bytes` across all sessions, are spilled oldest-first to a
+    private temp directory. The directory is removed when the store is closed
+    or garbage-collected along with its session.
+    """
+
+    def __init__(self, session_max_bytes=config.RECORDING_SESSION_MAX_BYTES,
+                 process_max_bytes=config.RECORDING_PROCESS_MAX_BYTES,
+                 spool_parent=config.RECORDING_SPOOL_DIR):
+        self.session_max_bytes = session_max_bytes
+        self.process_max_bytes = process_max_bytes
+        self.spool_dir = tempfile.mkdtemp(prefix='minimal-pairs-takes-', dir=spool_parent)
+        self._handles = OrderedDict()
+        self._finalizer = weakref.finalize(self, _remove_spool, self.spool_dir)
+        with _lock:
+            _sessions.add(self)
+
+    def add(self, audio_bytes):
+        """
+        Store a take and return its handle.
+
+        The recorder returns the same bytes on every rerun until the learner
+        records again, so an identical take returns the existing handle.
+        """
+        digest = hashlib.sha256(audio_bytes).hexdigest()
+        with _lock:
+            handle = self._handles.get(digest)
+            if handle is not None:
+                return handle
+
+        handle = RecordingHandle(digest, compress_take(audio_bytes), self.spool_dir)
+        with _lock:
+            self._handles[digest] = handle
+            _takes[id(handle)] = [weakref.ref(handle), handle.size, True]
+            _totals['resident_bytes'] += handle.size
+            weakref.finalize(handle, _forget, id(handle))
+            victims = self._select_spills(keep=handle)
+        # Disk writes happen after the lock is released
+        for victim in victims:
+            victim.spill()
+        return handle
+
+    def discard(self, handle):
+        """Forget a take that will not be played again."""
+        with _lock:
+            if self._handles.pop(handle.digest, None) is None:
+                return
+            _forget(id(handle))
+            if handle.spilled:
+                _remove_file(handle._path)
+
+    @property
+    def resident_bytes(self):
+        return sum(handle.size for handle in self._handles.values() if not handle.spilled)
+
+    def _select_spills(self, keep):
+        # Called with _lock held; returns the takes to spill, oldest first.
+        # The newest take always stays in memory.
+        victims = []
+        session_bytes = self.resident_bytes
+        for handle in list(self._handles.values()):
+            if session_bytes <= self.session_max_bytes:
+                break
+            if handle is not keep and not handle.spilled and not handle._spilling:
+                victims.append(handle)
+                session_bytes -= handle.size
+
+        chosen = {id(handle) for handle in victims}
+        process_bytes = _totals['resident_bytes'] - sum(handle.size for handle in victims)
+        for ref, _, resident in list(_takes.values()):
+            if process_bytes <= self.process_max_bytes:
+                break
+            handle = ref()
+            if (resident and handle is not None and handle is not keep and not handle._spilling
+                    and id(handle) not in chosen):
+                victims.append(handle)
+                chosen.add(id(handle))
+                process_bytes -= handle.size
+        return victims
+
+    def close(self):
+        """Drop all takes and delete the spool directory."""
+        with _lock:
+            for handle in list(self._handles.values()):
+                self.discard(handle)
+            _sessions.discard(self)
+        self._finalizer()
+
+
+def memory_usage():
+    """
+    Gauge of learner recordings held by this process.
+
+    Returns:
+    - dict: resident_bytes and spilled_bytes across all sessions, the number
+      of takes in memory and the number of live session stores.
+    """
+    with _lock:
+        return {
+            'resident_bytes': _totals['resident_bytes'],
+            'spilled_bytes': _totals['spilled_bytes'],
+            'resident_takes': sum(1 for _, _, resident in _takes.values() if resident),
+            'sessions': len(_sessions),
+        }
+
+
+def _collect_metrics():
+    usage = memory_usage()
+    return [
+        ('minimal_pairs_recording_bytes', 'gauge', "Compressed learner takes held by this process, by location.",
+         [({'location': 'memory'}, usage['resident_bytes']), ({'location': 'disk'}, usage['spilled_bytes'])]),
+        ('minimal_pairs_recording_takes_in_memory', 'gauge', "Learner takes held in memory.",
+         [({}, usage['resident_takes'])]),
+        ('minimal_pairs_recording_sessions', 'gauge', "Sessions with a recording store.",
+         [({}, usage['sessions'])]),
+    ]
+
+
+metrics.get_metrics().register_collector(_collect_metrics)
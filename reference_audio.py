@@ -0,0 +1,101 @@
+# reference_audio.py
+
+import io
+import json
+import os
+import threading
+import urllib.parse
+import urllib.request
+
+
+import config
+import metrics
+from audio_pack import get_default_pack
+from tts_cache import TTSCache, get_default_cache
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+
+def load_manifest():
+    """Return the text -> asset map written by audio_generator.py (loaded once per process)."""
+    global _manifest
+    with _manifest_lock:
+        if _manifest is None:
+            try:
+                with open(config.AUDIO_MANIFEST_PATH, 'r', encoding='utf-8') as file:
+                    manifest = json.load(file)
+            except (FileNotFoundError, json.JSONDecodeError):
+                manifest = {}
+            # Assets rendered with another voice would not match the cache keys
+            if manifest.get('lang') != config.TTS_LANG or manifest.get('voice') != config.TTS_VOICE:
+                manifest = {}
+            _manifest = manifest.get('assets', {})
+        return _manifest
+
+
+def reference_key(text):
+    """The content-addressed key of the clip for `text` (shared by pack, assets and cache)."""
+    return TTSCache.make_key(text, config.TTS_LANG, config.TTS_VOICE)
+
+
+def synthesize(text):
+    """Synthesize `text` as MP3 bytes, reusing the shared TTS cache when possible."""
+    cache = get_default_cache()
+    key = reference_key(text)
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    # Workers missing the same clip at once make one synthesis call between them
+    with cache.single_flight(key) as data:
+        if data is None:
+            data = _synthesize_uncached(text)
+            cache.put(key, data)
+    return data
+
+
+def _synthesize_uncached(text):
+    if config.TTS_ENDPOINT:
+        query = urllib.parse.urlencode({'q': text, 'tl': config.TTS_LANG})
+        with metrics.span('tts', engine='http'):
+            with urllib.request.urlopen(f"{config.TTS_ENDPOINT}?{query}", timeout=config.TTS_TIMEOUT) as response:
+                return response.read()
+
+    # Imported on first live synthesis; most clips come from the pack or cache
+    from gtts import gTTS
+
+    audio_bytes = io.BytesIO()
+    with metrics.span('tts', engine='gtts'):
+        gTTS(text=text, lang=config.TTS_LANG).write_to_fp(audio_bytes)
+    return audio_bytes.getvalue()
+
+
+def load_reference_audio(text):
+    """
+    Return the reference MP3 for `text`.
+
+    The memory-mapped pack is preferred (returned as a zero-copy memoryview),
+    then individual pre-rendered assets, then the TTS cache, then live
+    synthesis. Safe to call from worker threads.
+
+    Returns:
+    - bytes or memoryview: The MP3 data.
+
+    Raises:
+    - Exception: Whatever the synthesizer raises when it cannot be reached.
+    """
+    pack = get_default_pack()
+    if pack is not None:
+        clip = pack.get(reference_key(text))
+        if clip is not None:
+            return clip
+
+    asset = load_manifest().get(text)
+    if asset:
+        try:
+            with open(os.path.join(config.AUDIO_ASSET_DIR, asset), 'rb') as file:
+                return file.read()
+        except FileNotFoundError:
+            pass
+    return synthesize(text)
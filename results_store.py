@@ -0,0 +1,347 @@
+# results_store.py
+
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+import config
+from corpus import practice_item_id
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    session_id TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    attempt INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    label TEXT NOT NULL,
+    pronunciation TEXT NOT NULL,
+    correct INTEGER NOT NULL,
+    recorded_at REAL NOT NULL,
+    phoneme_type TEXT NOT NULL DEFAULT '',
+    contrast TEXT NOT NULL DEFAULT '',
+    level TEXT NOT NULL DEFAULT '',
+    contrasts TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (session_id, mode, attempt, item_id)
+);
+CREATE TABLE IF NOT EXISTS rollups (
+    dimension TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    value TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    correct INTEGER NOT NULL,
+    PRIMARY KEY (dimension, mode, value)
+) WITHOUT ROWID;
+"""
+
+# Columns added after the first release; older databases gain them on open
+MIGRATIONS = (
+    ('phoneme_type', "ALTER TABLE results ADD COLUMN phoneme_type TEXT NOT NULL DEFAULT ''"),
+    ('contrast', "ALTER TABLE results ADD COLUMN contrast TEXT NOT NULL DEFAULT ''"),
+    ('level', "ALTER TABLE results ADD COLUMN level TEXT NOT NULL DEFAULT ''"),
+    ('contrasts', "ALTER TABLE results ADD COLUMN contrasts TEXT NOT NULL DEFAULT ''"),
+)
+
+UPSERT = """
+INSERT INTO results (session_id, mode, item_id, attempt, position, label, pronunciation, correct, recorded_at,
+                     phoneme_type, contrast, level, contrasts)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (session_id, mode, attempt, item_id) DO UPDATE SET
+    pronunciation = excluded.pronunciation,
+    correct = excluded.correct,
+    recorded_at = excluded.recorded_at,
+    phoneme_type = excluded.phoneme_type,
+    contrast = excluded.contrast,
+    level = excluded.level,
+    contrasts = excluded.contrasts
+"""
+
+SELECT_PREVIOUS = """
+SELECT correct, phoneme_type, contrast, level, contrasts FROM results
+WHERE session_id = ? AND mode = ? AND attempt = ? AND item_id = ?
+"""
+
+ROLLUP_UPSERT = """
+INSERT INTO rollups (dimension, mode, value, attempts, correct) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (dimension, mode, value) DO UPDATE SET
+    attempts = attempts + excluded.attempts,
+    correct = correct + excluded.correct
+"""
+
+# Aggregates kept per stored answer; the learner is the session
+DIMENSIONS = ('contrast', 'phoneme_type', 'level', 'learner')
+# Joins the contrasts an item drills in the `contrasts` column
+CONTRAST_SEPARATOR = '|'
+
+
+def connect(db_path):
+    connection = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+    # WAL lets every session read while the single writer commits
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    return connection
+
+
+def rollup_values(session_id, correct, phoneme_type, contrast, level, contrasts):
+    """
+    Return the (dimension, value, correct) triples an answer counts towards.
+
+    An answer counts once towards every contrast its item drills (`contrasts`).
+    A miss attributed to one of them (`contrast`) is a miss for that contrast
+    only; an unattributed miss is a miss for all of them. Rows without
+    `contrasts` count towards `contrast` alone. Empty values are skipped:
+    testing answers have no level.
+    """
+    correct = int(bool(correct))
+    triples = [(dimension, value, correct)
+               for dimension, value in (('phoneme_type', phoneme_type), ('level', level), ('learner', session_id))
+               if value]
+    drilled = contrasts.split(CONTRAST_SEPARATOR) if contrasts else [contrast] if contrast else []
+    for value in drilled:
+        missed = not correct and (not contrast or value == contrast)
+        triples.append(('contrast', value, 0 if missed else 1))
+    return triples
+
+
+def apply_rows(connection, rows):
+    """
+    Upsert result rows and fold their effect into the rollups.
+
+    A row that replaces an earlier answer first takes back that answer's
+    contribution, so rollups always equal a full re-aggregation of `results`
+    without ever scanning it.
+
+    Parameters:
+    - connection (sqlite3.Connection): Connection inside an open transaction.
+    - rows (list): Tuples in `UPSERT` column order.
+    """
+    deltas = {}
+
+    def add(mode, triples, sign):
+        for dimension, value, correct in triples:
+            delta = deltas.setdefault((dimension, mode, value), [0, 0])
+            delta[0] += sign
+            delta[1] += sign * correct
+
+    for row in rows:
+        session_id, mode, item_id, attempt = row[:4]
+        previous = connection.execute(SELECT_PREVIOUS, (session_id, mode, attempt, item_id)).fetchone()
+        if previous is not None:
+            add(mode, rollup_values(session_id, *previous), -1)
+        add(mode, rollup_values(session_id, row[7], *row[9:]), 1)
+        connection.execute(UPSERT, row)
+
+    connection.executemany(ROLLUP_UPSERT, [
+        (dimension, mode, value, attempts, correct)
+        for (dimension, mode, value), (attempts, correct) in deltas.items()
+        if attempts or correct
+    ])
+    connection.execute("DELETE FROM rollups WHERE attempts <= 0")
+
+
+def rebuild_rollups(connection):
+    """Recompute every rollup from `results` in one transaction."""
+    with connection:
+        connection.execute("DELETE FROM rollups")
+        for dimension, column in (('phoneme_type', 'phoneme_type'), ('level', 'level'), ('learner', 'session_id')):
+            connection.execute(
+                f"INSERT INTO rollups (dimension, mode, value, attempts, correct) "
+                f"SELECT ?, mode, {column}, COUNT(*), SUM(correct) FROM results "
+                f"WHERE {column} != '' GROUP BY mode, {column}",
+                (dimension,),
+            )
+        # One answer counts towards several contrasts, so those are folded in Python
+        totals = {}
+        rows = connection.execute(
+            "SELECT mode, correct, contrast, contrasts, COUNT(*) FROM results "
+            "WHERE contrast != '' OR contrasts != '' GROUP BY mode, correct, contrast, contrasts"
+        )
+        for mode, correct, contrast, contrasts, attempts in rows:
+            for _, value, value_correct in rollup_values('', correct, '', contrast, '', contrasts):
+                total = totals.setdefault((mode, value), [0, 0])
+                total[0] += attempts
+                total[1] += attempts * value_correct
+        connection.executemany(
+            "INSERT INTO rollups (dimension, mode, value, attempts, correct) VALUES ('contrast', ?, ?, ?, ?)",
+            [(mode, value, attempts, correct) for (mode, value), (attempts, correct) in totals.items()],
+        )
+
+
+def normalize_practice_rows(connection):
+    """
+    Rewrite practice rows stored with the radio label ("Level 1") as the level.
+
+    Their ids embedded that label and an unescaped contrast, so they matched
+    no corpus target. Returns True if any row changed.
+    """
+    rows = connection.execute(
+        "SELECT rowid, item_id, level FROM results WHERE mode = 'practice' AND level LIKE 'Level %'"
+    ).fetchall()
+    with connection:
+        for rowid, item_id, level in rows:
+            level_key = f"level_{level.split()[-1]}"
+            # The contrast may itself contain '/'; the type and index are the outer parts
+            phoneme_type, rest = item_id.split('/', 1)
+            rest, index = rest.rsplit('/', 1)
+            contrast = rest[:-len(level) - 1] if rest.endswith(f"/{level}") else rest
+            connection.execute("UPDATE OR REPLACE results SET item_id = ?, level = ? WHERE rowid = ?",
+                               (practice_item_id(phoneme_type, contrast, level_key, index), level_key, rowid))
+    return bool(rows)
+
+
+def migrate(connection):
+    """Create or upgrade the schema, rebuilding rollups for older databases."""
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(results)")}
+    connection.executescript(SCHEMA)
+    if columns:
+        for column, statement in MIGRATIONS:
+            if column not in columns:
+                connection.execute(statement)
+        connection.commit()
+    # Data fixes run once per database, tracked in SQLite's user_version
+    normalized = False
+    if connection.execute("PRAGMA user_version").fetchone()[0] < 1:
+        normalized = normalize_practice_rows(connection)
+        connection.execute("PRAGMA user_version = 1")
+    has_results = connection.execute("SELECT 1 FROM results LIMIT 1").fetchone()
+    has_rollups = connection.execute("SELECT 1 FROM rollups LIMIT 1").fetchone()
+    if has_results and (normalized or not has_rollups):
+        rebuild_rollups(connection)
+
+
+class ResultsStore:
+    """
+    Persistent, idempotent log of graded answers.
+
+    Rows are keyed on (session, mode, attempt, item), so re-recording the same
+    row on every rerun is an upsert rather than a duplicate. Writes are queued
+    and committed in batches by one writer thread, which updates the
+    per-dimension rollups in the same transaction; reads use a connection per
+    calling thread.
+    """
+
+    def __init__(self, db_path, batch_size=config.RESULTS_BATCH_SIZE):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._queue = queue.Queue()
+        self._local = threading.local()
+        self._writer_connection = connect(db_path)
+        migrate(self._writer_connection)
+        self._writer = threading.Thread(target=self._write_loop, name='results-writer', daemon=True)
+        self._writer.start()
+
+    def record(self, session_id, mode, item_id, attempt, position, label, pronunciation, correct,
+               phoneme_type='', contrast='', level='', contrasts=()):
+        """
+        Queue an answer for writing; returns immediately.
+
+        Parameters:
+        - session_id (str): The learner's session.
+        - mode (str): 'testing' or 'practice'.
+        - item_id (str): Stable identifier of the item within the mode.
+        - attempt (int): Run of the session; restarting starts a new attempt.
+        - position (int): Order of the item in the run, for display.
+        - label (str): The word or sentence shown in summaries.
+        - pronunciation (str): What the learner said.
+        - correct (bool): The grading outcome.
+        - phoneme_type (str): 'vowels', 'diphthongs' or 'consonants'.
+        - contrast (str): Contrast description, e.g. '/æ/ vs /e/'; for a testing
+          miss, the one it was attributed to, if any.
+        - level (str): Practice level key; empty for testing.
+        - contrasts (list): Every contrast the item drills; defaults to `contrast`.
+        """
+        self._queue.put((session_id, mode, item_id, attempt, position, label,
+                         pronunciation, int(bool(correct)), time.time(),
+                         phoneme_type or '', contrast or '', level or '', CONTRAST_SEPARATOR.join(contrasts)))
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with self._writer_connection:
+                    apply_rows(self._writer_connection, batch)
+            except Exception:
+                # Drop the batch but keep the writer alive; a dead writer would stall every flush
+                logger.exception("Failed to write %d results", len(batch))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def flush(self, timeout=config.RESULTS_FLUSH_TIMEOUT):
+        """
+        Block until every queued answer has been committed.
+
+        Gives up after `timeout` seconds, or at once if the writer thread has
+        died, so a stuck writer cannot hang a page.
+
+        Returns:
+        - bool: True if the queue drained.
+        """
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                if not self._writer.is_alive():
+                    logger.error("Results writer has stopped; %d answers were not saved",
+                                 self._queue.unfinished_tasks)
+                    return False
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning("Timed out waiting for %d results to be written", self._queue.unfinished_tasks)
+                    return False
+                self._queue.all_tasks_done.wait(min(remaining, 0.5))
+        return True
+
+    def rebuild_rollups(self):
+        """Recompute rollups from the full log, e.g. after editing `results` by hand."""
+        self.flush()
+        rebuild_rollups(self._reader())
+
+    def _reader(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = connect(self.db_path)
+        return connection
+
+    def session_results(self, session_id, mode, attempt):
+        """Return (label, pronunciation, correct) rows of one run, in item order."""
+        self.flush()
+        rows = self._reader().execute(
+            "SELECT label, pronunciation, correct FROM results "
+            "WHERE session_id = ? AND mode = ? AND attempt = ? ORDER BY position",
+            (session_id, mode, attempt),
+        ).fetchall()
+        return [(label, pronunciation, bool(correct)) for label, pronunciation, correct in rows]
+
+    def session_counts(self, session_id, mode, attempt):
+        """Return (correct count, total count) for one run."""
+        self.flush()
+        correct, total = self._reader().execute(
+            "SELECT COALESCE(SUM(correct), 0), COUNT(*) FROM results "
+            "WHERE session_id = ? AND mode = ? AND attempt = ?",
+            (session_id, mode, attempt),
+        ).fetchone()
+        return correct, total
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_results_store():
+    """Return the process-wide store at `config.RESULTS_DB_PATH`."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ResultsStore(config.RESULTS_DB_PATH)
+        return _store
@@ -0,0 +1,345 @@
+# shared_cache.py
+#
+# A host-wide cache tier in one SQLite file, shared by every worker process
+# behind the load balancer (and by their threads). Callers keep their own
+# namespaces ('tts', 'asr') and key schemes; this module provides:
+#
+# - atomic publish: a value is visible to other workers only once the
+#   transaction that inserts it commits, never half-written;
+# - single flight: the first worker to miss a key takes a lease on it, and the
+#   others wait for its value instead of calling TTS/ASR again;
+# - one size budget across all namespaces, enforced with least recently used
+#   eviction inside the same transaction that pushed it over.
+
+import contextlib
+import os
+import sqlite3
+import threading
+import time
+
+import config
+import metrics
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+CREATE TABLE IF NOT EXISTS leases (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS usage (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    bytes INTEGER NOT NULL,
+    entries INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO usage (id, bytes, entries) VALUES (0, 0, 0);
+CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+    UPDATE usage SET bytes = bytes + new.size, entries = entries + 1 WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF size ON entries BEGIN
+    UPDATE usage SET bytes = bytes + new.size - old.size WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+    UPDATE usage SET bytes = bytes - old.size, entries = entries - 1 WHERE id = 0;
+END;
+"""
+
+# Upserts (not REPLACE) so the update trigger keeps `usage` exact
+UPSERT = """
+INSERT INTO entries (namespace, key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (namespace, key) DO UPDATE SET
+    value = excluded.value,
+    size = excluded.size,
+    expires = excluded.expires,
+    accessed = excluded.accessed
+"""
+
+# Reads refresh an entry's recency at most this often, so hits rarely write
+ACCESS_RESOLUTION = 60.0
+# Milliseconds a statement waits for another writer's lock (sqlite3's `timeout`)
+BUSY_TIMEOUT_MS = 30000
+# Eviction frees down to this share of the budget, not just under it
+EVICT_TO = 0.9
+
+
+class SharedCache:
+    """
+    Key/value store shared by every process on the host.
+
+    Parameters:
+    - path (str): The SQLite file; every worker must use the same one.
+    - max_bytes (int): Budget for all values in all namespaces together.
+    - lease_seconds (float): How long a worker may compute a missing value
+      before others stop waiting for it and take over.
+    - poll_interval (float): Seconds between checks while another worker computes.
+    """
+
+    def __init__(self, path, max_bytes, lease_seconds=30.0, poll_interval=0.05):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.hits = 0
+        self.misses = 0
+        self.computed = 0
+        self.waited = 0
+        self.evicted = 0
+        self._stats_lock = threading.Lock()
+        self._local = threading.local()
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self):
+        # One connection per thread; WAL lets them read while another worker writes
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    # ==========================
+    # Reads and Writes
+    # ==========================
+
+    def get(self, namespace, key):
+        """Return the bytes stored under `key`, or None if absent or expired."""
+        value = self._lookup(namespace, key)
+        self._count('hits' if value is not None else 'misses')
+        return value
+
+    def _lookup(self, namespace, key):
+        connection = self._connection()
+        row = connection.execute(
+            'SELECT value, expires, accessed FROM entries WHERE namespace = ? AND key = ?', (namespace, key)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires, accessed = row
+        now = time.time()
+        if expires is not None and expires < now:
+            return None
+        if accessed < now - ACCESS_RESOLUTION:
+            # Recency is advisory; a hit neither fails nor waits while a writer holds the lock
+            connection.execute('PRAGMA busy_timeout = 0')
+            try:
+                connection.execute('UPDATE entries SET accessed = ? WHERE namespace = ? AND key = ?',
+                                   (now, namespace, key))
+            except sqlite3.OperationalError:
+                pass
+            finally:
+                connection.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+        return value
+
+    def put(self, namespace, key, value, ttl=None):
+        """
+        Publish `value` for every worker and release any lease on `key`.
+
+        Values larger than the whole budget are not stored.
+        """
+        value = bytes(value)
+        if len(value) > self.max_bytes:
+            self._release(namespace, key)
+            return
+        now = time.time()
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute(UPSERT, (namespace, key, value, len(value),
+                                        None if ttl is None else now + ttl, now))
+            connection.execute('DELETE FROM leases WHERE namespace = ? AND key = ?', (namespace, key))
+            (used,) = connection.execute('SELECT bytes FROM usage WHERE id = 0').fetchone()
+            if used > self.max_bytes:
+                self._evict(connection, now)
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def clear(self, namespace=None):
+        """Remove every entry, or only those in `namespace`, for all workers."""
+        if namespace is None:
+            self._connection().execute('DELETE FROM entries')
+        else:
+            self._connection().execute('DELETE FROM entries WHERE namespace = ?', (namespace,))
+
+    def _evict(self, connection, now):
+        # Expired entries go first, then the least recently used across all namespaces
+        before = connection.execute('SELECT entries FROM usage WHERE id = 0').fetchone()[0]
+        connection.execute('DELETE FROM entries WHERE expires IS NOT NULL AND expires < ?', (now,))
+        (used,) = connection.execute('SELECT bytes FROM usage WHERE id = 0').fetchone()
+        target = self.max_bytes * EVICT_TO
+        while used > target:
+            victims = connection.execute(
+                'SELECT rowid, size FROM entries ORDER BY accessed LIMIT 64'
+            ).fetchall()
+            if not victims:
+                break
+            chosen = []
+            for rowid, size in victims:
+                chosen.append(rowid)
+                used -= size
+                if used <= target:
+                    break
+            connection.execute(f"DELETE FROM entries WHERE rowid IN ({','.join('?' * len(chosen))})", chosen)
+        after = connection.execute('SELECT entries FROM usage WHERE id = 0').fetchone()[0]
+        self._count('evicted', before - after)
+
+    # ==========================
+    # Single Flight
+    # ==========================
+
+    def _owner(self):
+        return f"{os.getpid()}:{threading.get_ident()}"
+
+    def _acquire(self, namespace, key, now):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT expires FROM leases WHERE namespace = ? AND key = ?', (namespace, key)
+            ).fetchone()
+            if row is not None and row[0] > now:
+                connection.execute('ROLLBACK')
+                return False
+            # A lease past its expiry belonged to a worker that died or stalled
+            connection.execute('INSERT OR REPLACE INTO leases (namespace, key, owner, expires) VALUES (?, ?, ?, ?)',
+                               (namespace, key, self._owner(), now + self.lease_seconds))
+            connection.execute('COMMIT')
+            return True
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def _release(self, namespace, key):
+        try:
+            self._connection().execute('DELETE FROM leases WHERE namespace = ? AND key = ? AND owner = ?',
+                                       (namespace, key, self._owner()))
+        except sqlite3.OperationalError:
+            # The lease expires on its own
+            pass
+
+    @contextlib.contextmanager
+    def single_flight(self, namespace, key, wait=None):
+        """
+        Let one caller on the host compute a missing `key` while the rest wait.
+
+        Use after a miss. The block receives the value if another thread or
+        worker published it meanwhile; otherwise it receives None and should
+        compute the value and `put` it. Failing inside the block releases the
+        lease, and the next waiter computes instead.
+
+        Parameters:
+        - namespace (str): The caller's namespace.
+        - key (str): The key that missed.
+        - wait (float): Most seconds to wait for another computation before
+          computing anyway; defaults to the lease length.
+
+        Returns:
+        - context manager: Yields the published bytes or None.
+        """
+        deadline = time.monotonic() + (self.lease_seconds if wait is None else wait)
+        flight_key = (namespace, key)
+        # Threads of this process queue on a lock rather than polling the database
+        with self._flights_lock:
+            flight = self._flights.setdefault(flight_key, [threading.Lock(), 0])
+            flight[1] += 1
+        thread_lock = flight[0]
+        locked = thread_lock.acquire(timeout=max(0.0, deadline - time.monotonic()))
+        leased = False
+        try:
+            value = self._lookup(namespace, key)
+            while value is None:
+                leased = self._acquire(namespace, key, time.time())
+                if leased:
+                    # Published between our miss and the lease?
+                    value = self._lookup(namespace, key)
+                    break
+                if time.monotonic() >= deadline:
+                    break
+                time.sleep(self.poll_interval)
+                value = self._lookup(namespace, key)
+            self._count('waited' if value is not None else 'computed')
+            yield value
+        finally:
+            if leased:
+                self._release(namespace, key)
+            if locked:
+                thread_lock.release()
+            with self._flights_lock:
+                flight[1] -= 1
+                if not flight[1]:
+                    del self._flights[flight_key]
+
+    # ==========================
+    # Statistics
+    # ==========================
+
+    def usage(self):
+        """Return (bytes, entries) stored by all workers together."""
+        return self._connection().execute('SELECT bytes, entries FROM usage WHERE id = 0').fetchone()
+
+    def stats(self):
+        """Return this process's counters and the host-wide usage."""
+        used, entries = self.usage()
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'computed': self.computed,
+                'waited': self.waited,
+                'evicted': self.evicted,
+                'bytes': used,
+                'entries': entries,
+                'max_bytes': self.max_bytes,
+            }
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_cache():
+    """Return the process-wide handle on the host's shared cache configured in `config`."""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = SharedCache(config.SHARED_CACHE_PATH, config.SHARED_CACHE_MAX_BYTES,
+                                        config.SHARED_CACHE_LEASE_SECONDS)
+            metrics.get_metrics().register_collector(_collect_metrics)
+        return _shared_cache
+
+
+def _collect_metrics():
+    stats = _shared_cache.stats()
+    return [
+        ('minimal_pairs_shared_cache_bytes', 'gauge', "Bytes stored in the host's shared cache.",
+         [({}, stats['bytes'])]),
+        ('minimal_pairs_shared_cache_entries', 'gauge', "Entries in the host's shared cache.",
+         [({}, stats['entries'])]),
+        ('minimal_pairs_shared_cache_flights_total', 'counter',
+         "Misses this process computed, or waited out while another worker computed.",
+         [({'outcome': 'computed'}, stats['computed']), ({'outcome': 'waited'}, stats['waited'])]),
+        ('minimal_pairs_shared_cache_evictions_total', 'counter', "Entries this process evicted for the budget.",
+         [({}, stats['evicted'])]),
+    ]
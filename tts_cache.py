@@ -0,0 +1,103 @@
+# tts_cache.py
+
+import hashlib
+import threading
+
+import metrics
+from shared_cache import get_shared_cache
+
+
+class TTSCache:
+    """
+    Content-addressed cache for synthesized speech.
+
+    Clips live in the host's shared cache under the 'tts' namespace, so every
+    session and every worker process reuses them, and together with the other
+    namespaces they stay within one size budget. Hit counters are per process.
+    """
+
+    namespace = 'tts'
+
+    def __init__(self, shared):
+        self.shared = shared
+        self.hits = 0
+        self.misses = 0
+        self.bytes_served = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(text, lang, voice):
+        """
+        Build the cache key for a synthesis request.
+
+        Parameters:
+        - text (str): The text to synthesize.
+        - lang (str): The TTS language code.
+        - voice (str): The voice or backend identifier.
+
+        Returns:
+        - str: A hex SHA-256 digest.
+        """
+        payload = '\0'.join((voice, lang, text)).encode('utf-8')
+        return hashlib.sha256(payload).hexdigest()
+
+    def get(self, key):
+        """Return the cached MP3 bytes for `key`, or None on a miss."""
+        data = self.shared.get(self.namespace, key)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.bytes_served += len(data)
+        return data
+
+    def put(self, key, data):
+        """Store `data` under `key` for every worker on the host."""
+        self.shared.put(self.namespace, key, data)
+
+    def single_flight(self, key, wait=None):
+        """
+        After a miss, let only one worker synthesize `key` (see `SharedCache.single_flight`).
+
+        Returns:
+        - context manager: Yields the clip if another worker published it meanwhile, else None.
+        """
+        return self.shared.single_flight(self.namespace, key, wait)
+
+    def stats(self):
+        """Return hit/miss counters for this process."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'bytes_served': self.bytes_served,
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """Return the process-wide cache configured in `config`."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = TTSCache(get_shared_cache())
+            metrics.get_metrics().register_collector(_collect_metrics)
+        return _default_cache
+
+
+def _collect_metrics():
+    stats = _default_cache.stats()
+    return [
+        ('minimal_pairs_tts_cache_lookups_total', 'counter', "TTS cache lookups by result.",
+         [({'result': 'hit'}, stats['hits']), ({'result': 'miss'}, stats['misses'])]),
+        ('minimal_pairs_tts_cache_hit_ratio', 'gauge', "Share of TTS cache lookups that hit.",
+         [({}, stats['hit_rate'])]),
+        ('minimal_pairs_tts_cache_served_bytes_total', 'counter', "Bytes read from the TTS cache.",
+         [({}, stats['bytes_served'])]),
+    ]